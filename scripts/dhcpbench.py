@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+# Measure per probe cost of building DHCPv6 relayed solicits with scapy
+# and with the precompiled template:
+#   python3 scripts/dhcpbench.py -n 10000
+
+import time
+import random
+import argparse
+import ipaddress
+
+import scapy.layers.dhcp6 as dhcp6
+
+from viscan.dhcpscan.base import DHCPBaseScanner
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-n', '--count', type=int, default=2000)
+parser.add_argument('-l', '--linkaddr', default='2001:db8::1')
+args = parser.parse_args()
+
+duid = dhcp6.DUID_LL(lladdr=random.randbytes(6))
+base = int(ipaddress.IPv6Address(args.linkaddr))
+addrs = [str(ipaddress.IPv6Address(base + (i << 64)))
+         for i in range(args.count)]
+
+
+def build_scapy(linkaddr: str, trid: int) -> bytes:
+    msg = dhcp6.DHCP6_Solicit(trid=trid) / \
+        dhcp6.DHCP6OptClientId(duid=duid) / \
+        dhcp6.DHCP6OptOptReq() / \
+        dhcp6.DHCP6OptElapsedTime() / \
+        dhcp6.DHCP6OptIA_NA(iaid=random.getrandbits(32)) / \
+        dhcp6.DHCP6OptIA_TA(iaid=random.getrandbits(32)) / \
+        dhcp6.DHCP6OptIA_PD(iaid=random.getrandbits(32))
+    pkt = dhcp6.DHCP6_RelayForward(linkaddr=linkaddr) / \
+        dhcp6.DHCP6OptRelayMsg(message=msg)
+    return bytes(pkt)
+
+
+# a scanner without socket, only its builders are used
+scanner = DHCPBaseScanner.__new__(DHCPBaseScanner)
+scanner.duid = duid
+
+for name, build in (('scapy', build_scapy),
+                    ('template', scanner.build_solicit)):
+    beg = time.perf_counter()
+    for trid, addr in enumerate(addrs):
+        build(addr, trid)
+    end = time.perf_counter()
+    print(f'{name}\t{args.count} probes\t{end - beg:.3f}s\t'
+          f'{(end - beg) / args.count * 1e6:.2f}us/probe')
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+# Inspect result stores written with --output-format store:
+#   python3 scripts/resultstore.py export scan.vrs -f csv
+#   python3 scripts/resultstore.py diff old.vrs new.vrs
+
+import sys
+import argparse
+
+from viscan.common.store import ResultStore
+
+parser = argparse.ArgumentParser()
+subparsers = parser.add_subparsers(dest='command', required=True)
+export_parser = subparsers.add_parser('export')
+export_parser.add_argument('path')
+export_parser.add_argument('-f', '--format', choices=('json', 'csv'),
+                           default='json')
+diff_parser = subparsers.add_parser('diff')
+diff_parser.add_argument('old')
+diff_parser.add_argument('new')
+args = parser.parse_args()
+
+if args.command == 'export':
+    with ResultStore.load(args.path) as store:
+        if args.format == 'csv':
+            store.to_csv(sys.stdout)
+        else:
+            store.to_json(sys.stdout)
+else:
+    with ResultStore.load(args.old) as old, \
+         ResultStore.load(args.new) as new:
+        old.sort()
+        new.sort()
+        for addr, port, old_state, new_state in old.diff(new):
+            print(f'[{addr}]:{port}\t{old_state} -> {new_state}')
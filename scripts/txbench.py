@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# Measure tx engines throughput, e.g. on loopback:
+#   sudo python3 scripts/txbench.py -i lo -t ::1
+# or on one end of a veth pair:
+#   sudo ip link add vb0 type veth peer name vb1
+#   sudo python3 scripts/txbench.py -i vb0 -t fe80::1
+
+import time
+import random
+import argparse
+
+import scapy.layers.inet as inet
+import scapy.layers.inet6 as inet6
+
+from viscan.common.pcap import TX_ENGINES
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-i', '--iface', default='lo')
+parser.add_argument('-t', '--target', default='::1')
+parser.add_argument('-n', '--count', type=int, default=10000)
+parser.add_argument('-b', '--batch', type=int, default=64)
+parser.add_argument('-e', '--engines', default='scapy,raw')
+args = parser.parse_args()
+
+sport = random.getrandbits(16)
+bufs = [
+    bytes(
+        inet6.IPv6(dst=args.target) /
+        inet.TCP(sport=sport, dport=i % 65535 + 1, seq=i, flags='S'))
+    for i in range(args.count)
+]
+
+for name in args.engines.split(','):
+    engine = TX_ENGINES[name](iface=args.iface, batch=args.batch)
+    engine.open()
+    try:
+        beg = time.perf_counter()
+        for buf in bufs:
+            engine.send(buf)
+        engine.flush()
+        end = time.perf_counter()
+    finally:
+        engine.close()
+    print(f'{name}\t{args.count} pkts\t{end - beg:.3f}s\t'
+          f'{args.count / (end - beg):.0f} pps')
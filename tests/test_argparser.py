@@ -0,0 +1,21 @@
+import pytest
+
+from viscan.common.argparser import bandwidth
+from viscan.dhcpscan.enum import DHCPEnumerator
+from viscan.hostscan import HostScanner
+
+
+def test_bandwidth():
+    assert bandwidth('1.5M') == 1.5e6
+    assert bandwidth('100') == 100
+
+
+@pytest.mark.parametrize('flags', [['--shards', '4'], ['--online'],
+                                   ['--pipeline'], ['--checkpoint', 'x']])
+def test_scan_flags(flags):
+    args = HostScanner.get_argparser().parse_args(flags + ['::1'])
+    assert HostScanner.parse_args(args)['targets']
+    # scanners without sharding, checkpoints or online parsing reject
+    # them rather than ignoring them
+    with pytest.raises(SystemExit):
+        DHCPEnumerator.get_argparser().parse_args(flags + ['::1'])
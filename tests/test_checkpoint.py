@@ -0,0 +1,142 @@
+import os
+import select
+import itertools
+
+import pytest
+
+from viscan.common import checkpoint
+from viscan.common.base import SRScanner
+from viscan.common.checkpoint import Checkpoint, Resumable
+
+
+class FakeScanner(Resumable):
+    """Probe positions 0..size-1, answered ones reply on send."""
+
+    def __init__(self, size=10, answered=(), fail_at=None, **kwargs):
+        super().__init__(send_timewait=0, send_interval=0, **kwargs)
+        self.size = size
+        self.answered = set(answered)
+        self.fail_at = fail_at
+        self.result = None
+        self.sent = []
+
+    def get_pkts(self):
+        for pos in range(self.scan_cursor, self.size, self.scan_step):
+            self.checkpoint_advance(pos)
+            yield pos
+
+    def send_key(self, pkt):
+        return pkt
+
+    def send_pkt(self, pkt):
+        if pkt == self.fail_at:
+            raise KeyboardInterrupt
+        self.sent.append(pkt)
+        if pkt in self.answered:
+            self.append_recv_pkt(pkt)
+
+    def send(self):
+        self.send_pkts_with_retry()
+
+    def recv_update(self, pkt):
+        self.result[pkt] = True
+        return pkt
+
+    def recv_reset(self):
+        super().recv_reset()
+        self.result = dict()
+        if self.resume_state is not None:
+            for pos in self.resume_state['results']:
+                self.result[pos] = True
+
+    def recv(self):
+        select.select([self.scan_wakeup], [], [])
+
+    def checkpoint_state(self):
+        assert self.result is not None
+        return {'results': sorted(self.result)}
+
+    def checkpoint_restore(self, state):
+        pass
+
+    def checkpoint_size(self):
+        return self.size
+
+
+class SetupFailure(SRScanner):
+
+    def scan(self):
+        raise OSError('setup failed')
+
+
+class FakeSetupFailure(FakeScanner, SetupFailure):
+    pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count()
+    monkeypatch.setattr(checkpoint.time, 'monotonic', lambda: next(ticks))
+
+
+def test_checkpoint(tmp_path):
+    ckpt = Checkpoint(str(tmp_path / 'ckpt.json'))
+    assert ckpt.load() is None
+    ckpt.save({'cursor': 3})
+    assert ckpt.load() == {'cursor': 3}
+    ckpt.remove()
+    ckpt.remove()
+    assert ckpt.load() is None
+
+
+def test_enables_online(tmp_path):
+    scanner = FakeScanner(checkpoint_path=str(tmp_path / 'ckpt.json'))
+    assert scanner.recv_online
+
+
+def test_marks_first_round_only(tmp_path, clock):
+    scanner = FakeScanner(answered=range(5),
+                          send_retry=3,
+                          checkpoint_path=str(tmp_path / 'ckpt.json'),
+                          checkpoint_interval=1e9)
+    scanner.scan()
+    assert scanner.sent == list(range(10)) + list(range(5, 10)) * 2
+    marks = [pos for _, pos in scanner.checkpoint_marks]
+    assert marks == list(range(10))
+    assert scanner.checkpoint_cursor(1e9) == 9
+
+
+def test_setup_failure(tmp_path):
+    path = tmp_path / 'ckpt.json'
+    scanner = FakeSetupFailure(checkpoint_path=str(path))
+    with pytest.raises(OSError):
+        scanner.scan()
+    assert not os.path.exists(path)
+
+
+def test_resume(tmp_path, clock):
+    path = str(tmp_path / 'ckpt.json')
+    scanner = FakeScanner(answered=range(3),
+                          fail_at=6,
+                          checkpoint_path=path,
+                          checkpoint_interval=1e9)
+    with pytest.raises(KeyboardInterrupt):
+        scanner.scan()
+    state = Checkpoint(path).load()
+    assert state['results'] == [0, 1, 2]
+    assert state['cursor'] == 6
+
+    scanner = FakeScanner(answered=range(10), checkpoint_path=path,
+                          resume=True)
+    scanner.scan()
+    assert scanner.sent == list(range(6, 10))
+    assert sorted(scanner.result) == [0, 1, 2, 6, 7, 8, 9]
+
+
+def test_resume_other_scan(tmp_path):
+    path = str(tmp_path / 'ckpt.json')
+    Checkpoint(path).save({'scanner': 'FakeScanner', 'size': 5,
+                           'step': 1, 'cursor': 0, 'results': []})
+    scanner = FakeScanner(checkpoint_path=path, resume=True)
+    with pytest.raises(RuntimeError):
+        scanner.scan()
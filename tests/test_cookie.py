@@ -0,0 +1,34 @@
+import socket
+
+from viscan.common.cookie import ProbeCookie
+
+ADDR = socket.inet_pton(socket.AF_INET6, '2001:db8::1')
+OTHER = socket.inet_pton(socket.AF_INET6, '2001:db8::2')
+
+
+def test_cookie():
+    cookie = ProbeCookie(1)
+    c = cookie.make(ADDR, 80)
+    assert 0 <= c < 1 << 32
+    assert c == ProbeCookie(1).make(ADDR, 80)
+    assert cookie.check(c, ADDR, 80)
+
+
+def test_cookie_mismatch():
+    cookie = ProbeCookie(1)
+    c = cookie.make(ADDR, 80)
+    assert not cookie.check(c, ADDR, 81)
+    assert not cookie.check(c, OTHER, 80)
+    assert not cookie.check((c + 1) & 0xffffffff, ADDR, 80)
+    assert not ProbeCookie(2).check(c, ADDR, 80)
+
+
+def test_cookie_key_bits():
+    # keys are truncated to 128 bits
+    assert ProbeCookie(1).make(ADDR) == ProbeCookie(1 + (1 << 128)).make(ADDR)
+
+
+def test_cookie_spread():
+    cookie = ProbeCookie(3)
+    cookies = {cookie.make(ADDR, port) for port in range(1024)}
+    assert len(cookies) == 1024
@@ -0,0 +1,121 @@
+import socket
+
+import pytest
+
+import scapy.layers.l2 as l2
+import scapy.layers.inet as inet
+import scapy.layers.inet6 as inet6
+
+from viscan.common.decoder import (
+    DLT_EN10MB,
+    DLT_RAW,
+    DLT_LINUX_SLL,
+    DLT_NULL,
+    IPPROTO_TCP,
+    IPPROTO_UDP,
+    IPPROTO_ICMPV6,
+    IPPROTO_NONE,
+    TCP_SYN,
+    TCP_ACK,
+    decode,
+    ip6_offset,
+)
+
+SRC = '2001:db8::1'
+DST = '2001:db8::2'
+
+
+def addr(a: str) -> bytes:
+    return socket.inet_pton(socket.AF_INET6, a)
+
+
+def ether():
+    return l2.Ether(src='02:00:00:00:00:01', dst='02:00:00:00:00:02')
+
+
+def ip6(*args, **kwargs):
+    return inet6.IPv6(src=SRC, dst=DST, hlim=7, *args, **kwargs)
+
+
+def test_tcp():
+    pkt = decode(
+        bytes(ether() / ip6() /
+              inet.TCP(sport=80, dport=1234, seq=5, ack=6, flags='SA')))
+    assert pkt is not None
+    assert (pkt.src, pkt.dst, pkt.hlim) == (addr(SRC), addr(DST), 7)
+    assert (pkt.nh, pkt.offset) == (IPPROTO_TCP, 54)
+    assert (pkt.sport, pkt.dport, pkt.seq, pkt.ack) == (80, 1234, 5, 6)
+    assert pkt.flags == TCP_SYN | TCP_ACK
+
+
+def test_udp_vlan():
+    buf = bytes(ether() / l2.Dot1Q(vlan=2) / l2.Dot1Q(vlan=3) / ip6() /
+                inet.UDP(sport=53, dport=4321))
+    assert ip6_offset(buf) == 22
+    pkt = decode(buf)
+    assert pkt is not None
+    assert (pkt.nh, pkt.sport, pkt.dport) == (IPPROTO_UDP, 53, 4321)
+
+
+def test_ext_headers():
+    pkt = decode(
+        bytes(ip6() / inet6.IPv6ExtHdrHopByHop() /
+              inet6.IPv6ExtHdrDestOpt() / inet.UDP(sport=1, dport=2)),
+        DLT_RAW)
+    assert pkt is not None
+    assert (pkt.nh, pkt.offset, pkt.sport) == (IPPROTO_UDP, 56, 1)
+
+
+def test_fragments():
+    first = decode(
+        bytes(ip6() / inet6.IPv6ExtHdrFragment(offset=0, m=1) /
+              inet.UDP(sport=1, dport=2)), DLT_RAW)
+    assert first is not None and first.nh == IPPROTO_UDP
+    later = decode(
+        bytes(ip6() / inet6.IPv6ExtHdrFragment(nh=IPPROTO_UDP, offset=8) /
+              (b'\0' * 8)), DLT_RAW)
+    assert later is not None and later.nh == IPPROTO_NONE
+
+
+def test_icmp6_error():
+    probe = inet6.IPv6(src=DST, dst='2001:db8::9', hlim=1) / \
+        inet.TCP(sport=4321, dport=443, seq=77)
+    pkt = decode(
+        bytes(ip6() / inet6.ICMPv6TimeExceeded() / probe), DLT_RAW)
+    assert pkt is not None
+    assert (pkt.nh, pkt.icmp6_type, pkt.icmp6_code) == (IPPROTO_ICMPV6, 3, 0)
+    inner = pkt.inner
+    assert inner is not None and inner.inner is None
+    assert (inner.dst, inner.nh) == (addr('2001:db8::9'), IPPROTO_TCP)
+    assert (inner.sport, inner.dport, inner.seq) == (4321, 443, 77)
+
+
+def test_truncated_quote():
+    probe = bytes(
+        inet6.IPv6(src=DST, dst='2001:db8::9') /
+        inet.TCP(sport=4321, dport=443, seq=77))[:44]
+    buf = bytes(ip6() / inet6.ICMPv6DestUnreach(code=4)) + probe
+    pkt = decode(buf, DLT_RAW)
+    assert pkt is not None and pkt.inner is not None
+    assert (pkt.inner.sport, pkt.inner.dport, pkt.inner.seq) == (4321, 443, 0)
+
+
+def test_link_types():
+    raw = bytes(ip6() / inet.UDP())
+    assert ip6_offset(raw, DLT_RAW) == 0
+    assert ip6_offset(b'\0' * 14 + b'\x86\xdd' + raw, DLT_LINUX_SLL) == 16
+    assert ip6_offset(b'\0\0\0\x0a' + raw, DLT_NULL) == 4
+    assert ip6_offset(b'\x1e\0\0\0' + raw, DLT_NULL) == 4
+    assert ip6_offset(bytes(ether() / inet.IP()), DLT_EN10MB) == -1
+    assert decode(bytes(ether() / inet.IP())) is None
+    with pytest.raises(ValueError):
+        ip6_offset(raw, 9999)
+
+
+def test_memoryview():
+    buf = bytearray(bytes(ether() / ip6() / inet.TCP(sport=80)))
+    with memoryview(buf) as view:
+        pkt = decode(view)
+    buf[:] = b'\0' * len(buf)
+    assert pkt is not None
+    assert (pkt.src, pkt.sport) == (addr(SRC), 80)
@@ -0,0 +1,114 @@
+import socket
+import threading
+
+import pytest
+import scapy.layers.dhcp6 as dhcp6
+
+from viscan.dhcpscan.base import (
+    TRID_SPACE,
+    DHCPTransactions,
+    DHCPBaseScanner,
+    DHCPSoliciter,
+)
+
+
+def blocks_overlap(a: tuple[int, int], b: tuple[int, int]) -> bool:
+    ids = {(a[0] + i) % TRID_SPACE for i in range(a[1])}
+    return any((b[0] + i) % TRID_SPACE in ids for i in range(b[1]))
+
+
+def test_alloc_disjoint():
+    trids = DHCPTransactions()
+    blocks = [(trids.alloc(n), n) for n in (1, 100, 7, 1000)]
+    for i, a in enumerate(blocks):
+        for b in blocks[i + 1:]:
+            assert not blocks_overlap(a, b)
+
+
+def test_alloc_wrap():
+    trids = DHCPTransactions()
+    trids.cursor = TRID_SPACE - 10
+    base = trids.alloc(20)
+    assert base == TRID_SPACE - 10
+    assert trids.cursor == 10
+    # the next block skips the wrapped one
+    trids.cursor = TRID_SPACE - 5
+    other = trids.alloc(5)
+    assert not blocks_overlap((base, 20), (other, 5))
+
+
+def test_free_cursor_forward():
+    trids = DHCPTransactions()
+    base = trids.alloc(10)
+    trids.free(base)
+    trids.free(base)
+    # late replies to a freed block don't match the next one
+    assert trids.alloc(10) == (base + 10) % TRID_SPACE
+
+
+def test_exhausted():
+    trids = DHCPTransactions()
+    trids.alloc(TRID_SPACE - 1)
+    with pytest.raises(RuntimeError):
+        trids.alloc(2)
+    trids.alloc(1)
+    with pytest.raises(RuntimeError):
+        trids.alloc(1)
+    with pytest.raises(RuntimeError):
+        DHCPTransactions().alloc(0)
+
+
+def test_shared_by_sock():
+    with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock, \
+         socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as other:
+        assert DHCPTransactions.of(sock) is DHCPTransactions.of(sock)
+        assert DHCPTransactions.of(sock) is not DHCPTransactions.of(other)
+
+
+def test_scanner_blocks():
+    with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+        a = DHCPBaseScanner(target='::1', sock=sock)
+        b = DHCPBaseScanner(target='::1', sock=sock)
+        a.trid_alloc(16)
+        b.trid_alloc(16)
+        assert [a.trid_index(a.trid(i)) for i in range(16)] == \
+            list(range(16))
+        assert all(a.trid_index(b.trid(i)) is None for i in range(16))
+        assert a.trid_index(a.trid(16)) is None
+        a.trid_free()
+        assert a.trid_index(a.trids.cursor) is None
+        b.trid_free()
+        assert a.trids.blocks == {}
+
+
+def sent_trids(pkts: list[tuple[str, int, bytes]]) -> list[int]:
+    return [dhcp6.DHCP6_RelayForward(buf)[dhcp6.DHCP6OptRelayMsg].message.trid
+            for _, _, buf in pkts]
+
+
+def test_retriever_retries():
+    with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+        sent: list[tuple[str, int, bytes]] = []
+        soliciter = DHCPSoliciter(target='::1', sock=sock, send_retry=3,
+                                  send_timewait=0)
+        soliciter.send_pkt = sent.append  # type: ignore[method-assign]
+        soliciter.scan()
+        trids = sent_trids(sent)
+        assert len(set(trids)) == 3
+        assert all(soliciter.trid_index(trid) is not None for trid in trids)
+
+
+def test_shared_sock_scans_take_turns():
+    with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+        sent: list[tuple[str, int, bytes]] = []
+        soliciter = DHCPSoliciter(target='::1', sock=sock, send_retry=1,
+                                  send_timewait=0)
+        soliciter.send_pkt = sent.append  # type: ignore[method-assign]
+        other = DHCPBaseScanner(target='::1', sock=sock)
+        with other.trids.lock:
+            scan = threading.Thread(target=soliciter.scan)
+            scan.start()
+            scan.join(0.2)
+            assert scan.is_alive() and sent == []
+        scan.join()
+        assert len(sent) == 1
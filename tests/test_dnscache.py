@@ -0,0 +1,150 @@
+import base64
+
+import dns.rcode
+import dns.rrset
+import dns.dnssec
+import dns.message
+
+from viscan.common.dnscache import DNSCache, NOERROR, NXDOMAIN, b32hex
+
+
+def nxdomain(qname: str, zone: str, *records: str) -> dns.message.Message:
+    response = dns.message.make_response(dns.message.make_query(qname, 'PTR'))
+    response.set_rcode(dns.rcode.NXDOMAIN)
+    response.authority.append(
+        dns.rrset.from_text(zone, 300, 'IN', 'SOA',
+                            f'ns.{zone} admin.{zone} 1 2 3 4 300'))
+    for record in records:
+        owner, rdtype, rdata = record.split(' ', 2)
+        response.authority.append(
+            dns.rrset.from_text(owner, 300, 'IN', rdtype, rdata))
+    return response
+
+
+def nsec3_hash(name: str) -> str:
+    return dns.dnssec.nsec3_hash(name, b'', 0, 1)
+
+
+def test_nsec_span():
+    cache = DNSCache()
+    cache.update('b.p.', nxdomain('b.p.', 'p.', 'a.p. NSEC c.p. A NSEC'))
+    assert cache.get('b.p.') == NXDOMAIN
+    assert cache.get('bb.p.') == NXDOMAIN
+    assert cache.get('x.b.p.') == NXDOMAIN
+    assert cache.get('a.p.') == NOERROR
+    assert cache.get('c.p.') == NOERROR
+    assert cache.get('d.p.') is None
+
+
+def test_nsec_empty_non_terminal():
+    cache = DNSCache()
+    cache.update('x.p.', nxdomain('x.p.', 'p.', 'a.p. NSEC a.b.p. A NSEC'))
+    assert cache.get('b.p.') == NOERROR
+    assert cache.get('a.a.p.') == NXDOMAIN
+
+
+def test_nsec_delegation():
+    cache = DNSCache()
+    cache.update('b.p.', nxdomain('b.p.', 'p.', 'a.p. NSEC c.p. NS DS NSEC'))
+    assert cache.get('b.p.') == NXDOMAIN
+    # names below the cut are in the child zone
+    assert cache.get('f.a.p.') is None
+
+
+def test_nsec_wrap():
+    cache = DNSCache()
+    cache.update('g.z.p.',
+                 nxdomain('g.z.p.', 'z.p.', 'f.z.p. NSEC z.p. A NSEC'))
+    assert cache.get('g.z.p.') == NXDOMAIN
+    assert cache.get('0.a.p.') is None
+    assert cache.get('y.p.') is None
+
+
+def test_nsec3():
+    cache = DNSCache()
+    # a single record chain covers every other name of the zone
+    owner = nsec3_hash('a.p.')
+    cache.update(
+        'b.p.',
+        nxdomain('b.p.', 'p.',
+                 f'{owner}.p. NSEC3 1 0 0 - {nsec3_hash("a.p.")} A'))
+    assert cache.get('a.p.') == NOERROR
+    assert cache.get('b.p.') == NXDOMAIN
+    assert cache.get('f.a.p.') == NXDOMAIN
+
+
+def test_b32hex():
+    rrset = dns.rrset.from_text(
+        'p.', 300, 'IN', 'NSEC3', f'1 0 0 - {nsec3_hash("c.p.")} A')
+    assert b32hex(rrset[0].next) == nsec3_hash('c.p.')
+    data = bytes(range(20))
+    assert b32hex(data) == base64.b32hexencode(data).decode()
+
+
+def test_nsec3_span():
+    names = sorted((f'{c}.p.' for c in 'abcdefghijkl'), key=nsec3_hash)
+    owner, next = names[2], names[8]
+    cache = DNSCache()
+    cache.update(
+        names[5],
+        nxdomain(names[5], 'p.',
+                 f'{nsec3_hash(owner)}.p. NSEC3 1 0 0 - '
+                 f'{nsec3_hash(next)} A'))
+    assert cache.get(owner) == NOERROR
+    assert [cache.get(name) for name in names[3:8]] == [NXDOMAIN] * 5
+    assert cache.get(names[1]) is None
+    assert cache.get(names[9]) is None
+
+
+def test_nsec3_delegation():
+    cache = DNSCache()
+    owner = nsec3_hash('a.p.')
+    cache.update(
+        'b.p.',
+        nxdomain('b.p.', 'p.',
+                 f'{owner}.p. NSEC3 1 0 0 - {nsec3_hash("a.p.")} NS DS'))
+    assert cache.get('b.p.') == NXDOMAIN
+    assert cache.get('f.a.p.') is None
+    assert cache.get('g.f.a.p.') is None
+
+
+def test_nsec3_closest_zone():
+    cache = DNSCache()
+    owner = nsec3_hash('a.p.')
+    cache.update(
+        'b.p.',
+        nxdomain('b.p.', 'p.',
+                 f'{owner}.p. NSEC3 1 0 0 - {nsec3_hash("a.p.")} A'))
+    owner = nsec3_hash('x.c.p.')
+    cache.update(
+        'y.c.p.',
+        nxdomain('y.c.p.', 'c.p.',
+                 f'{owner}.c.p. NSEC3 1 0 0 - {nsec3_hash("x.c.p.")} A'))
+    assert cache.get('x.c.p.') == NOERROR
+    assert cache.get('y.c.p.') == NXDOMAIN
+
+
+def test_ancestor_nxdomain():
+    cache = DNSCache()
+    cache.update('b.p.', nxdomain('b.p.', 'p.'))
+    assert cache.get('b.p.') == NXDOMAIN
+    assert cache.get('x.b.p.') == NXDOMAIN
+    assert cache.get('p.') is None
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = DNSCache(path)
+    cache.update('b.p.', nxdomain('b.p.', 'p.', 'a.p. NSEC c.p. NS DS NSEC'))
+    owner = nsec3_hash('a.q.')
+    cache.update(
+        'b.q.',
+        nxdomain('b.q.', 'q.',
+                 f'{owner}.q. NSEC3 1 0 0 - {nsec3_hash("a.q.")} NS DS'))
+    cache.save()
+    cache = DNSCache(path)
+    cache.load()
+    assert cache.get('bb.p.') == NXDOMAIN
+    assert cache.get('f.a.p.') is None
+    assert cache.get('b.q.') == NXDOMAIN
+    assert cache.get('f.a.q.') is None
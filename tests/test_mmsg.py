@@ -0,0 +1,57 @@
+import errno
+import socket
+
+import pytest
+
+from viscan.common import mmsg
+from viscan.common.mmsg import MmsgRecver, pack_sockaddr_in6, sendmmsg
+
+LOOPBACK = socket.inet_pton(socket.AF_INET6, '::1')
+
+
+@pytest.fixture
+def socks():
+    recver = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+    recver.bind(('::1', 0))
+    recver.setblocking(False)
+    sender = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+    yield sender, recver
+    sender.close()
+    recver.close()
+
+
+@pytest.fixture(params=[True, False], ids=['sendmmsg', 'sendto'])
+def has_sendmmsg(request, monkeypatch):
+    if request.param and not mmsg.HAS_SENDMMSG:
+        pytest.skip('libc without sendmmsg')
+    monkeypatch.setattr(mmsg, 'HAS_SENDMMSG', request.param)
+
+
+def test_sendmmsg(socks, has_sendmmsg):
+    sender, recver = socks
+    addr = pack_sockaddr_in6(LOOPBACK, recver.getsockname()[1])
+    bufs = [b'a', b'b', b'c']
+    assert sendmmsg(sender, bufs, [addr] * 3) == 3
+    pkts = MmsgRecver().recv(recver)
+    assert [buf for buf, _ in pkts] == bufs
+    assert pkts[0][1] == ('::1', sender.getsockname()[1])
+
+
+def test_sendmmsg_skip(socks, has_sendmmsg):
+    sender, recver = socks
+    addr = pack_sockaddr_in6(LOOPBACK, recver.getsockname()[1])
+    # too large for a datagram, fails on its own
+    bufs = [b'a', b'x' * 70000, b'c']
+    failed: list[tuple[int, OSError]] = []
+    assert sendmmsg(sender, bufs, [addr] * 3, failed) == 2
+    assert [(i, e.errno) for i, e in failed] == [(1, errno.EMSGSIZE)]
+    pkts = MmsgRecver().recv(recver)
+    assert [buf for buf, _ in pkts] == [b'a', b'c']
+
+
+def test_sendmmsg_raise(socks, has_sendmmsg):
+    sender, recver = socks
+    addr = pack_sockaddr_in6(LOOPBACK, recver.getsockname()[1])
+    sender.close()
+    with pytest.raises(OSError):
+        sendmmsg(sender, [b'a'], [addr])
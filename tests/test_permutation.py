@@ -0,0 +1,42 @@
+import pytest
+
+from viscan.common.generators import Permutation, AddrGenerator
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 16, 17, 1000, 4099])
+def test_bijective(size):
+    perm = Permutation(size, 42)
+    assert sorted(perm) == list(range(size))
+
+
+def test_keyed():
+    size = 1000
+    assert list(Permutation(size, 1)) == list(Permutation(size, 1))
+    assert list(Permutation(size, 1)) != list(Permutation(size, 2))
+    assert list(Permutation(size, 1)) != list(range(size))
+
+
+def test_random_access():
+    perm = Permutation(100, 7)
+    items = list(perm)
+    assert [perm[i] for i in range(100)] == items
+    assert perm[-1] == items[-1]
+    assert perm[10:20] == items[10:20]
+    with pytest.raises(IndexError):
+        perm[100]
+
+
+def test_wide():
+    # half blocks wider than 64 bits, e.g. a /0
+    perm = Permutation(1 << 130, 3)
+    values = {perm[i] for i in range(64)}
+    assert len(values) == 64
+    assert all(0 <= v < 1 << 130 for v in values)
+
+
+def test_permuted():
+    targets = AddrGenerator(['2001:db8::/120'])
+    pairs = list(targets.permuted(5))
+    assert sorted(index for index, _ in pairs) == list(range(256))
+    assert all(targets[index] == addr for index, addr in pairs)
+    assert sorted(addr for _, addr in pairs) == sorted(targets)
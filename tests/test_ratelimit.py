@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from viscan.common.base import RateLimiter, AdaptiveRateLimiter
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, 'perf_counter', clock)
+    return clock
+
+
+def test_rate(clock):
+    limiter = RateLimiter(rate=100, burst=0)
+    delays = [limiter.acquire() for _ in range(5)]
+    assert delays == pytest.approx([0, 0.01, 0.02, 0.03, 0.04])
+    clock.now = 1.0
+    # idle time is not banked beyond the burst
+    assert limiter.acquire() == 0
+
+
+def test_burst(clock):
+    limiter = RateLimiter(rate=100, burst=0.05)
+    limiter.acquire()
+    clock.now = 1.0
+    delays = [limiter.acquire() for _ in range(10)]
+    assert sum(1 for delay in delays if delay <= 0) == 6
+    assert delays[-1] == pytest.approx(0.04)
+
+
+def test_bandwidth(clock):
+    limiter = RateLimiter(rate=100, bandwidth=8000, burst=0)
+    # 100 bytes take 0.1s at 8kbps, more than a pkt at 100pps
+    delays = [limiter.acquire(100) for _ in range(3)]
+    assert delays == pytest.approx([0, 0.1, 0.2])
+    assert limiter.nbytes == 300
+
+
+def test_report(clock):
+    limiter = RateLimiter(rate=10, burst=0)
+    for _ in range(11):
+        clock.now = max(clock.now, limiter.next_time)
+        limiter.acquire()
+    assert limiter.report().startswith('sent 11 pkts in 1.000s, 11/10 pps')
+
+
+def test_adaptive(clock):
+    replies, drops = [0], [0]
+    limiter = AdaptiveRateLimiter(feedback=lambda: (replies[0], drops[0]),
+                                  min_rate=10, max_rate=1000, period=1.0,
+                                  rate=100)
+
+    def period(answered: int, dropped: int = 0) -> float:
+        # replies to the last period's pkts, seen at the first acquire
+        clock.now += 1.0
+        replies[0] += answered
+        drops[0] += dropped
+        for _ in range(20):
+            limiter.acquire()
+        return limiter.rate
+
+    for _ in range(20):
+        limiter.acquire()
+    assert period(20) == 200  # slow start doubles
+    assert period(20) == 400
+    assert period(20, dropped=1) == 200  # drops halve and end slow start
+    assert period(20) == 210  # then grow additively
+    assert period(0) == 105  # reply ratio collapsed
+    assert period(10) == 115  # above half the average ratio
+    for _ in range(10):
+        period(0, dropped=1)
+    assert limiter.rate == 10
@@ -0,0 +1,54 @@
+import socket
+
+import pytest
+
+from viscan.common.generators import AddrGenerator
+from viscan.common.shard import Sharded
+from viscan.hostscan import HostScanner
+
+
+def test_shards_partition():
+    targets = AddrGenerator(['2001:db8::/118'])
+    shards = [
+        [index for index, _ in targets.permuted(9, start, 3)]
+        for start in range(3)
+    ]
+    indexes = [index for shard in shards for index in shard]
+    assert sorted(indexes) == list(range(targets.size))
+    assert [len(shard) for shard in shards] == [342, 341, 341]
+
+
+def test_shard_positions():
+    scanner = Sharded(shards=4, shard_index=1, scan_key=9)
+    assert (scanner.key, scanner.scan_start, scanner.scan_step) == (9, 1, 4)
+    scanner = Sharded(shards=4)
+    assert (scanner.scan_start, scanner.scan_step) == (0, 1)
+
+
+@pytest.mark.parametrize('shards,index', [(0, None), (2, 2), (2, -1)])
+def test_invalid_shard(shards, index):
+    with pytest.raises(ValueError):
+        Sharded(shards=shards, shard_index=index)
+
+
+def test_shard_merge():
+    scanner = Sharded(shards=2)
+    scanner.shard_merge([{'a': 1}, {'b': 2}])
+    assert scanner.result == {'a': 1, 'b': 2}
+
+
+def test_shard_outputs_merge():
+    targets = AddrGenerator(['2001:db8::/120'])
+    up = socket.inet_pton(socket.AF_INET6, '2001:db8::7')
+    outputs = []
+    for index in range(3):
+        # no socket is opened before scan
+        scanner = HostScanner(targets=targets, shards=3, shard_index=index,
+                              scan_key=9)
+        assert scanner.sock is None
+        scanner.result = {up: True}
+        outputs.append(list(scanner.get_jsonable()))
+    addrs = [addr for output in outputs for addr, _ in output]
+    assert sorted(addrs) == sorted(targets)
+    assert [addr for output in outputs for addr, state in output
+            if state] == ['2001:db8::7']
@@ -0,0 +1,31 @@
+import gzip
+import json
+
+from viscan.common.sink import ResultSink
+
+ROWS = [('2001:db8::1', 80, 'open'), ('2001:db8::2', 80, 'filtered')]
+
+
+def test_dump_iterator(tmp_path):
+    path = tmp_path / 'results.json'
+    with ResultSink(str(path)) as sink:
+        sink.dump(iter(ROWS))
+    text = path.read_text()
+    assert json.loads(text) == [list(row) for row in ROWS]
+    assert text == json.dumps(ROWS) + '\n'
+
+
+def test_dump_empty_iterator(tmp_path):
+    path = tmp_path / 'results.json'
+    with ResultSink(str(path)) as sink:
+        sink.dump(iter([]))
+    assert json.loads(path.read_text()) == []
+
+
+def test_write_gzip(tmp_path):
+    path = tmp_path / 'results.ndjson.gz'
+    with ResultSink(str(path), flush_interval=0) as sink:
+        for row in ROWS:
+            sink.write(row)
+    with gzip.open(path, 'rt') as f:
+        assert [json.loads(line) for line in f] == [list(row) for row in ROWS]
@@ -0,0 +1,96 @@
+import io
+import json
+import socket
+
+import pytest
+
+from viscan.common.store import ResultStore
+
+STATES = ('filtered', 'closed', 'open')
+
+
+def store(*rows: tuple[str, int, str]) -> ResultStore:
+    s = ResultStore(STATES)
+    for addr, port, state in rows:
+        s.append(socket.inet_pton(socket.AF_INET6, addr), port, state)
+    return s
+
+
+def test_rows():
+    s = store(('2001:db8::1', 80, 'open'), ('2001:db8::2', 22, 'closed'))
+    assert len(s) == 2
+    assert list(s) == [('2001:db8::1', 80, 'open'),
+                       ('2001:db8::2', 22, 'closed')]
+    with pytest.raises(ValueError):
+        s.append(b'\0' * 16, 1, 'unknown')
+
+
+def test_sort():
+    s = store(('2001:db8::2', 22, 'open'), ('2001:db8::1', 443, 'open'),
+              ('2001:db8::1', 80, 'closed'))
+    s.sort()
+    assert [(addr, port) for addr, port, _ in s] == \
+        [('2001:db8::1', 80), ('2001:db8::1', 443), ('2001:db8::2', 22)]
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / 'results.vsrs')
+    s = store(('2001:db8::1', 80, 'open'), ('::', 65535, 'filtered'))
+    s.save(path)
+    with ResultStore.load(path) as loaded:
+        assert loaded.states == list(STATES)
+        assert list(loaded) == list(s)
+        with pytest.raises(RuntimeError):
+            loaded.append(b'\0' * 16, 1, 'open')
+
+
+def test_save_load_empty(tmp_path):
+    path = str(tmp_path / 'results.vsrs')
+    store().save(path)
+    with ResultStore.load(path) as loaded:
+        assert list(loaded) == []
+
+
+def test_load_invalid(tmp_path):
+    path = tmp_path / 'results.vsrs'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        ResultStore.load(str(path))
+
+
+def test_diff():
+    old = store(('2001:db8::1', 22, 'open'), ('2001:db8::1', 80, 'open'),
+                ('2001:db8::3', 80, 'closed'))
+    new = store(('2001:db8::1', 80, 'closed'), ('2001:db8::2', 80, 'open'),
+                ('2001:db8::3', 80, 'closed'))
+    old.sort()
+    new.sort()
+    assert list(old.diff(new)) == [
+        ('2001:db8::1', 22, 'open', None),
+        ('2001:db8::1', 80, 'open', 'closed'),
+        ('2001:db8::2', 80, None, 'open'),
+    ]
+    assert list(new.diff(new)) == []
+    assert list(store().diff(new)) == [(addr, port, None, state)
+                                       for addr, port, state in new]
+
+
+def test_diff_loaded(tmp_path):
+    path = str(tmp_path / 'results.vsrs')
+    old = store(('2001:db8::1', 80, 'open'))
+    old.save(path)
+    new = store(('2001:db8::1', 80, 'filtered'))
+    with ResultStore.load(path) as loaded:
+        assert list(loaded.diff(new)) == \
+            [('2001:db8::1', 80, 'open', 'filtered')]
+
+
+def test_export():
+    s = store(('2001:db8::1', 80, 'open'))
+    f = io.StringIO()
+    s.to_json(f)
+    assert json.loads(f.getvalue()) == ['2001:db8::1', 80, 'open']
+    f = io.StringIO()
+    s.to_csv(f)
+    assert f.getvalue().splitlines() == ['addr,port,state',
+                                         '2001:db8::1,80,open']
@@ -0,0 +1,38 @@
+import random
+import socket
+
+import scapy.layers.inet as inet
+import scapy.layers.inet6 as inet6
+
+from viscan.common.templates import TCPProbeTemplate
+
+
+def syn(dst: str, dport: int, seq: int, fl: int) -> bytes:
+    return bytes(
+        inet6.IPv6(src='2001:db8::1', dst=dst, fl=fl) /
+        inet.TCP(sport=4321,
+                 dport=dport,
+                 seq=seq,
+                 flags='S',
+                 window=1024,
+                 options=[('MSS', 1460)]))
+
+
+def test_tcp_template():
+    template = TCPProbeTemplate(syn('2001:db8::2', 80, 0, 0))
+    rand = random.Random(1)
+    for _ in range(200):
+        dst = socket.inet_ntop(socket.AF_INET6, rand.randbytes(16))
+        dport = rand.getrandbits(16)
+        seq = rand.getrandbits(32)
+        fl = rand.getrandbits(20)
+        assert template.build(socket.inet_pton(socket.AF_INET6, dst), dport,
+                              seq, fl) == syn(dst, dport, seq, fl)
+
+
+def test_tcp_template_checksum_edges():
+    template = TCPProbeTemplate(syn('2001:db8::2', 80, 0, 0))
+    for dst in ('::', 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'):
+        for dport, seq in ((0, 0), (0xffff, 0xffffffff)):
+            assert template.build(socket.inet_pton(socket.AF_INET6, dst),
+                                  dport, seq) == syn(dst, dport, seq, 0)
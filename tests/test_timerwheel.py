@@ -0,0 +1,82 @@
+import time
+import random
+
+from viscan.common.base import SRScanner
+from viscan.common.timerwheel import TimerWheel
+
+
+def test_expire_order():
+    wheel: TimerWheel[float] = TimerWheel(tick=1.0, now=0.0, nslots=16)
+    deadlines = [i * 1.3 for i in range(100)]
+    for deadline in random.sample(deadlines, len(deadlines)):
+        wheel.add(deadline, deadline)
+    assert len(wheel) == 100
+    expired = []
+    for now in range(200):
+        items = wheel.expire(now)
+        # never early, at most a tick late
+        assert all(now - 1 < d <= now for d in items)
+        expired.extend(sorted(items))
+    assert expired == deadlines
+    assert len(wheel) == 0
+
+
+def test_expire_later_rounds():
+    wheel: TimerWheel[str] = TimerWheel(tick=1.0, now=0.0, nslots=4)
+    wheel.add(1.0, 'a')
+    wheel.add(5.0, 'b')  # same slot, next round
+    assert wheel.expire(1.0) == ['a']
+    assert wheel.expire(4.0) == []
+    assert wheel.expire(5.0) == ['b']
+
+
+def test_expire_past_deadline():
+    wheel: TimerWheel[str] = TimerWheel(tick=1.0, now=10.0)
+    wheel.add(3.0, 'a')
+    assert wheel.expire(10.0) == ['a']
+    assert wheel.expire(9.0) == []
+
+
+class FakeScanner(SRScanner[int, int]):
+    answers: dict[int, int]
+    sent: list[tuple[float, int]]
+
+    def __init__(self, answers: dict[int, int], **kwargs):
+        super().__init__(send_pipeline=True, send_interval=0, **kwargs)
+        self.answers = answers  # pkt answered at its n-th send
+        self.sent = []
+
+    def get_pkts(self) -> range:
+        return range(8)
+
+    def send_key(self, pkt: int) -> int:
+        return pkt
+
+    def send_pkt(self, pkt: int):
+        self.sent.append((time.monotonic(), pkt))
+        if self.count(pkt) == self.answers.get(pkt):
+            self.recv_resolve(pkt)
+
+    def count(self, pkt: int) -> int:
+        return sum(1 for _, p in self.sent if p == pkt)
+
+
+def test_pipeline_retries():
+    scanner = FakeScanner({1: 1, 4: 1, 6: 2}, send_retry=3,
+                          send_timewait=0.02)
+    scanner.send_pkts_with_pipeline()
+    assert len(scanner.send_pending) == 0
+    assert [scanner.count(i) for i in range(8)] == [3, 1, 3, 3, 1, 3, 2, 3]
+    # unanswered pkts wait out their deadline before every retry
+    for i in (0, 7):
+        times = [t for t, pkt in scanner.sent if pkt == i]
+        assert all(b - a >= 0.02 for a, b in zip(times, times[1:]))
+
+
+def test_pipeline_no_retry():
+    scanner = FakeScanner({}, send_retry=1, send_timewait=0.02)
+    beg = time.monotonic()
+    scanner.send_pkts_with_pipeline()
+    # returns once the last deadline passed
+    assert time.monotonic() - beg >= 0.02
+    assert [pkt for _, pkt in scanner.sent] == list(range(8))
@@ -1,15 +1,33 @@
+import re
 import argparse
 
 from argparse import ArgumentParser
 
 from ..defaults import (
+    OUTPUT_FORMAT,
     SEND_RETRY,
     SEND_TIMEWAIT,
     SEND_INTERVAL,
+    SEND_RATE,
+    SEND_BANDWIDTH,
+    SEND_TIMING,
+    TIMING_PROFILES,
+    TX_ENGINE,
+    TX_BATCH,
+    RX_ENGINE,
     POP_PORTS,
 )
 
 
+def bandwidth(s: str) -> float:
+    """Parse bits per second with an optional K/M/G suffix."""
+    res = re.match(r'^(\d+(?:\.\d*)?)([kKmMgG]?)$', s)
+    if res is None:
+        raise argparse.ArgumentTypeError(f'invalid bandwidth: {s}')
+    scale = {'': 1, 'k': 1e3, 'm': 1e6, 'g': 1e9}[res[2].lower()]
+    return float(res[1]) * scale
+
+
 class ScanArgParser(ArgumentParser):
 
     def __init__(self, *args, **kwargs):
@@ -17,6 +35,13 @@ class ScanArgParser(ArgumentParser):
 
         self.add_argument('-d', '--debug', action='store_true')
         self.add_argument('-o', '--output-path')
+        self.add_argument('--output-format',
+                          choices=('json', 'ndjson', 'store'),
+                          default=OUTPUT_FORMAT,
+                          help='ndjson writes findings as they arrive for '
+                          'port and host scans with --online, dns scans '
+                          'and dhcp enumeration, other scanners write '
+                          'all records when done')
         self.add_argument('-i', '--iface')
         self.add_argument('-p', '--ports', default=POP_PORTS)
         self.add_argument('-R', '--send-retry', type=int, default=SEND_RETRY)
@@ -28,12 +53,41 @@ class ScanArgParser(ArgumentParser):
                           '--send-interval',
                           type=float,
                           default=SEND_INTERVAL)
+        self.add_argument('--rate', type=float, default=SEND_RATE)
+        self.add_argument('--bandwidth',
+                          type=bandwidth,
+                          default=SEND_BANDWIDTH)
+        self.add_argument('--timing',
+                          choices=('fixed', *TIMING_PROFILES),
+                          default=SEND_TIMING)
+        self.add_argument('--tx-engine',
+                          choices=('raw', 'scapy'),
+                          default=TX_ENGINE)
+        self.add_argument('--tx-batch', type=int, default=TX_BATCH)
+        self.add_argument('--rx-engine',
+                          choices=('pcap', 'ring'),
+                          default=RX_ENGINE)
         self.add_argument('-O', '--open-port', type=int)
         self.add_argument('-C', '--closed-port', type=int)
         self.add_argument('-N', '--no-dwim', action='store_true')
         self.add_argument('-S', '--skip-dwim', action='store_true')
         self.add_argument('targets', nargs=argparse.REMAINDER)
 
+    def add_pipeline(self):
+        self.add_argument('--pipeline', action='store_true')
+
+    def add_online(self):
+        self.add_argument('--online', action='store_true')
+
+    def add_checkpoint(self):
+        self.add_argument('--checkpoint')
+        self.add_argument('--resume', action='store_true')
+
+    def add_shards(self):
+        self.add_argument('--shards', type=int, default=1)
+        self.add_argument('--shard-index', type=int)
+        self.add_argument('--scan-key', type=lambda s: int(s, 16))
+
     def add_retry_dwim(self, retry: int):
         self.add_argument('-r', '--retry-dwim', type=int, default=retry)
 
@@ -1,20 +1,30 @@
+import os
 import time
 import threading
-import json
 import logging
 
 from typing import Generic, TypeVar, Any, Optional
+from collections.abc import Iterable, Hashable, Callable
 from argparse import Namespace
 
 from ..defaults import (
     LOG_FORMAT,
     LOG_DATEFMT,
+    OUTPUT_FORMAT,
     SEND_RETRY,
     SEND_TIMEWAIT,
     SEND_INTERVAL,
+    SEND_RATE,
+    SEND_BANDWIDTH,
+    SEND_BURST,
+    SEND_TIMING,
+    TIMING_PROFILES,
 )
 from .decorators import override
 from .argparser import ScanArgParser
+from .timerwheel import TimerWheel
+from .sink import ResultSink
+from .store import ResultStore
 
 
 class Loggable:
@@ -97,15 +107,41 @@ Result = TypeVar('Result')
 class ResultParser(Generic[Result], MainRunner, BaseScanner):
     result: Optional[Result]
     output_path: Optional[str]
+    output_format: str
+    result_sink: Optional[ResultSink]
 
-    def __init__(self, output_path: Optional[str] = None, **kwargs):
+    def __init__(self,
+                 output_path: Optional[str] = None,
+                 output_format: str = OUTPUT_FORMAT,
+                 **kwargs):
         super().__init__(**kwargs)
         self.result = None
         self.output_path = output_path
+        self.output_format = output_format
+        self.result_sink = None
 
     def get_jsonable(self) -> Any:
         return self.result
 
+    def get_records(self) -> Iterable[Any]:
+        """Records of ndjson output, one per finding. Subclasses that
+        emit findings during scan skip them here."""
+        jsonable = self.get_jsonable()
+        if isinstance(jsonable, list):
+            return jsonable
+        if isinstance(jsonable, dict):
+            return ([k, v] for k, v in jsonable.items())
+        return [jsonable]
+
+    def get_store(self) -> ResultStore:
+        """Columnar copy of results, for the store output format."""
+        raise NotImplementedError('store output is not supported')
+
+    def emit(self, record: Any):
+        """Stream a confirmed finding, if ndjson output is open."""
+        if self.result_sink is not None:
+            self.result_sink.write(record)
+
     def show(self):
         print(self.result)
 
@@ -114,8 +150,32 @@ class ResultParser(Generic[Result], MainRunner, BaseScanner):
             output_path = self.output_path
         if output_path is None:
             raise RuntimeError('no output path specified')
-        jsonable = self.get_jsonable()
-        json.dump(jsonable, open(output_path, 'w'))
+        if self.output_format == 'ndjson':
+            if self.result_sink is not None:
+                for record in self.get_records():
+                    self.result_sink.write(record)
+                return
+            with ResultSink(output_path) as sink:
+                for record in self.get_records():
+                    sink.write(record)
+        elif self.output_format == 'store':
+            self.get_store().save(output_path)
+        else:
+            with ResultSink(output_path) as sink:
+                sink.dump(self.get_jsonable())
+
+    @override(BaseScanner)
+    def scan_and_export(self):
+        if self.output_format != 'ndjson' or self.output_path is None:
+            super().scan_and_export()
+            return
+        # open output before scan, so findings are written as they come
+        with ResultSink(self.output_path) as sink:
+            self.result_sink = sink
+            try:
+                super().scan_and_export()
+            finally:
+                self.result_sink = None
 
     @override(BaseScanner)
     def export(self):
@@ -129,9 +189,164 @@ class ResultParser(Generic[Result], MainRunner, BaseScanner):
     def parse_args(cls, args: Namespace) -> dict[str, Any]:
         kwargs = super().parse_args(args)
         kwargs['output_path'] = args.output_path
+        kwargs['output_format'] = args.output_format
         return kwargs
 
 
+class RateLimiter:
+    """Token bucket pacing pkts to a pps and/or bps target.
+
+    The bucket holds burst seconds worth of tokens, so pkts leave in
+    small batches between waits; waits sleep coarsely and then spin on
+    perf_counter, since sleep alone overshoots below a millisecond.
+    """
+
+    rate: float
+    bandwidth: float
+    burst: float
+    next_time: float
+    count: int
+    nbytes: int
+    beg_time: Optional[float]
+    end_time: float
+
+    spin = 0.002
+
+    def __init__(self,
+                 rate: float = SEND_RATE,
+                 bandwidth: float = SEND_BANDWIDTH,
+                 burst: float = SEND_BURST):
+        self.rate = rate
+        self.bandwidth = bandwidth
+        self.burst = burst
+        self.reset()
+
+    def reset(self):
+        self.next_time = 0.0
+        self.count = 0
+        self.nbytes = 0
+        self.beg_time = None
+        self.end_time = 0.0
+
+    def cost(self, nbytes: int) -> float:
+        cost = 0.0
+        if self.rate > 0:
+            cost = 1 / self.rate
+        if self.bandwidth > 0:
+            cost = max(cost, 8 * nbytes / self.bandwidth)
+        return cost
+
+    def acquire(self, nbytes: int = 0) -> float:
+        """Take tokens for a pkt, return how long to wait before it."""
+        now = time.perf_counter()
+        if self.beg_time is None:
+            self.beg_time = now
+        cost = self.cost(nbytes)
+        # unused tokens saturate at burst
+        self.next_time = max(self.next_time, now - self.burst)
+        delay = self.next_time - now
+        self.next_time += cost
+        self.count += 1
+        self.nbytes += nbytes
+        self.end_time = max(now, self.next_time - cost)
+        return delay
+
+    def sleep(self, delay: float):
+        deadline = time.perf_counter() + delay
+        if delay > self.spin:
+            time.sleep(delay - self.spin / 2)
+        while time.perf_counter() < deadline:
+            pass
+
+    def report(self) -> str:
+        elapsed = 0.0
+        if self.beg_time is not None:
+            elapsed = self.end_time - self.beg_time
+        pps = self.count / elapsed if elapsed > 0 else 0.0
+        bps = 8 * self.nbytes / elapsed if elapsed > 0 else 0.0
+        return f'sent {self.count} pkts in {elapsed:.3f}s, ' \
+            f'{pps:.0f}/{self.rate:.0f} pps, ' \
+            f'{bps:.0f}/{self.bandwidth:.0f} bps (achieved/requested)'
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """RateLimiter that adjusts its rate with AIMD on reply feedback.
+
+    Every period, the reply ratio of the last period is compared with
+    its moving average; a collapse of the ratio or new drops on the
+    recv side halve the rate, otherwise it grows, exponentially until
+    the first loss (slow start) and additively after that.
+    """
+
+    min_rate: float
+    max_rate: float
+    step: float
+    period: float
+    feedback: Callable[[], tuple[int, int]]
+    last_time: float
+    last_count: int
+    last_replies: int
+    last_drops: int
+    ratio: Optional[float]
+    slow_start: bool
+
+    loss = 0.5
+    decrease = 0.5
+    min_samples = 16
+
+    def __init__(self,
+                 feedback: Callable[[], tuple[int, int]],
+                 min_rate: float,
+                 max_rate: float,
+                 period: float = SEND_TIMEWAIT,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = max(self.rate / 10, min_rate)
+        self.period = period
+        self.feedback = feedback
+
+    @override(RateLimiter)
+    def reset(self):
+        super().reset()
+        self.last_time = time.perf_counter()
+        self.last_count = 0
+        self.last_replies = 0
+        self.last_drops = 0
+        self.ratio = None
+        self.slow_start = True
+
+    def adjust(self, now: float):
+        replies, drops = self.feedback()
+        sent = self.count - self.last_count
+        if sent < self.min_samples:
+            return
+        ratio = (replies - self.last_replies) / sent
+        dropped = drops > self.last_drops
+        self.last_time = now
+        self.last_count = self.count
+        self.last_replies = replies
+        self.last_drops = drops
+        if dropped or \
+           (self.ratio is not None and ratio < self.loss * self.ratio):
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.slow_start = False
+        elif self.slow_start:
+            self.rate = min(self.max_rate, self.rate * 2)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.step)
+        self.ratio = ratio if self.ratio is None else \
+            0.8 * self.ratio + 0.2 * ratio
+
+    @override(RateLimiter)
+    def acquire(self, nbytes: int = 0) -> float:
+        now = time.perf_counter()
+        if now - self.last_time >= self.period:
+            self.adjust(now)
+        return super().acquire(nbytes)
+
+
 SendPkt = TypeVar('SendPkt')
 RecvPkt = TypeVar('RecvPkt')
 
@@ -140,43 +355,82 @@ class Sender(Generic[SendPkt], MainRunner):
     send_retry: int
     send_timewait: float
     send_interval: float
+    send_limiter: Optional[RateLimiter]
+    send_round: int
+
+    send_rebuild: bool = False  # get pkts anew every retry round
 
     def __init__(self,
                  send_retry: int = SEND_RETRY,
                  send_timewait: float = SEND_TIMEWAIT,
                  send_interval: float = SEND_INTERVAL,
+                 send_rate: float = SEND_RATE,
+                 send_bandwidth: float = SEND_BANDWIDTH,
+                 send_timing: str = SEND_TIMING,
                  **kwargs):
         super().__init__(**kwargs)
         self.send_retry = send_retry
+        self.send_round = 0
         self.send_timewait = send_timewait
         self.send_interval = send_interval
+        self.send_limiter = None
+        if send_timing != 'fixed':
+            init_rate, min_rate, max_rate = TIMING_PROFILES[send_timing]
+            self.send_limiter = AdaptiveRateLimiter(
+                feedback=self.send_feedback,
+                min_rate=min_rate,
+                max_rate=max_rate,
+                period=max(send_timewait, 0.1),
+                rate=send_rate if send_rate > 0 else init_rate,
+                bandwidth=send_bandwidth)
+        elif send_rate > 0 or send_bandwidth > 0:
+            self.send_limiter = RateLimiter(rate=send_rate,
+                                            bandwidth=send_bandwidth)
 
     def get_pkt(self) -> SendPkt:
         raise NotImplementedError
 
-    def get_pkts(self) -> list[SendPkt]:
+    def get_pkts(self) -> Iterable[SendPkt]:
         return [self.get_pkt()]
 
     def send_pkt(self, pkt: SendPkt):
         raise NotImplementedError
 
+    def send_size(self, pkt: SendPkt) -> int:
+        """Bytes on the wire of a pkt, for bandwidth pacing."""
+        return 0
+
     def send_pkt_with_interval(self, pkt: Optional[SendPkt] = None):
         if pkt is None:
             pkt = self.get_pkt()
+        if self.send_limiter is not None:
+            nbytes = 0
+            if self.send_limiter.bandwidth > 0:
+                nbytes = self.send_size(pkt)
+            delay = self.send_limiter.acquire(nbytes)
+            if delay > 0:
+                self.send_flush()
+                self.send_limiter.sleep(delay)
+            self.send_pkt(pkt)
+            return
         self.send_pkt(pkt)
-        time.sleep(self.send_interval)
+        if self.send_interval > 0:
+            self.send_flush()
+            time.sleep(self.send_interval)
 
-    def send_pkts_with_timewait(self, pkts: Optional[list[SendPkt]] = None):
+    def send_pkts_with_timewait(self,
+                                pkts: Optional[Iterable[SendPkt]] = None):
         if pkts is None:
             pkts = self.get_pkts()
         for pkt in pkts:
             self.send_pkt_with_interval(pkt)
+        self.send_flush()
         time.sleep(self.send_timewait)
 
-    def send_pkts_with_retry(self, pkts: Optional[list[SendPkt]] = None):
-        if pkts is None:
-            pkts = self.get_pkts()
-        for _ in range(self.send_retry):
+    def send_pkts_with_retry(self, pkts: Optional[Iterable[SendPkt]] = None):
+        if pkts is None and not self.send_rebuild:
+            pkts = list(self.get_pkts())
+        for self.send_round in range(self.send_retry):
             self.send_pkts_with_timewait(pkts)
             if self.send_pkts_break_retry():
                 break
@@ -184,9 +438,23 @@ class Sender(Generic[SendPkt], MainRunner):
     def send_pkts_break_retry(self) -> bool:
         raise NotImplementedError
 
-    def send_reset(self):
+    def send_flush(self):
+        """Push out pkts buffered by send_pkt, if any."""
         pass
 
+    def send_feedback(self) -> tuple[int, int]:
+        """Replies and drops seen so far, for adaptive timing."""
+        return 0, 0
+
+    def send_reset(self):
+        self.send_round = 0
+        if self.send_limiter is not None:
+            self.send_limiter.reset()
+
+    def send_report(self):
+        if self.send_limiter is not None:
+            self.logger.info(self.send_limiter.report())
+
     def send(self):
         raise NotImplementedError
 
@@ -197,25 +465,56 @@ class Sender(Generic[SendPkt], MainRunner):
         kwargs['send_retry'] = args.send_retry
         kwargs['send_timewait'] = args.send_timewait
         kwargs['send_interval'] = args.send_interval
+        kwargs['send_rate'] = args.rate
+        kwargs['send_bandwidth'] = args.bandwidth
+        kwargs['send_timing'] = args.timing
         return kwargs
 
 
 class Recver(Generic[RecvPkt]):
     recv_pkts: list[RecvPkt]
+    recv_count: int
+    recv_online: bool
 
-    def __init__(self, **kwargs):
+    def __init__(self, recv_online: bool = False, **kwargs):
         super().__init__(**kwargs)
         self.recv_pkts = []
+        self.recv_count = 0
+        self.recv_online = recv_online
 
     def append_recv_pkt(self, pkt: RecvPkt):
         if self.recv_filter(pkt):
-            self.recv_pkts.append(pkt)
+            self.recv_count += 1
+            if self.recv_online:
+                key = self.recv_update(pkt)
+                if key is not None:
+                    self.recv_resolve(key)
+            else:
+                self.recv_pkts.append(pkt)
+                self.recv_notify(pkt)
 
     def recv_filter(self, pkt: RecvPkt) -> bool:
         return True
 
+    def recv_notify(self, pkt: RecvPkt):
+        pass
+
+    def recv_update(self, pkt: RecvPkt) -> Optional[Hashable]:
+        """Fold pkt into results as it arrives instead of keeping it,
+        return the key of the target it answered, if any."""
+        raise NotImplementedError
+
+    def recv_resolve(self, key: Hashable):
+        """Target identified by key has been answered."""
+        pass
+
+    def recv_drops(self) -> int:
+        """Pkts dropped before reaching us, if the backend knows."""
+        return 0
+
     def recv_reset(self):
         self.recv_pkts.clear()
+        self.recv_count = 0
 
     def recv(self):
         raise NotImplementedError
@@ -223,10 +522,22 @@ class Recver(Generic[RecvPkt]):
 
 class SRScanner(Sender[SendPkt], Recver[RecvPkt], BaseScanner):
     scan_done: bool
+    scan_wakeup: int
+    send_pipeline: bool
+    send_pending: set[Hashable]
+    recv_resolved: set[Hashable]
 
-    def __init__(self, **kwargs):
+    def __init__(self, send_pipeline: bool = False, **kwargs):
         super().__init__(**kwargs)
         self.scan_done = False
+        self.scan_wakeup = -1
+        self.send_pipeline = send_pipeline
+        self.send_pending = set()
+        self.recv_resolved = set()
+        if self.recv_online and \
+           type(self).recv_update is Recver.recv_update:
+            self.logger.warning('online parsing unsupported, disabled')
+            self.recv_online = False
 
     def scan_reset(self):
         self.send_reset()
@@ -237,6 +548,10 @@ class SRScanner(Sender[SendPkt], Recver[RecvPkt], BaseScanner):
     def scan(self):
         self.scan_reset()
 
+        # readable once scan is done, recvers may poll it along with
+        # their own fd instead of checking scan_done periodically
+        self.scan_wakeup, wakeup = os.pipe()
+
         recver = threading.Thread(target=self.recv)
         recver.start()
 
@@ -244,15 +559,112 @@ class SRScanner(Sender[SendPkt], Recver[RecvPkt], BaseScanner):
 
         try:
             self.send()
+            self.send_report()
         except Exception as e:
             exc = e
         finally:
             self.scan_done = True
+            os.write(wakeup, b'\0')
             recver.join()
+            os.close(wakeup)
+            os.close(self.scan_wakeup)
+            self.scan_wakeup = -1
 
         if exc is not None:
             raise exc
 
+    def send_key(self, pkt: SendPkt) -> Hashable:
+        """Identify the target of a sent pkt, see recv_key."""
+        raise NotImplementedError
+
+    def recv_key(self, pkt: RecvPkt) -> Optional[Hashable]:
+        """Identify the target answered by a recv pkt, if any."""
+        raise NotImplementedError
+
+    @override(Recver)
+    def recv_notify(self, pkt: RecvPkt):
+        super().recv_notify(pkt)
+        if self.send_pipeline:
+            key = self.recv_key(pkt)
+            if key is not None:
+                self.recv_resolve(key)
+
+    @override(Recver)
+    def recv_resolve(self, key: Hashable):
+        super().recv_resolve(key)
+        self.recv_resolved.add(key)
+        self.send_pending.discard(key)
+
+    @override(Recver)
+    def recv_reset(self):
+        super().recv_reset()
+        self.recv_resolved.clear()
+
+    def send_pkt_with_deadline(self, wheel: TimerWheel, pkt: SendPkt,
+                               tries: int):
+        key = self.send_key(pkt)
+        self.send_pending.add(key)
+        self.send_pkt_with_interval(pkt)
+        wheel.add(time.monotonic() + self.send_timewait, (key, pkt, tries))
+
+    def send_pkts_expire(self, wheel: TimerWheel):
+        for key, pkt, tries in wheel.expire(time.monotonic()):
+            if key not in self.send_pending:
+                continue
+            if tries < self.send_retry:
+                self.send_pkt_with_deadline(wheel, pkt, tries + 1)
+            else:
+                self.send_pending.discard(key)
+
+    def send_pkts_with_pipeline(self,
+                                pkts: Optional[Iterable[SendPkt]] = None):
+        """Send pkts, retransmitting only unanswered ones on their own
+        deadlines, and return as soon as every pkt is either answered
+        or out of retries."""
+        if pkts is None:
+            pkts = self.get_pkts()
+        wheel: TimerWheel[tuple[Hashable, SendPkt, int]] = \
+            TimerWheel(tick=max(self.send_timewait / 64, 0.001),
+                       now=time.monotonic())
+        for pkt in pkts:
+            self.send_pkt_with_deadline(wheel, pkt, 1)
+            self.send_pkts_expire(wheel)
+        self.send_flush()
+        while len(self.send_pending) != 0:
+            time.sleep(wheel.tick)
+            self.send_pkts_expire(wheel)
+            self.send_flush()
+
+    @override(Sender)
+    def send_reset(self):
+        super().send_reset()
+        self.send_pending.clear()
+
+    @override(Sender)
+    def send_feedback(self) -> tuple[int, int]:
+        return self.recv_count, self.recv_drops()
+
+    @override(Sender)
+    def send_pkts_with_retry(self,
+                             pkts: Optional[Iterable[SendPkt]] = None):
+        if not self.recv_online:
+            super().send_pkts_with_retry(pkts)
+            return
+        # results are known as they arrive, only retry unanswered pkts;
+        # regenerate them each round rather than holding all in memory.
+        # Checkpoints don't record the round, see Resumable
+        fixed = list(pkts) if pkts is not None else None
+        for self.send_round in range(self.send_retry):
+            sent = 0
+            for pkt in fixed if fixed is not None else self.get_pkts():
+                if self.send_key(pkt) not in self.recv_resolved:
+                    self.send_pkt_with_interval(pkt)
+                    sent += 1
+            if sent == 0:
+                break
+            self.send_flush()
+            time.sleep(self.send_timewait)
+
     @override(Sender)
     def send_pkts_break_retry(self) -> bool:
-        return len(self.recv_pkts) != 0
+        return self.recv_count != 0
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import collections
+
+from typing import Any, Optional
+from argparse import Namespace
+
+from ..defaults import CHECKPOINT_INTERVAL
+from .base import SRScanner, MainRunner, BaseScanner
+from .decorators import override
+from .argparser import ScanArgParser
+
+
+class Checkpoint:
+    """Scan state persisted as json, replaced atomically on save."""
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: dict[str, Any]):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Resumable(SRScanner, MainRunner, BaseScanner):
+    """Periodically checkpoint a scan over permuted targets, and resume
+    it from the last checkpoint.
+
+    Subclasses call checkpoint_advance with the permutation position of
+    every target they probe, and probe from scan_cursor every scan_step
+    positions. The saved cursor lags behind by send_timewait *
+    send_retry seconds of probes, whose replies may still be
+    outstanding; they are probed again on resume.
+
+    Checkpointing enables online parsing, so retries resend only the
+    unanswered probes round by round. Positions are marked in the first
+    round only, later rounds leave the cursor at the end of the first;
+    the round is not saved, so a scan interrupted during a retry round
+    resumes from that cursor, and unanswered targets before it are not
+    probed again.
+    """
+
+    checkpoint: Optional[Checkpoint]
+    checkpoint_interval: float
+    checkpoint_time: float
+    checkpoint_marks: collections.deque[tuple[float, int]]
+    resume: bool
+    resume_state: Optional[dict[str, Any]]
+    scan_started: bool
+    scan_cursor: int
+    scan_start: int
+    scan_step: int
+
+    def __init__(self,
+                 checkpoint_path: Optional[str] = None,
+                 checkpoint_interval: float = CHECKPOINT_INTERVAL,
+                 resume: bool = False,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.checkpoint = Checkpoint(checkpoint_path) \
+            if checkpoint_path is not None else None
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_time = 0.0
+        self.checkpoint_marks = collections.deque()
+        self.resume = resume
+        self.resume_state = None
+        self.scan_started = False
+        self.scan_cursor = 0
+        self.scan_start = 0
+        self.scan_step = 1
+        if self.checkpoint is not None and not self.recv_online:
+            # results must be up to date whenever we checkpoint
+            self.logger.info('checkpoint enables online parsing, '
+                             'retry rounds resend unanswered probes')
+            self.recv_online = True
+        if resume and self.checkpoint is None:
+            raise ValueError('resume without checkpoint path')
+
+    def checkpoint_state(self) -> dict[str, Any]:
+        """Scanner specific state to save, e.g. key and results."""
+        raise NotImplementedError
+
+    def checkpoint_restore(self, state: dict[str, Any]):
+        """Restore scanner specific state before scan; results are
+        restored from resume_state when they are reset."""
+        raise NotImplementedError
+
+    def checkpoint_size(self) -> int:
+        """Number of targets, to refuse resuming a different scan."""
+        raise NotImplementedError
+
+    def checkpoint_cursor(self, now: float) -> int:
+        window = self.send_timewait * max(self.send_retry, 1)
+        marks = self.checkpoint_marks
+        while len(marks) >= 2 and marks[1][0] <= now - window:
+            marks.popleft()
+        if len(marks) != 0 and marks[0][0] <= now - window:
+            return marks[0][1]
+        return self.scan_cursor
+
+    def checkpoint_save(self, cursor: Optional[int] = None):
+        if self.checkpoint is None:
+            return
+        now = time.monotonic()
+        if cursor is None:
+            cursor = self.checkpoint_cursor(now)
+        state = self.checkpoint_state()
+        state['scanner'] = type(self).__name__
+        state['size'] = self.checkpoint_size()
+        state['step'] = self.scan_step
+        state['cursor'] = cursor
+        self.checkpoint.save(state)
+        self.checkpoint_time = now
+        self.logger.debug('checkpoint at %d', cursor)
+
+    def checkpoint_advance(self, pos: int):
+        """Record that the target at permutation position pos is about
+        to be probed, checkpoint if due."""
+        if self.checkpoint is None:
+            return
+        now = time.monotonic()
+        marks = self.checkpoint_marks
+        # retry rounds probe positions that are already behind
+        if self.send_round == 0 and \
+           (len(marks) == 0 or now - marks[-1][0] >= 0.1):
+            marks.append((now, pos))
+        if now - self.checkpoint_time >= self.checkpoint_interval:
+            self.checkpoint_save()
+
+    def checkpoint_load(self) -> Optional[dict[str, Any]]:
+        if not self.resume or self.checkpoint is None:
+            return None
+        state = self.checkpoint.load()
+        if state is None:
+            self.logger.warning('no checkpoint, start from scratch')
+            return None
+        if state.get('scanner') != type(self).__name__ or \
+           state.get('size') != self.checkpoint_size() or \
+           state.get('step') != self.scan_step or \
+           state.get('cursor', -1) % self.scan_step != self.scan_start:
+            raise RuntimeError('checkpoint is from another scan')
+        return state
+
+    @override(SRScanner)
+    def scan_reset(self):
+        super().scan_reset()
+        self.checkpoint_marks.clear()
+        self.checkpoint_time = time.monotonic()
+        self.scan_started = True
+
+    @override(SRScanner)
+    def scan(self):
+        # restore before subclasses set up anything depending on the
+        # scan key, e.g. the pcap filter
+        state = self.resume_state = self.checkpoint_load()
+        self.scan_cursor = self.scan_start
+        self.scan_started = False
+        if state is not None:
+            self.checkpoint_restore(state)
+            self.scan_cursor = state['cursor']
+            self.logger.info('resume from %d', self.scan_cursor)
+        try:
+            super().scan()
+        except (Exception, KeyboardInterrupt):
+            # nothing to save if the scan failed while setting up
+            if self.scan_started:
+                self.checkpoint_save()
+            raise
+
+    @override(BaseScanner)
+    def scan_and_export(self):
+        super().scan_and_export()
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+    @classmethod
+    @override(MainRunner)
+    def get_argparser(cls, *args, **kwargs) -> ScanArgParser:
+        parser = super().get_argparser(*args, **kwargs)
+        parser.add_pipeline()
+        parser.add_online()
+        parser.add_checkpoint()
+        return parser
+
+    @classmethod
+    @override(MainRunner)
+    def parse_args(cls, args: Namespace) -> dict[str, Any]:
+        kwargs = super().parse_args(args)
+        kwargs['send_pipeline'] = args.pipeline
+        kwargs['recv_online'] = args.online
+        kwargs['checkpoint_path'] = args.checkpoint
+        kwargs['resume'] = args.resume
+        return kwargs
@@ -0,0 +1,25 @@
+import struct
+import hashlib
+
+
+class ProbeCookie:
+    """Keyed 32 bits cookie of a probe's (dst, dport).
+
+    Replies echo the cookie back (in ack, echo seq or payload), so they
+    are validated by recomputing it from their (src, sport); replies to
+    other scans or spoofed ones fail the check.
+    """
+
+    key: bytes
+
+    def __init__(self, key: int):
+        self.key = (key & ((1 << 128) - 1)).to_bytes(16, 'big')
+
+    def make(self, addr: bytes, port: int = 0) -> int:
+        h = hashlib.blake2b(addr + struct.pack('!H', port),
+                            digest_size=4,
+                            key=self.key)
+        return int.from_bytes(h.digest(), 'big')
+
+    def check(self, cookie: int, addr: bytes, port: int = 0) -> bool:
+        return cookie == self.make(addr, port)
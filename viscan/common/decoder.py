@@ -0,0 +1,155 @@
+import struct
+
+from typing import Optional, Union
+
+# Links:
+#   https://www.tcpdump.org/linktypes.html
+#   https://www.rfc-editor.org/rfc/rfc8200 (IPv6 extension headers)
+#   https://www.rfc-editor.org/rfc/rfc4443 (ICMPv6 error messages)
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+DLT_NULL = 0
+DLT_EN10MB = 1
+DLT_RAW = 12
+DLT_LINKTYPE_RAW = 101
+DLT_LOOP = 108
+DLT_LINUX_SLL = 113
+DLT_LINUX_SLL2 = 276
+
+ETH_P_IPV6 = 0x86dd
+ETH_P_8021Q = 0x8100
+ETH_P_8021AD = 0x88a8
+
+# AF_INET6 of linux, freebsd, darwin and openbsd for DLT_NULL/DLT_LOOP
+BSD_AF_INET6 = (10, 24, 28, 30)
+
+IPPROTO_HOPOPTS = 0
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ROUTING = 43
+IPPROTO_FRAGMENT = 44
+IPPROTO_AH = 51
+IPPROTO_ICMPV6 = 58
+IPPROTO_NONE = 59
+IPPROTO_DSTOPTS = 60
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
+ICMP6_ERRORS = (1, 2, 3, 4)  # unreach, too big, time exceeded, param
+
+
+def ip6_offset(buf: Buffer, linktype: int = DLT_EN10MB) -> int:
+    """Return offset of the IPv6 header in a captured frame, -1 if the
+    frame doesn't carry IPv6."""
+    if linktype == DLT_EN10MB:
+        off = 12
+        proto, = struct.unpack_from('!H', buf, off)
+        while proto in (ETH_P_8021Q, ETH_P_8021AD):
+            off += 4
+            proto, = struct.unpack_from('!H', buf, off)
+        return off + 2 if proto == ETH_P_IPV6 else -1
+    if linktype in (DLT_RAW, DLT_LINKTYPE_RAW):
+        return 0 if buf[0] >> 4 == 6 else -1
+    if linktype == DLT_LINUX_SLL:
+        proto, = struct.unpack_from('!H', buf, 14)
+        return 16 if proto == ETH_P_IPV6 else -1
+    if linktype == DLT_LINUX_SLL2:
+        proto, = struct.unpack_from('!H', buf, 0)
+        return 20 if proto == ETH_P_IPV6 else -1
+    if linktype in (DLT_NULL, DLT_LOOP):
+        # DLT_NULL family is in host order of the capturing machine
+        family, = struct.unpack_from('!I', buf, 0)
+        if family in BSD_AF_INET6 or \
+           family >> 24 in BSD_AF_INET6 and family & 0xffffff == 0:
+            return 4
+        return -1
+    raise ValueError(f'unsupported link type: {linktype}')
+
+
+class DecodedIP6:
+    """Fields of an IPv6 packet that scanners match replies on.
+
+    Transport fields are only meaningful if nh says so: sport, dport,
+    seq, ack and flags for TCP; sport and dport for UDP; icmp6_type and
+    icmp6_code for ICMPv6, with inner set to the decoded invoking
+    packet of an error message.
+    """
+
+    __slots__ = ('src', 'dst', 'hlim', 'nh', 'offset', 'sport', 'dport',
+                 'seq', 'ack', 'flags', 'icmp6_type', 'icmp6_code',
+                 'inner')
+
+    src: bytes
+    dst: bytes
+    hlim: int
+    nh: int
+    offset: int
+    sport: int
+    dport: int
+    seq: int
+    ack: int
+    flags: int
+    icmp6_type: int
+    icmp6_code: int
+    inner: Optional['DecodedIP6']
+
+    def __init__(self, buf: Buffer, off: int = 0, inner: bool = True):
+        """Decode the IPv6 packet at off of buf; the upper layer may be
+        truncated, as in the invoking packet of an ICMPv6 error."""
+        if buf[off] >> 4 != 6:
+            raise ValueError('not an ipv6 packet')
+        nh, self.hlim, self.src, self.dst = \
+            struct.unpack_from('!BB16s16s', buf, off + 6)
+        off += 40
+        end = len(buf)
+        while nh in (IPPROTO_HOPOPTS, IPPROTO_ROUTING, IPPROTO_DSTOPTS,
+                     IPPROTO_FRAGMENT, IPPROTO_AH):
+            if off + 8 > end:
+                nh = IPPROTO_NONE
+                break
+            if nh == IPPROTO_FRAGMENT:
+                nxt, frag = struct.unpack_from('!BxH', buf, off)
+                # non first fragments don't carry upper layer header
+                nh = nxt if frag & 0xfff8 == 0 else IPPROTO_NONE
+                off += 8
+            elif nh == IPPROTO_AH:
+                nh, hlen = struct.unpack_from('!BB', buf, off)
+                off += (hlen + 2) * 4
+            else:
+                nh, hlen = struct.unpack_from('!BB', buf, off)
+                off += (hlen + 1) * 8
+        self.nh = nh
+        self.offset = off
+        self.sport = self.dport = self.seq = self.ack = self.flags = 0
+        self.icmp6_type = self.icmp6_code = 0
+        self.inner = None
+        if nh == IPPROTO_TCP:
+            if off + 14 <= end:
+                self.sport, self.dport, self.seq, self.ack, _, \
+                    self.flags = struct.unpack_from('!HHIIBB', buf, off)
+            elif off + 4 <= end:
+                self.sport, self.dport = struct.unpack_from('!HH', buf, off)
+        elif nh == IPPROTO_UDP:
+            if off + 4 <= end:
+                self.sport, self.dport = struct.unpack_from('!HH', buf, off)
+        elif nh == IPPROTO_ICMPV6:
+            if off + 2 <= end:
+                self.icmp6_type, self.icmp6_code = \
+                    struct.unpack_from('!BB', buf, off)
+            if inner and self.icmp6_type in ICMP6_ERRORS and \
+               off + 48 <= end:
+                self.inner = DecodedIP6(buf, off + 8, inner=False)
+
+
+def decode(buf: Buffer,
+           linktype: int = DLT_EN10MB) -> Optional[DecodedIP6]:
+    """Decode a captured frame, None if it doesn't carry IPv6."""
+    off = ip6_offset(buf, linktype)
+    if off < 0:
+        return None
+    return DecodedIP6(buf, off)
@@ -3,8 +3,10 @@ import socket
 
 from typing import Optional
 
+from ..defaults import RECV_BATCH
 from .base import SRScanner
 from .decorators import override
+from .mmsg import MmsgRecver
 from .icmp6_utils import (
     ICMP6Filter,
     ICMP6_ECHO_REP,
@@ -14,37 +16,67 @@ Pkt = tuple[str, int, bytes]
 
 
 class DgramScanner(SRScanner[Pkt, Pkt]):
-    sock: socket.socket
+    sock: Optional[socket.socket]
+    recver: MmsgRecver
 
     sock_family: int = socket.AF_INET6
     sock_type: int = -1
     sock_proto: int = -1
+    sock_overhead: int = 54  # ethernet and ipv6 header
 
     def __init__(self, sock: Optional[socket.socket] = None, **kwargs):
         super().__init__(**kwargs)
-        self.sock = sock if sock is not None else self.get_sock()
+        # opened on first scan, so scanners only merging and exporting
+        # results, e.g. the parent of shards, need no raw socket
+        self.sock = sock
+        self.recver = MmsgRecver(batch=RECV_BATCH)
 
     def get_sock(self) -> socket.socket:
         sock = socket.socket(self.sock_family, self.sock_type, self.sock_proto)
         sock.setblocking(False)
         return sock
 
+    def open_sock(self) -> socket.socket:
+        if self.sock is None:
+            self.sock = self.get_sock()
+        return self.sock
+
+    @override(SRScanner)
+    def scan(self):
+        self.open_sock()
+        super().scan()
+
     @override(SRScanner)
     def send_pkt(self, pkt: Pkt):
         addr, port, buf = pkt
+        assert self.sock is not None
         self.sock.sendto(buf, (addr, port))
 
+    @override(SRScanner)
+    def send_size(self, pkt: Pkt) -> int:
+        return len(pkt[2]) + self.sock_overhead
+
     @override(SRScanner)
     def recv(self):
+        assert self.sock is not None
+        poller = select.epoll()
+        try:
+            poller.register(self.sock.fileno(), select.EPOLLIN)
+            poller.register(self.scan_wakeup, select.EPOLLIN)
+            while not self.scan_done:
+                poller.poll()
+                self.recv_drain()
+        finally:
+            poller.close()
+
+    def recv_drain(self):
+        """Read until the socket would block."""
+        assert self.sock is not None
         while not self.scan_done:
-            rlist, _, _ = select.select([self.sock], [], [], 1)
-            if rlist:
-                buf, addrport = self.sock.recvfrom(4096)
-                addr, port = '', 0
-                if len(addrport) >= 1:
-                    addr = addrport[0]
-                if len(addrport) >= 2:
-                    port = addrport[1]
+            pkts = self.recver.recv(self.sock)
+            if len(pkts) == 0:
+                break
+            for buf, (addr, port) in pkts:
                 self.append_recv_pkt((addr, port, buf))
 
 
@@ -67,6 +99,7 @@ class ICMP6Scanner(DgramScanner):
 
 class UDPScanner(DgramScanner):
     sock_type = socket.SOCK_DGRAM
+    sock_overhead = 62  # ethernet, ipv6 and udp header
 
     udp_addr: tuple[str, int] = ('::', 0)
 
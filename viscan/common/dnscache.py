@@ -0,0 +1,352 @@
+import time
+import base64
+import bisect
+import threading
+
+import dns.rcode
+import dns.dnssec
+import dns.message
+import dns.rdatatype
+
+from typing import Any, Optional
+
+from ..defaults import DNS_CACHE_TTL, DNS_SERVFAIL_TTL
+from .checkpoint import Checkpoint
+
+NOERROR = dns.rcode.NOERROR
+NXDOMAIN = dns.rcode.NXDOMAIN
+SERVFAIL = dns.rcode.SERVFAIL
+
+NSEC3_OPTOUT = 1
+
+Key = tuple[str, ...]
+
+
+B32HEX = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567',
+                         b'0123456789ABCDEFGHIJKLMNOPQRSTUV')
+
+
+def b32hex(data: bytes) -> str:
+    """Base32hex of an NSEC3 hash, b32hexencode needs python 3.10."""
+    return base64.b32encode(data).translate(B32HEX).decode()
+
+
+def name_key(name: str) -> Key:
+    """Sort key of name in DNSSEC canonical order."""
+    return tuple(name.lower().rstrip('.').split('.')[::-1])
+
+
+def in_zone(name: str, zone: str) -> bool:
+    return name == zone or name.endswith(f'.{zone}')
+
+
+def key_name(key: Key) -> str:
+    return '.'.join(key[::-1]) + '.'
+
+
+def has_type(rdata, rdtype: int) -> bool:
+    """Whether the type bitmap of an NSEC or NSEC3 rdata has rdtype."""
+    window, bit = rdtype >> 8, rdtype & 0xff
+    for w, bitmap in rdata.windows:
+        if w == window:
+            return bit >> 3 < len(bitmap) and \
+                bitmap[bit >> 3] & (0x80 >> (bit & 7)) != 0
+    return False
+
+
+def is_cut(rdata) -> bool:
+    """Whether an NSEC or NSEC3 rdata is from the parent side of a zone
+    cut, which proves nothing about names below its owner (RFC 6840
+    section 4.1)."""
+    return has_type(rdata, dns.rdatatype.NS) and \
+        not has_type(rdata, dns.rdatatype.SOA)
+
+
+def closest_zone(name: str, zones) -> Optional[str]:
+    """The longest of zones that name is in."""
+    closest = None
+    for zone in zones:
+        if in_zone(name, zone) and \
+           (closest is None or len(zone) > len(closest)):
+            closest = zone
+    return closest
+
+
+class Spans:
+    """Sorted (owner, next) spans of nonexistent names from the NSEC or
+    NSEC3 records of one zone, the last span wraps around. Owners at
+    zone cuts are flagged, see is_cut."""
+
+    owners: list[Any]
+    spans: dict[Any, tuple[Any, float, bool]]
+
+    def __init__(self):
+        self.owners = []
+        self.spans = dict()
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def add(self, owner: Any, next: Any, expire: float, cut: bool = False):
+        if owner not in self.spans:
+            bisect.insort(self.owners, owner)
+        self.spans[owner] = (next, expire, cut)
+
+    def find(self, key: Any,
+             now: float) -> Optional[tuple[Any, Any, bool]]:
+        """Return the span strictly covering key, which must be in the
+        zone of the spans."""
+        if len(self.owners) == 0:
+            return None
+        # the span before the first owner is the wrapped last one
+        owner = self.owners[bisect.bisect_left(self.owners, key) - 1]
+        next, expire, cut = self.spans[owner]
+        if expire <= now:
+            return None
+        if owner < key < next or next <= owner and (key > owner
+                                                    or key < next):
+            return owner, next, cut
+        return None
+
+    def exists(self, key: Any, now: float) -> bool:
+        span = self.spans.get(key)
+        return span is not None and span[1] > now
+
+    def is_cut(self, key: Any, now: float) -> bool:
+        span = self.spans.get(key)
+        return span is not None and span[1] > now and span[2]
+
+    def expire(self, now: float):
+        self.owners = [
+            owner for owner in self.owners if self.spans[owner][1] > now
+        ]
+        self.spans = {owner: self.spans[owner] for owner in self.owners}
+
+
+class NSEC3Zone:
+    """NSEC3 parameters and hashed spans of a signed zone."""
+
+    salt: bytes
+    iterations: int
+    algorithm: int
+    spans: Spans
+
+    def __init__(self, salt: bytes, iterations: int, algorithm: int):
+        self.salt = salt
+        self.iterations = iterations
+        self.algorithm = algorithm
+        self.spans = Spans()
+
+    def hash(self, name: str) -> str:
+        return dns.dnssec.nsec3_hash(name, self.salt, self.iterations,
+                                     self.algorithm)
+
+
+class DNSCache:
+    """Outcomes of queries by name with ttl, persisted as json.
+
+    Besides cached outcomes, a name is known not to exist if an
+    ancestor does not exist (RFC 8020), or if it is covered by an NSEC
+    or NSEC3 span of the closest signed zone; names proven by NSEC
+    records exist along with their ancestors, which lets a walk skip
+    the queries for most children of a signed zone.
+    """
+
+    entries: dict[str, tuple[int, float]]
+    nsec: dict[str, Spans]
+    nsec3: dict[str, NSEC3Zone]
+    checkpoint: Optional[Checkpoint]
+    lock: threading.Lock
+    hits: int
+    misses: int
+
+    def __init__(self, path: Optional[str] = None):
+        self.entries = dict()
+        self.nsec = dict()
+        self.nsec3 = dict()
+        self.checkpoint = Checkpoint(path) if path is not None else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, name: str, now: float) -> Optional[int]:
+        name = name.lower()
+        entry = self.entries.get(name)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        pos = name.find('.')
+        while 0 <= pos < len(name) - 1:
+            entry = self.entries.get(name[pos + 1:])
+            if entry is not None and entry[0] == NXDOMAIN and \
+               entry[1] > now:
+                return NXDOMAIN
+            pos = name.find('.', pos + 1)
+        zone = closest_zone(name, self.nsec)
+        if zone is not None:
+            key = name_key(name)
+            span = self.nsec[zone].find(key, now)
+            if span is not None:
+                owner, next, cut = span
+                # names below a delegation are in the child zone
+                if not cut or key[:len(owner)] != owner:
+                    # an empty non terminal sorts within a span and has
+                    # a descendant as next name
+                    return NOERROR if next[:len(key)] == key else NXDOMAIN
+        zone = closest_zone(name, self.nsec3)
+        if zone is not None:
+            nsec3 = self.nsec3[zone]
+            h = nsec3.hash(name)
+            if nsec3.spans.exists(h, now):
+                return NOERROR
+            if nsec3.spans.find(h, now) is not None and \
+               not self.below_nsec3_cut(nsec3, name, zone, now):
+                return NXDOMAIN
+        return None
+
+    def below_nsec3_cut(self, nsec3: NSEC3Zone, name: str, zone: str,
+                        now: float) -> bool:
+        pos = name.find('.')
+        while 0 <= pos and name[pos + 1:] != zone:
+            if nsec3.spans.is_cut(nsec3.hash(name[pos + 1:]), now):
+                return True
+            pos = name.find('.', pos + 1)
+        return False
+
+    def get(self, name: str) -> Optional[int]:
+        with self.lock:
+            rcode = self.lookup(name, time.time())
+            if rcode is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return rcode
+
+    def put_exists(self, name: str, zone: str, expire: float):
+        """Record that name and its ancestors within zone exist."""
+        while in_zone(name, zone):
+            entry = self.entries.get(name)
+            if entry is None or entry[1] < expire:
+                self.entries[name] = (NOERROR, expire)
+            if name == zone:
+                break
+            name = name[name.find('.') + 1:]
+
+    def update(self, name: str, response: dns.message.Message):
+        """Cache the outcome of querying name and the NSEC/NSEC3
+        records in the response."""
+        rcode = response.rcode()
+        if rcode not in (NOERROR, NXDOMAIN, SERVFAIL):
+            return
+        ttl = float(DNS_SERVFAIL_TTL if rcode == SERVFAIL else DNS_CACHE_TTL)
+        for rrset in response.answer:
+            ttl = min(ttl, rrset.ttl)
+        now = time.time()
+        zone = None
+        signers: dict[str, str] = dict()
+        for rrset in response.authority:
+            if rrset.rdtype == dns.rdatatype.SOA:
+                # negative ttl, RFC 2308
+                ttl = min(ttl, rrset.ttl, rrset[0].minimum)
+                zone = rrset.name.to_text().lower()
+            elif rrset.rdtype == dns.rdatatype.RRSIG and \
+                    rrset.covers == dns.rdatatype.NSEC:
+                signers[rrset.name.to_text().lower()] = \
+                    rrset[0].signer.to_text().lower()
+        with self.lock:
+            # first, so that a bad NSEC record does not lose the outcome
+            self.entries[name.lower()] = (rcode, now + ttl)
+            for rrset in response.authority:
+                if rrset.rdtype == dns.rdatatype.NSEC:
+                    owner = rrset.name.to_text().lower()
+                    self.update_nsec(rrset, signers.get(owner, zone), now)
+                elif rrset.rdtype == dns.rdatatype.NSEC3:
+                    self.update_nsec3(rrset, now)
+
+    def update_nsec(self, rrset, zone: Optional[str], now: float):
+        owner = rrset.name.to_text().lower()
+        expire = now + rrset.ttl
+        for rdata in rrset:
+            next = rdata.next.to_text().lower()
+            self.put_exists(owner, zone or owner, expire)
+            self.put_exists(next, zone or next, expire)
+            # without its zone, a wrapped span would cover everything
+            # outside the zone
+            if zone is None or not in_zone(owner, zone):
+                continue
+            spans = self.nsec.get(zone)
+            if spans is None:
+                spans = self.nsec[zone] = Spans()
+            spans.add(name_key(owner), name_key(next), expire, is_cut(rdata))
+
+    def update_nsec3(self, rrset, now: float):
+        label, _, zone = rrset.name.to_text().lower().partition('.')
+        expire = now + rrset.ttl
+        for rdata in rrset:
+            if rdata.flags & NSEC3_OPTOUT:
+                continue
+            nsec3 = self.nsec3.get(zone)
+            if nsec3 is None or \
+               (nsec3.salt, nsec3.iterations, nsec3.algorithm) != \
+               (rdata.salt, rdata.iterations, rdata.algorithm):
+                nsec3 = self.nsec3[zone] = NSEC3Zone(
+                    rdata.salt, rdata.iterations, rdata.algorithm)
+            nsec3.spans.add(label.upper(), b32hex(rdata.next), expire,
+                            is_cut(rdata))
+
+    def load(self):
+        if self.checkpoint is None:
+            return
+        state = self.checkpoint.load()
+        if state is None:
+            return
+        now = time.time()
+        with self.lock:
+            for name, (rcode, expire) in state['entries'].items():
+                if expire > now:
+                    self.entries[name] = (rcode, expire)
+            for zone, spans in state['nsec'].items():
+                nsec = self.nsec[zone] = Spans()
+                for owner, next, expire, cut in spans:
+                    if expire > now:
+                        nsec.add(name_key(owner), name_key(next), expire, cut)
+            for zone, (salt, iterations, algorithm, spans) in \
+                    state['nsec3'].items():
+                nsec3 = self.nsec3[zone] = NSEC3Zone(
+                    bytes.fromhex(salt), iterations, algorithm)
+                for owner, next, expire, cut in spans:
+                    if expire > now:
+                        nsec3.spans.add(owner, next, expire, cut)
+
+    def save(self):
+        if self.checkpoint is None:
+            return
+        now = time.time()
+        with self.lock:
+            for nsec in self.nsec.values():
+                nsec.expire(now)
+            for nsec3 in self.nsec3.values():
+                nsec3.spans.expire(now)
+            state = {
+                'entries': {
+                    name: entry
+                    for name, entry in self.entries.items() if entry[1] > now
+                },
+                'nsec': {
+                    zone: [(key_name(owner), key_name(next), expire, cut)
+                           for owner, (next, expire, cut)
+                           in nsec.spans.items()]
+                    for zone, nsec in self.nsec.items()
+                },
+                'nsec3': {
+                    zone: (nsec3.salt.hex(), nsec3.iterations,
+                           nsec3.algorithm,
+                           [(owner, next, expire, cut)
+                            for owner, (next, expire, cut)
+                            in nsec3.spans.spans.items()])
+                    for zone, nsec3 in self.nsec3.items()
+                },
+            }
+        self.checkpoint.save(state)
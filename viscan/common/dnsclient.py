@@ -0,0 +1,237 @@
+import random
+import socket
+import struct
+import threading
+
+import dns.message
+import dns.exception
+
+from typing import Optional
+from concurrent.futures import Future, TimeoutError
+
+from .base import Loggable
+
+
+class DNSConn(Loggable):
+    """A socket to a nameserver shared by concurrent queries, replies
+    are matched to queries by transaction id in a reader thread."""
+
+    socktype = socket.SOCK_DGRAM
+
+    family: socket.AddressFamily
+    addr: tuple
+    sock: Optional[socket.socket]
+    pending: dict[int, tuple[dns.message.Message, Future]]
+    lock: threading.Lock
+    reader: Optional[threading.Thread]
+
+    def __init__(self, nameserver: str, port: int = 53, **kwargs):
+        super().__init__(**kwargs)
+        info = socket.getaddrinfo(nameserver, port, type=self.socktype)
+        self.family, _, _, _, self.addr = info[0]
+        self.sock = None
+        self.pending = dict()
+        self.lock = threading.Lock()
+        self.reader = None
+
+    def connect(self) -> socket.socket:
+        sock = socket.socket(self.family, self.socktype)
+        sock.connect(self.addr)
+        return sock
+
+    def send_wire(self, sock: socket.socket, wire: bytes):
+        sock.send(wire)
+
+    def recv_wire(self, sock: socket.socket) -> bytes:
+        return sock.recv(65535)
+
+    def query(self, query: dns.message.Message,
+              timeout: float) -> dns.message.Message:
+        future: Future[dns.message.Message] = Future()
+        with self.lock:
+            if self.sock is None:
+                self.sock = self.connect()
+                self.reader = threading.Thread(target=self.read,
+                                               args=(self.sock, ),
+                                               daemon=True)
+                self.reader.start()
+            sock = self.sock
+            while True:
+                query.id = random.getrandbits(16)
+                if query.id not in self.pending:
+                    break
+            self.pending[query.id] = (query, future)
+            try:
+                self.send_wire(sock, query.to_wire())
+            except OSError:
+                del self.pending[query.id]
+                raise
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            raise dns.exception.Timeout(timeout=timeout)
+        finally:
+            with self.lock:
+                entry = self.pending.get(query.id)
+                if entry is not None and entry[1] is future:
+                    del self.pending[query.id]
+
+    def read(self, sock: socket.socket):
+        error: Exception = EOFError('connection closed')
+        try:
+            while True:
+                wire = self.recv_wire(sock)
+                if len(wire) == 0:
+                    break
+                self.dispatch(wire)
+        except OSError as e:
+            error = e
+        self.logger.debug('reader of %s exits: %s', self.addr, error)
+        with self.lock:
+            if self.sock is sock:
+                self.sock = None
+                pending = list(self.pending.values())
+                self.pending.clear()
+            else:
+                pending = []
+        sock.close()
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def dispatch(self, wire: bytes):
+        if len(wire) < 2:
+            return
+        txid, = struct.unpack_from('!H', wire)
+        with self.lock:
+            entry = self.pending.get(txid)
+        if entry is None:
+            return
+        query, future = entry
+        try:
+            response = dns.message.from_wire(wire)
+            if not query.is_response(response):
+                return
+        except Exception as e:
+            self.logger.debug('except while parsing: %s', e)
+            return
+        with self.lock:
+            if self.pending.get(txid) is entry:
+                del self.pending[txid]
+        if not future.done():
+            future.set_result(response)
+
+    def close(self):
+        with self.lock:
+            sock, self.sock = self.sock, None
+            reader, self.reader = self.reader, None
+        if sock is not None:
+            # wake up the blocking recv of the reader
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if reader is not None:
+            reader.join()
+        if sock is not None:
+            sock.close()
+
+
+class UDPConn(DNSConn):
+    """One long lived connected udp socket."""
+
+    def recv_wire(self, sock: socket.socket) -> bytes:
+        while True:
+            try:
+                return super().recv_wire(sock)
+            except ConnectionRefusedError:
+                # icmp port unreachable, pending queries just time out
+                continue
+
+
+class TCPConn(DNSConn):
+    """A persistent tcp connection with pipelined queries, RFC 7766,
+    reconnected on demand when the server closes it."""
+
+    socktype = socket.SOCK_STREAM
+
+    def connect(self) -> socket.socket:
+        sock = super().connect()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def send_wire(self, sock: socket.socket, wire: bytes):
+        sock.sendall(struct.pack('!H', len(wire)) + wire)
+
+    def recv_exact(self, sock: socket.socket, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            data = sock.recv(n - len(buf))
+            if len(data) == 0:
+                return b''
+            buf += data
+        return bytes(buf)
+
+    def recv_wire(self, sock: socket.socket) -> bytes:
+        head = self.recv_exact(sock, 2)
+        if len(head) == 0:
+            return b''
+        n, = struct.unpack('!H', head)
+        return self.recv_exact(sock, n)
+
+
+class DNSClient(Loggable):
+    """Persistent connections to nameservers: one udp socket each, or a
+    pool of tcp connections each."""
+
+    conns: dict[str, list[DNSConn]]
+    via_tcp: bool
+    tcp_conns: int
+    port: int
+    lock: threading.Lock
+
+    def __init__(self,
+                 via_tcp: bool = False,
+                 tcp_conns: int = 1,
+                 port: int = 53,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.conns = dict()
+        self.via_tcp = via_tcp
+        self.tcp_conns = tcp_conns
+        self.port = port
+        self.lock = threading.Lock()
+
+    def get_conns(self, nameserver: str) -> list[DNSConn]:
+        with self.lock:
+            conns = self.conns.get(nameserver)
+            if conns is None:
+                if self.via_tcp:
+                    conns = [
+                        TCPConn(nameserver, self.port)
+                        for _ in range(self.tcp_conns)
+                    ]
+                else:
+                    conns = [UDPConn(nameserver, self.port)]
+                self.conns[nameserver] = conns
+            return conns
+
+    def query(self, query: dns.message.Message, nameserver: str,
+              timeout: float) -> dns.message.Message:
+        conns = self.get_conns(nameserver)
+        # prefer the connection with fewest queries in flight
+        conn = min(conns, key=lambda conn: len(conn.pending))
+        return conn.query(query, timeout)
+
+    def close(self):
+        with self.lock:
+            conns, self.conns = self.conns, dict()
+        for nsconns in conns.values():
+            for conn in nsconns:
+                conn.close()
+
+    def __enter__(self) -> 'DNSClient':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
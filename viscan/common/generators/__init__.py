@@ -1,5 +1,8 @@
 # flake8: noqa
 
+from .permutation import Permutation
+from .target_generator import TargetGenerator
+from .range_generator import RangeGenerator
 from .addr_generator import AddrGenerator
 from .port_generator import PortGenerator
 from .addrport_generator import AddrPortGenerator
@@ -3,25 +3,22 @@ import re
 import socket
 import ipaddress
 
-from ...defaults import MAX_TARGETS
+from .range_generator import RangeGenerator
 
 
-class AddrGenerator:
-    addrs: set[str]
-    skip_check_max_targets: bool
-
+class AddrGenerator(RangeGenerator[str]):
     subnet_addrs_re = re.compile(r'^(.*)/(\d+)$')
     range_addrs_re = re.compile(r'^(.*)-(.*)$')
 
-    def __init__(self, addrs: list[str], skip_check_max_targets: bool = False):
-        self.addrs = set()
-        self.skip_check_max_targets = skip_check_max_targets
+    def __init__(self, addrs: list[str]):
+        super().__init__()
         for addr in addrs:
             if self.try_add_subnet_addrs(addr) or \
                self.try_add_range_addrs(addr) or \
                self.try_add_single_addr(addr):
                 continue
             raise ValueError(f'invalid addr str: {addr}')
+        self.merge_ranges()
 
     @staticmethod
     def resolve(addr):
@@ -31,10 +28,11 @@ class AddrGenerator:
                                   type=socket.SOCK_DGRAM)
         return random.choice(info)[-1][0]
 
-    def add_addr(self, addr: str):
-        self.addrs.add(addr)
-        if not self.skip_check_max_targets and len(self.addrs) > MAX_TARGETS:
-            raise ValueError('too many addrs')
+    def from_int(self, i: int) -> str:
+        return str(ipaddress.IPv6Address(i))
+
+    def to_int(self, addr: str) -> int:
+        return int(ipaddress.IPv6Address(addr))
 
     def try_add_subnet_addrs(self, addr_str: str) -> bool:
         res = self.subnet_addrs_re.match(addr_str)
@@ -42,8 +40,8 @@ class AddrGenerator:
             return False
         addr, diff = self.resolve(res[1]), int(res[2])
         network = ipaddress.IPv6Network(f'{addr}/{diff}', strict=False)
-        for addr in network:
-            self.add_addr(str(addr))
+        self.add_range(int(network.network_address),
+                       int(network.broadcast_address) + 1)
         return True
 
     def try_add_range_addrs(self, addr_str: str) -> bool:
@@ -55,11 +53,10 @@ class AddrGenerator:
         a2 = int(ipaddress.IPv6Address(addr2))
         if a1 >= a2:
             raise ValueError(f'invalid range addrs: {addr1}-{addr2}')
-        for a in range(a1, a2):
-            self.add_addr(str(ipaddress.IPv6Address(a)))
+        self.add_range(a1, a2)
         return True
 
     def try_add_single_addr(self, addr_str: str) -> bool:
-        addr = self.resolve(addr_str)
-        self.add_addr(addr)
+        a = int(ipaddress.IPv6Address(self.resolve(addr_str)))
+        self.add_range(a, a + 1)
         return True
@@ -1,23 +1,41 @@
-from ...defaults import MAX_TARGETS
+from collections.abc import Iterator
+
+from .target_generator import TargetGenerator
 from .addr_generator import AddrGenerator
 from .port_generator import PortGenerator
 
 
-class AddrPortGenerator(AddrGenerator, PortGenerator):
-    addrports: list[tuple[str, int]]
-
-    def __init__(self,
-                 addrs: list[str],
-                 ports: list[str],
-                 skip_check_max_targets: bool = False):
-        AddrGenerator.__init__(self,
-                               addrs,
-                               skip_check_max_targets=skip_check_max_targets)
-        PortGenerator.__init__(self,
-                               ports,
-                               skip_check_max_targets=skip_check_max_targets)
-        if not skip_check_max_targets and \
-           len(self.addrs) * len(self.ports) > MAX_TARGETS:
-            raise ValueError('too many targets')
-        self.addrports = [(addr, port) for addr in self.addrs
-                          for port in self.ports]
+class AddrPortGenerator(TargetGenerator[tuple[str, int]]):
+    """Lazy cross product of addrs and ports, addr major."""
+
+    addrs: AddrGenerator
+    ports: PortGenerator
+
+    def __init__(self, addrs: list[str], ports: list[str]):
+        self.addrs = AddrGenerator(addrs)
+        self.ports = PortGenerator(ports)
+        self.size = self.addrs.size * self.ports.size
+
+    def getint(self, index: int) -> tuple[int, int]:
+        i, j = divmod(index, self.ports.size)
+        return self.addrs.getint(i), self.ports.getint(j)
+
+    def iterints(self) -> Iterator[tuple[int, int]]:
+        for a in self.addrs.iterints():
+            for port in self.ports.iterints():
+                yield a, port
+
+    def get(self, index: int) -> tuple[str, int]:
+        a, port = self.getint(index)
+        return self.addrs.from_int(a), port
+
+    def __contains__(self, target) -> bool:
+        try:
+            addr, port = target
+        except (TypeError, ValueError):
+            return False
+        return addr in self.addrs and port in self.ports
+
+    def __iter__(self) -> Iterator[tuple[str, int]]:
+        for a, port in self.iterints():
+            yield self.addrs.from_int(a), port
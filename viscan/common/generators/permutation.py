@@ -0,0 +1,67 @@
+from collections.abc import Sequence, Iterator
+
+M64 = 0xffffffffffffffff
+
+
+def mix64(z: int) -> int:
+    # splitmix64 finalizer
+    z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9 & M64
+    z = (z ^ (z >> 27)) * 0x94d049bb133111eb & M64
+    return z ^ (z >> 31)
+
+
+class Permutation(Sequence[int]):
+    """Keyed pseudorandom permutation of range(size).
+
+    A balanced Feistel network over the smallest even bit width that
+    covers size, with cycle walking to stay inside range(size), like
+    zmap's address iterator. It keeps O(1) state: the i-th element is
+    computed on demand, so shards and resumed scans can start anywhere.
+    """
+
+    size: int
+    half_bits: int
+    half_mask: int
+    round_keys: list[int]
+
+    rounds = 4
+
+    def __init__(self, size: int, key: int):
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self.size = size
+        self.half_bits = bits // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.round_keys = [mix64((key + r) & M64) for r in range(self.rounds)]
+
+    def round(self, x: int, k: int) -> int:
+        z = (x ^ (x >> 64) ^ k) & M64
+        y = mix64(z)
+        if self.half_bits > 64:
+            y |= mix64(z ^ 0x9e3779b97f4a7c15) << 64
+        return y & self.half_mask
+
+    def encrypt(self, x: int) -> int:
+        left, right = x >> self.half_bits, x & self.half_mask
+        for k in self.round_keys:
+            left, right = right, left ^ self.round(right, k)
+        return (left << self.half_bits) | right
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('permutation index out of range')
+        x = self.encrypt(index)
+        while x >= self.size:
+            x = self.encrypt(x)
+        return x
+
+    def __iter__(self) -> Iterator[int]:
+        for i in range(self.size):
+            yield self[i]
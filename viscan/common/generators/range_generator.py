@@ -0,0 +1,75 @@
+import bisect
+
+from typing import TypeVar
+from collections.abc import Iterator
+
+from .target_generator import TargetGenerator
+
+T = TypeVar('T')
+
+
+class RangeGenerator(TargetGenerator[T]):
+    """Lazy sequence over a union of integer ranges.
+
+    Ranges are kept sorted and merged, so duplicated targets collapse
+    and memory stays proportional to the number of ranges rather than
+    to the number of targets.
+    """
+
+    ranges: list[tuple[int, int]]
+    offsets: list[int]
+
+    def __init__(self):
+        self.ranges = []
+        self.offsets = []
+        self.size = 0
+
+    def add_range(self, beg: int, end: int):
+        if beg < end:
+            self.ranges.append((beg, end))
+
+    def merge_ranges(self):
+        merged: list[tuple[int, int]] = []
+        for beg, end in sorted(self.ranges):
+            if merged and beg <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((beg, end))
+        self.ranges = merged
+        self.offsets = []
+        self.size = 0
+        for beg, end in merged:
+            self.offsets.append(self.size)
+            self.size += end - beg
+
+    def from_int(self, i: int) -> T:
+        raise NotImplementedError
+
+    def to_int(self, value: T) -> int:
+        raise NotImplementedError
+
+    def getint(self, index: int) -> int:
+        i = bisect.bisect_right(self.offsets, index) - 1
+        return self.ranges[i][0] + index - self.offsets[i]
+
+    def iterints(self) -> Iterator[int]:
+        for beg, end in self.ranges:
+            yield from range(beg, end)
+
+    def containsint(self, i: int) -> bool:
+        pos = bisect.bisect_right(self.ranges, (i, 1 << 129)) - 1
+        return pos >= 0 and self.ranges[pos][0] <= i < self.ranges[pos][1]
+
+    def get(self, index: int) -> T:
+        return self.from_int(self.getint(index))
+
+    def __contains__(self, value) -> bool:
+        try:
+            return self.containsint(self.to_int(value))
+        except ValueError:
+            return False
+
+    def __iter__(self) -> Iterator[T]:
+        for i in self.iterints():
+            yield self.from_int(i)
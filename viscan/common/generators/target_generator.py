@@ -0,0 +1,42 @@
+from typing import TypeVar
+from collections.abc import Sequence, Iterator
+
+from .permutation import Permutation
+
+T = TypeVar('T')
+
+
+class TargetGenerator(Sequence[T]):
+    """Lazy, randomly accessible sequence of scan targets."""
+
+    size: int
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        # len() overflows beyond sys.maxsize, e.g. for a whole /48
+        return self.size > 0
+
+    def get(self, index: int) -> T:
+        raise NotImplementedError
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get(i) for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('target index out of range')
+        return self.get(index)
+
+    def permuted(self,
+                 key: int,
+                 start: int = 0,
+                 step: int = 1) -> Iterator[tuple[int, T]]:
+        """Yield (index, target) in a pseudorandom order keyed by key,
+        from position start on, every step positions."""
+        perm = Permutation(self.size, key)
+        for pos in range(start, self.size, step):
+            index = perm[pos]
+            yield index, self.get(index)
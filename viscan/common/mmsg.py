@@ -0,0 +1,219 @@
+import os
+import errno
+import ctypes
+import socket
+import struct
+
+from typing import Optional
+from collections.abc import Sequence
+
+# Links:
+#   man 2 sendmmsg
+#   man 2 recvmmsg
+#   /usr/include/linux/socket.h::mmsghdr
+#   /usr/include/linux/in6.h::sockaddr_in6
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+SOCKADDR_IN6_LEN = 28
+
+try:
+    libc: Optional[ctypes.CDLL] = ctypes.CDLL(None, use_errno=True)
+except OSError:
+    libc = None
+
+HAS_SENDMMSG = libc is not None and hasattr(libc, 'sendmmsg')
+HAS_RECVMMSG = libc is not None and hasattr(libc, 'recvmmsg')
+
+MSG_DONTWAIT = 0x40
+
+# errors of one destination rather than of the socket, the datagram is
+# skipped and the rest of the batch still sent
+SEND_SKIP_ERRNOS = frozenset((
+    errno.EHOSTUNREACH,
+    errno.ENETUNREACH,
+    errno.EADDRNOTAVAIL,
+    errno.EACCES,
+    errno.EPERM,
+    errno.EMSGSIZE,
+))
+
+
+def pack_sockaddr_in6(addr: bytes, port: int = 0, scope_id: int = 0) -> bytes:
+    """Pack a 16 bytes IPv6 address into struct sockaddr_in6."""
+    return struct.pack('@H', socket.AF_INET6) + \
+        struct.pack('!HI', port, 0) + addr + struct.pack('@I', scope_id)
+
+
+def unpack_sockaddr_in6(buf: bytes) -> tuple[str, int]:
+    """Unpack struct sockaddr_in6 into a python socket address."""
+    port, _, addr = struct.unpack_from('!HI16s', buf, 2)
+    scope_id, = struct.unpack_from('@I', buf, 24)
+    host = socket.inet_ntop(socket.AF_INET6, addr)
+    if scope_id != 0:
+        # same as socket.recvfrom
+        try:
+            host += '%' + socket.if_indextoname(scope_id)
+        except OSError:
+            host += '%' + str(scope_id)
+    return host, port
+
+
+def oserror() -> OSError:
+    err = ctypes.get_errno()
+    return OSError(err, os.strerror(err))
+
+
+def sendmmsg(sock: socket.socket,
+             bufs: Sequence[bytes],
+             addrs: Sequence[bytes],
+             failed: Optional[list[tuple[int, OSError]]] = None) -> int:
+    """Send bufs to packed sockaddrs with as few syscalls as possible,
+    return the number sent.
+
+    Datagrams failing with SEND_SKIP_ERRNOS are skipped and appended to
+    failed along with their index. Fall back to a sendto loop if libc
+    doesn't provide sendmmsg.
+    """
+    if not HAS_SENDMMSG:
+        sent = 0
+        for i, (buf, addr) in enumerate(zip(bufs, addrs)):
+            try:
+                sock.sendto(buf, unpack_sockaddr_in6(addr))
+                sent += 1
+            except OSError as e:
+                if e.errno not in SEND_SKIP_ERRNOS:
+                    raise
+                if failed is not None:
+                    failed.append((i, e))
+        return sent
+
+    assert libc is not None
+    n = len(bufs)
+    msgs = (mmsghdr * n)()
+    iovs = (iovec * n)()
+    cbufs = [ctypes.create_string_buffer(buf, len(buf)) for buf in bufs]
+    caddrs = [ctypes.create_string_buffer(addr, len(addr)) for addr in addrs]
+    for i in range(n):
+        iovs[i].iov_base = ctypes.cast(cbufs[i], ctypes.c_void_p)
+        iovs[i].iov_len = len(bufs[i])
+        hdr = msgs[i].msg_hdr
+        hdr.msg_name = ctypes.cast(caddrs[i], ctypes.c_void_p)
+        hdr.msg_namelen = len(addrs[i])
+        hdr.msg_iov = ctypes.pointer(iovs[i])
+        hdr.msg_iovlen = 1
+
+    fd = sock.fileno()
+    pos = sent = 0
+    while pos < n:
+        ret = libc.sendmmsg(fd,
+                            ctypes.byref(msgs,
+                                         pos * ctypes.sizeof(mmsghdr)),
+                            n - pos, 0)
+        if ret < 0:
+            # a short count stops before a failed datagram, which the
+            # next call reports on its own
+            err = oserror()
+            if err.errno not in SEND_SKIP_ERRNOS:
+                raise err
+            if failed is not None:
+                failed.append((pos, err))
+            pos += 1
+            continue
+        pos += ret
+        sent += ret
+    return sent
+
+
+class MmsgRecver:
+    """Receive datagrams in batches with preallocated buffers.
+
+    Fall back to a recvfrom loop if libc doesn't provide recvmmsg.
+    """
+
+    batch: int
+    size: int
+
+    def __init__(self, batch: int = 64, size: int = 4096):
+        self.batch = batch
+        self.size = size
+        if not HAS_RECVMMSG:
+            return
+        self.msgs = (mmsghdr * batch)()
+        self.iovs = (iovec * batch)()
+        self.bufs = ctypes.create_string_buffer(batch * size)
+        self.addrs = ctypes.create_string_buffer(batch * SOCKADDR_IN6_LEN)
+        self.lens = memoryview(self.msgs).cast('B').cast('I')
+        bufs = ctypes.addressof(self.bufs)
+        addrs = ctypes.addressof(self.addrs)
+        for i in range(batch):
+            self.iovs[i].iov_base = bufs + i * size
+            self.iovs[i].iov_len = size
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = addrs + i * SOCKADDR_IN6_LEN
+            hdr.msg_namelen = SOCKADDR_IN6_LEN
+            hdr.msg_iov = ctypes.pointer(self.iovs[i])
+            hdr.msg_iovlen = 1
+
+    def recv(self,
+             sock: socket.socket) -> list[tuple[bytes, tuple[str, int]]]:
+        """Return up to batch (buf, addr) pairs, empty if none is
+        pending."""
+        pkts: list[tuple[bytes, tuple[str, int]]] = []
+        if not HAS_RECVMMSG:
+            while len(pkts) < self.batch:
+                try:
+                    buf, addr = sock.recvfrom(self.size)
+                except BlockingIOError:
+                    break
+                pkts.append((buf, (addr[0], addr[1])))
+            return pkts
+
+        assert libc is not None
+        ret = libc.recvmmsg(sock.fileno(), self.msgs, self.batch,
+                            MSG_DONTWAIT, None)
+        if ret < 0:
+            if ctypes.get_errno() in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return pkts
+            raise oserror()
+        size, lens = self.size, self.lens
+        stride = ctypes.sizeof(mmsghdr) // 4
+        namelen_off = mmsghdr.msg_hdr.offset + msghdr.msg_namelen.offset
+        len_off = mmsghdr.msg_len.offset
+        with memoryview(self.bufs) as bufs, \
+             memoryview(self.addrs) as addrs:
+            for i in range(ret):
+                # the kernel shrinks msg_namelen, restore it for next call
+                lens[i * stride + namelen_off // 4] = SOCKADDR_IN6_LEN
+                beg = i * size
+                buf = bytes(bufs[beg:beg + lens[i * stride + len_off // 4]])
+                beg = i * SOCKADDR_IN6_LEN
+                addr = unpack_sockaddr_in6(
+                    bytes(addrs[beg:beg + SOCKADDR_IN6_LEN]))
+                pkts.append((buf, addr))
+        return pkts
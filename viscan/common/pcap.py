@@ -1,51 +1,438 @@
+import mmap
+import ctypes
 import select
+import socket
+import struct
+import functools
 
 from pcap import pcap
 from scapy.config import conf as spconf
 from scapy.sendrecv import send as spsend
+from scapy.arch.common import compile_filter
 import scapy.layers.inet6 as inet6
 
-from typing import Any, Optional
+from typing import Any, Optional, Union
+from collections.abc import Callable
 from argparse import Namespace
 
-from .base import SRScanner, MainRunner
+from ..defaults import (
+    TX_ENGINE,
+    TX_BATCH,
+    RX_ENGINE,
+    RX_RING_BLOCK_SIZE,
+    RX_RING_BLOCK_NR,
+    RX_RING_TIMEOUT_MS,
+)
+from .base import Loggable, SRScanner, MainRunner
 from .decorators import override
+from .mmsg import pack_sockaddr_in6, sendmmsg
+from .decoder import (
+    Buffer,
+    DecodedIP6,
+    DLT_EN10MB,
+    DLT_RAW,
+    ip6_offset,
+    decode,
+)
 
+PcapPkt = Union[inet6.IPv6, bytes]
+PcapCallback = Callable[[float, Union[bytes, memoryview]], None]
+
+# Links:
+#   https://docs.kernel.org/networking/packet_mmap.html
+#   /usr/include/linux/if_packet.h
+
+SOL_PACKET = 263
+SO_ATTACH_FILTER = 26
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+ETH_P_ALL = 3
+ARPHRD_NONE = 65534
+
+
+@functools.lru_cache(maxsize=4096)
+def route_iface(dst: str) -> str:
+    return spconf.route6.route(dst)[0]
+
+
+class TxEngine(Loggable):
+    """Transmit serialized IPv6 packets on iface."""
 
-class PcapScanner(SRScanner[inet6.IPv6, bytes], MainRunner):
     iface: str
+    batch: int
 
-    def __init__(self, iface: Optional[str] = None, **kwargs):
-        super().__init__()
-        self.iface = iface if iface is not None else str(spconf.iface)
+    def __init__(self, iface: str, batch: int = TX_BATCH, **kwargs):
+        super().__init__(**kwargs)
+        self.iface = iface
+        self.batch = batch
 
-    def get_filter(self) -> str:
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, buf: bytes):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class ScapyTxEngine(TxEngine):
+    """Send packets one by one with scapy, slow but portable."""
+
+    @override(TxEngine)
+    def send(self, buf: bytes):
+        spsend(inet6.IPv6(buf), iface=self.iface, verbose=0)
+
+
+class RawTxEngine(TxEngine):
+    """Send packets in batches on a persistent raw IPv6 socket."""
+
+    sock: Optional[socket.socket]
+    bufs: list[bytes]
+    addrs: list[bytes]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sock = None
+        self.bufs = []
+        self.addrs = []
+
+    @override(TxEngine)
+    def open(self):
+        if self.sock is not None:
+            return
+        # IPPROTO_RAW implies IPV6_HDRINCL on linux
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW,
+                             socket.IPPROTO_RAW)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE,
+                        self.iface.encode())
+        self.sock = sock
+
+    @override(TxEngine)
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.sock.close()
+            self.sock = None
+
+    @override(TxEngine)
+    def send(self, buf: bytes):
+        self.bufs.append(buf)
+        self.addrs.append(pack_sockaddr_in6(buf[24:40]))
+        if len(self.bufs) >= self.batch:
+            self.flush()
+
+    @override(TxEngine)
+    def flush(self):
+        if len(self.bufs) == 0:
+            return
+        if self.sock is None:
+            self.open()
+        assert self.sock is not None
+        bufs, addrs = self.bufs, self.addrs
+        self.bufs, self.addrs = [], []
+        failed: list[tuple[int, OSError]] = []
+        sendmmsg(self.sock, bufs, addrs, failed)
+        for i, e in failed:
+            self.logger.debug('except while sending to %s: %s',
+                              socket.inet_ntop(socket.AF_INET6,
+                                               bufs[i][24:40]), e)
+
+
+TX_ENGINES: dict[str, type[TxEngine]] = {
+    'raw': RawTxEngine,
+    'scapy': ScapyTxEngine,
+}
+
+
+class RxEngine(Loggable):
+    """Capture frames matching a BPF filter on iface."""
+
+    iface: str
+    linktype: int
+
+    def __init__(self, iface: str, **kwargs):
+        super().__init__(**kwargs)
+        self.iface = iface
+        self.linktype = DLT_EN10MB
+
+    def open(self, bpf_filter: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def fileno(self) -> int:
         raise NotImplementedError
 
-    def get_sniffer(self) -> pcap:
+    def dispatch(self, callback: PcapCallback) -> int:
+        """Hand every pending frame to callback, return their number."""
+        raise NotImplementedError
+
+    def stats(self) -> tuple[int, int]:
+        """Frames received and dropped so far."""
+        return 0, 0
+
+
+class PcapRxEngine(RxEngine):
+    """Capture with libpcap, frames are copied into bytes."""
+
+    sniffer: Optional[pcap]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sniffer = None
+
+    @override(RxEngine)
+    def open(self, bpf_filter: str):
         sniffer = pcap(name=self.iface, promisc=False, timeout_ms=1)
-        sniffer.setfilter(self.get_filter())
+        sniffer.setfilter(bpf_filter)
         sniffer.setnonblock()
-        return sniffer
+        self.sniffer = sniffer
+        self.linktype = sniffer.datalink()
+
+    @override(RxEngine)
+    def close(self):
+        self.sniffer = None
+
+    @override(RxEngine)
+    def fileno(self) -> int:
+        assert self.sniffer is not None
+        return self.sniffer.fd
+
+    @override(RxEngine)
+    def dispatch(self, callback: PcapCallback) -> int:
+        assert self.sniffer is not None
+        return self.sniffer.dispatch(-1, callback)
+
+    @override(RxEngine)
+    def stats(self) -> tuple[int, int]:
+        if self.sniffer is None:
+            return 0, 0
+        recvs, drops, ifdrops = self.sniffer.stats()
+        return recvs, drops + ifdrops
+
+
+class RingRxEngine(RxEngine):
+    """Capture on a TPACKET_V3 mmapped ring of an AF_PACKET socket.
+
+    The kernel runs the BPF filter and fills whole blocks; every wakeup
+    drains all ready blocks and hands frames out as memoryviews into
+    the ring, which are only valid during the callback.
+    """
+
+    block_size: int
+    block_nr: int
+    timeout_ms: int
+    sock: Optional[socket.socket]
+    ring: Optional[mmap.mmap]
+    block: int
+    recvs: int
+    drops: int
+
+    def __init__(self,
+                 block_size: int = RX_RING_BLOCK_SIZE,
+                 block_nr: int = RX_RING_BLOCK_NR,
+                 timeout_ms: int = RX_RING_TIMEOUT_MS,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.timeout_ms = timeout_ms
+        self.sock = None
+        self.ring = None
+        self.block = 0
+        self.recvs = 0
+        self.drops = 0
+
+    @override(RxEngine)
+    def open(self, bpf_filter: str):
+        # protocol 0 receives nothing until bound, so no frame can slip
+        # in before the filter is attached
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            bpf = compile_filter(bpf_filter, iface=self.iface)
+            sock.setsockopt(
+                socket.SOL_SOCKET, SO_ATTACH_FILTER,
+                struct.pack('HL', bpf.bf_len,
+                            ctypes.addressof(bpf.bf_insns.contents)))
+            sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            frame_size = 2048
+            req = struct.pack('7I', self.block_size, self.block_nr,
+                              frame_size,
+                              self.block_size * self.block_nr // frame_size,
+                              self.timeout_ms, 0, 0)
+            sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self.ring = mmap.mmap(sock.fileno(),
+                                  self.block_size * self.block_nr,
+                                  mmap.MAP_SHARED,
+                                  mmap.PROT_READ | mmap.PROT_WRITE)
+            sock.bind((self.iface, ETH_P_ALL))
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        self.block = 0
+        self.recvs = 0
+        self.drops = 0
+        self.linktype = DLT_EN10MB
+        try:
+            with open(f'/sys/class/net/{self.iface}/type') as f:
+                if int(f.read()) == ARPHRD_NONE:  # tun, wireguard
+                    self.linktype = DLT_RAW
+        except (OSError, ValueError):
+            pass
+
+    @override(RxEngine)
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    @override(RxEngine)
+    def fileno(self) -> int:
+        assert self.sock is not None
+        return self.sock.fileno()
+
+    @override(RxEngine)
+    def dispatch(self, callback: PcapCallback) -> int:
+        assert self.ring is not None
+        ring = self.ring
+        count = 0
+        with memoryview(ring) as view:
+            while True:
+                base = self.block * self.block_size
+                status, npkts, offset = \
+                    struct.unpack_from('III', ring, base + 8)
+                if status & TP_STATUS_USER == 0:
+                    break
+                off = base + offset
+                for _ in range(npkts):
+                    next_offset, sec, nsec, snaplen, _, _, mac = \
+                        struct.unpack_from('IIIIIIH', ring, off)
+                    beg = off + mac
+                    with view[beg:beg + snaplen] as frame:
+                        callback(sec + nsec / 1e9, frame)
+                    off += next_offset
+                count += npkts
+                struct.pack_into('I', ring, base + 8, TP_STATUS_KERNEL)
+                self.block = (self.block + 1) % self.block_nr
+        return count
+
+    @override(RxEngine)
+    def stats(self) -> tuple[int, int]:
+        if self.sock is not None:
+            # counters are reset by each read
+            buf = self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12)
+            recvs, drops, _ = struct.unpack('III', buf)
+            self.recvs += recvs
+            self.drops += drops
+        return self.recvs, self.drops
+
+
+RX_ENGINES: dict[str, type[RxEngine]] = {
+    'pcap': PcapRxEngine,
+    'ring': RingRxEngine,
+}
+
+
+class PcapScanner(SRScanner[PcapPkt, Buffer], MainRunner):
+    iface: str
+    tx_engine: TxEngine
+    rx_engine: RxEngine
+
+    def __init__(self,
+                 iface: Optional[str] = None,
+                 tx_engine: str = TX_ENGINE,
+                 tx_batch: int = TX_BATCH,
+                 rx_engine: str = RX_ENGINE,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.iface = iface if iface is not None else str(spconf.iface)
+        self.tx_engine = TX_ENGINES[tx_engine](iface=self.iface,
+                                               batch=tx_batch)
+        self.rx_engine = RX_ENGINES[rx_engine](iface=self.iface)
+
+    def get_filter(self) -> str:
+        raise NotImplementedError
+
+    @override(SRScanner)
+    def scan(self):
+        # open the capture before the first probe leaves, otherwise
+        # early replies race the recver thread
+        self.rx_engine.open(self.get_filter())
+        try:
+            self.tx_engine.open()
+            try:
+                super().scan()
+            finally:
+                self.tx_engine.close()
+            recvs, drops = self.rx_engine.stats()
+            self.logger.debug('rx: %d recvs, %d drops', recvs, drops)
+        finally:
+            self.rx_engine.close()
 
     @override(SRScanner)
     def recv(self):
-        sniffer = self.get_sniffer()
+        rx = self.rx_engine
+        fd = rx.fileno()
         while not self.scan_done:
-            rlist, _, _ = select.select([sniffer.fd], [], [], 1)
-            if rlist:
-                sniffer.dispatch(1, self.on_pcap_recv)
+            rlist, _, _ = select.select([fd, self.scan_wakeup], [], [])
+            if fd in rlist:
+                rx.dispatch(self.on_pcap_recv)
 
-    def on_pcap_recv(self, ts: float, buf: bytes):
-        self.append_recv_pkt(buf)
+    def decode(self, buf: Buffer) -> Optional[DecodedIP6]:
+        return decode(buf, self.rx_engine.linktype)
+
+    def decode_scapy(self, buf: Buffer) -> inet6.IPv6:
+        """Dissect the whole frame with scapy, only for fingerprints."""
+        off = ip6_offset(buf, self.rx_engine.linktype)
+        if off < 0:
+            raise ValueError('not an ipv6 packet')
+        return inet6.IPv6(bytes(buf[off:]))
+
+    def on_pcap_recv(self, ts: float, buf: Union[bytes, memoryview]):
+        # ring frames are only valid during the callback; online parsing
+        # folds them into results in place, keeping only the fields it
+        # unpacks, other frames are kept and so copied
+        if self.recv_online:
+            self.append_recv_pkt(buf)
+        else:
+            self.append_recv_pkt(bytes(buf))
+
+    @override(SRScanner)
+    def recv_drops(self) -> int:
+        return self.rx_engine.stats()[1]
 
     @override(SRScanner)
-    def send_pkt(self, pkt: inet6.IPv6):
-        dst = pkt.dst
-        if spconf.route6.route(dst)[0] != self.iface:
+    def send_pkt(self, pkt: PcapPkt):
+        buf = pkt if isinstance(pkt, bytes) else bytes(pkt)
+        dst = socket.inet_ntop(socket.AF_INET6, buf[24:40])
+        if route_iface(dst) != self.iface:
             self.logger.warning('dst to other iface: %s', dst)
         else:
-            spsend(pkt, iface=self.iface, verbose=0)
+            self.tx_engine.send(buf)
+
+    @override(SRScanner)
+    def send_size(self, pkt: PcapPkt) -> int:
+        return len(pkt) + 14  # ethernet header
+
+    @override(SRScanner)
+    def send_flush(self):
+        self.tx_engine.flush()
 
     @classmethod
     @override(MainRunner)
@@ -53,4 +440,8 @@ class PcapScanner(SRScanner[inet6.IPv6, bytes], MainRunner):
         iface = args.iface
         if iface is not None:
             spconf.iface = iface
-        return super().parse_args(args)
+        kwargs = super().parse_args(args)
+        kwargs['tx_engine'] = args.tx_engine
+        kwargs['tx_batch'] = args.tx_batch
+        kwargs['rx_engine'] = args.rx_engine
+        return kwargs
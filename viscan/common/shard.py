@@ -0,0 +1,118 @@
+import random
+import functools
+import multiprocessing
+
+from typing import Any, Optional, TypeVar
+from collections.abc import Iterable
+from argparse import Namespace
+
+from .base import MainRunner, BaseScanner
+from .checkpoint import Checkpoint, Resumable
+from .decorators import override
+from .argparser import ScanArgParser
+from .generators import TargetGenerator
+
+T = TypeVar('T')
+
+
+def shard_worker(cls: type['Sharded'], kwargs: dict[str, Any],
+                 index: int) -> Any:
+    kwargs = dict(kwargs, shard_index=index)
+    if kwargs.get('checkpoint_path') is not None:
+        kwargs['checkpoint_path'] = f'{kwargs["checkpoint_path"]}.{index}'
+    scanner = cls(**kwargs)
+    scanner.scan_and_parse()
+    return scanner.result
+
+
+class Sharded(Resumable, MainRunner, BaseScanner):
+    """Split permuted targets into interleaved shards, like zmap.
+
+    Shard i of n probes permutation positions i, i+n, i+2n... with the
+    key shared by all shards, so shards may run on different hosts
+    given the same --scan-key. Without --shard-index, all shards run in
+    local worker processes, each with its own sockets, and the parent
+    merges their results.
+    """
+
+    result: Any
+    key: int
+    shards: int
+    shard_index: Optional[int]
+
+    def __init__(self,
+                 shards: int = 1,
+                 shard_index: Optional[int] = None,
+                 scan_key: Optional[int] = None,
+                 **kwargs):
+        super().__init__(**kwargs)
+        if shards < 1:
+            raise ValueError(f'invalid shards: {shards}')
+        if shard_index is not None and not 0 <= shard_index < shards:
+            raise ValueError(f'invalid shard index: {shard_index}')
+        self.key = scan_key if scan_key is not None else \
+            random.getrandbits(128)
+        self.shards = shards
+        self.shard_index = shard_index
+        if shard_index is not None:
+            self.scan_start = shard_index
+            self.scan_step = shards
+
+    def shard_targets(self, targets: TargetGenerator[T]) -> Iterable[T]:
+        """Targets probed by this shard, for output; with --shard-index
+        only the own ones, so that outputs of all shards merge."""
+        if self.shard_index is None:
+            return targets
+        return (target for _, target in targets.permuted(
+            self.key, self.scan_start, self.scan_step))
+
+    def shard_merge(self, results: list[Any]):
+        """Merge results of all shards into self.result."""
+        merged: dict[Any, Any] = dict()
+        for result in results:
+            merged.update(result)
+        self.result = merged
+
+    @classmethod
+    def shard_main(cls, kwargs: dict[str, Any]):
+        shards = kwargs['shards']
+        if kwargs.get('scan_key') is None:
+            kwargs['scan_key'] = random.getrandbits(128)
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(shards) as pool:
+            results = pool.map(functools.partial(shard_worker, cls, kwargs),
+                               range(shards))
+        scanner = cls(**kwargs)
+        scanner.shard_merge(results)
+        scanner.export()
+        checkpoint_path = kwargs.get('checkpoint_path')
+        if checkpoint_path is not None:
+            for index in range(shards):
+                Checkpoint(f'{checkpoint_path}.{index}').remove()
+
+    @classmethod
+    @override(MainRunner)
+    def main(cls, *args, **kwargs):
+        parser = cls.get_argparser(*args, **kwargs)
+        kwargs = cls.parse_args(parser.parse_args())
+        if kwargs['shards'] > 1 and kwargs['shard_index'] is None:
+            cls.shard_main(kwargs)
+        else:
+            scanner = cls(**kwargs)
+            scanner.scan_and_export()
+
+    @classmethod
+    @override(MainRunner)
+    def get_argparser(cls, *args, **kwargs) -> ScanArgParser:
+        parser = super().get_argparser(*args, **kwargs)
+        parser.add_shards()
+        return parser
+
+    @classmethod
+    @override(MainRunner)
+    def parse_args(cls, args: Namespace) -> dict[str, Any]:
+        kwargs = super().parse_args(args)
+        kwargs['shards'] = args.shards
+        kwargs['shard_index'] = args.shard_index
+        kwargs['scan_key'] = args.scan_key
+        return kwargs
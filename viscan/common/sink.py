@@ -0,0 +1,84 @@
+import io
+import sys
+import json
+import gzip
+import time
+
+from typing import Any, TextIO
+from collections.abc import Iterator
+
+from ..defaults import OUTPUT_FLUSH_INTERVAL
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def open_output(path: str) -> TextIO:
+    """Open path for writing text, '-' for stdout, gzip or zstd
+    compressed by suffix."""
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandard is required for .zst output')
+        writer = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'),
+                                                          closefd=True)
+        return io.TextIOWrapper(writer)
+    return open(path, 'w')
+
+
+class ResultSink:
+    """Write results to path, either as a whole json document or as
+    ndjson records flushed at least every flush_interval seconds."""
+
+    file: TextIO
+    flush_interval: float
+    flush_time: float
+    count: int
+
+    def __init__(self,
+                 path: str,
+                 flush_interval: float = OUTPUT_FLUSH_INTERVAL):
+        self.file = open_output(path)
+        self.flush_interval = flush_interval
+        self.flush_time = time.monotonic()
+        self.count = 0
+
+    def __enter__(self) -> 'ResultSink':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def dump(self, jsonable: Any):
+        if isinstance(jsonable, Iterator):
+            # lazily generated lists are written item by item
+            self.file.write('[')
+            for i, item in enumerate(jsonable):
+                if i != 0:
+                    self.file.write(', ')
+                self.file.write(json.dumps(item))
+            self.file.write(']\n')
+            return
+        json.dump(jsonable, self.file)
+        self.file.write('\n')
+
+    def write(self, record: Any):
+        self.file.write(json.dumps(record) + '\n')
+        self.count += 1
+        now = time.monotonic()
+        if now - self.flush_time >= self.flush_interval:
+            self.flush_time = now
+            # gzip and zstd flush a full block, so the output written
+            # so far stays decodable if we crash later
+            self.file.flush()
+
+    def close(self):
+        if self.file is sys.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
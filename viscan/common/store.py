@@ -0,0 +1,174 @@
+import csv
+import json
+import mmap
+import array
+import socket
+import struct
+
+from typing import Optional, TextIO, Union
+from collections.abc import Iterable, Iterator
+
+# File layout, integers in little endian except ports in host order:
+#   magic 'VSRS', version u16, nstates u16, count u64
+#   nstates state names, each u8 length + ascii, padded to 8 bytes
+#   count * 16 bytes addrs, count * u16 ports, count * u8 codes
+
+STORE_MAGIC = b'VSRS'
+STORE_VERSION = 1
+STORE_HEADER = struct.Struct('<4sHHQ')
+
+Row = tuple[str, int, str]
+
+
+def pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class ResultStore:
+    """Columnar scan results: packed addrs, ports and state codes.
+
+    A row costs 19 bytes instead of a tuple of python objects. Stores
+    loaded from disk are backed by a read only mmap and not copied.
+    """
+
+    states: list[str]
+    addrs: Union[bytearray, memoryview]
+    ports: Union['array.array[int]', memoryview]
+    codes: Union['array.array[int]', memoryview]
+    mm: Optional[mmap.mmap]
+
+    def __init__(self, states: Iterable[str]):
+        self.states = list(states)
+        if len(self.states) > 256:
+            raise ValueError('too many states')
+        self.addrs = bytearray()
+        self.ports = array.array('H')
+        self.codes = array.array('B')
+        self.mm = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[Row]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __enter__(self) -> 'ResultStore':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.mm is not None:
+            # release views before unmapping
+            for col in (self.addrs, self.ports, self.codes):
+                assert isinstance(col, memoryview)
+                col.release()
+            self.mm.close()
+            self.mm = None
+
+    def append(self, addr: bytes, port: int, state: str):
+        if self.mm is not None:
+            raise RuntimeError('store is read only')
+        assert isinstance(self.addrs, bytearray) and \
+            isinstance(self.ports, array.array) and \
+            isinstance(self.codes, array.array)
+        self.addrs += addr
+        self.ports.append(port)
+        self.codes.append(self.states.index(state))
+
+    def addr(self, i: int) -> bytes:
+        return bytes(self.addrs[16 * i:16 * i + 16])
+
+    def row(self, i: int) -> Row:
+        return (socket.inet_ntop(socket.AF_INET6, self.addr(i)),
+                self.ports[i], self.states[self.codes[i]])
+
+    def key(self, i: int) -> bytes:
+        return self.addr(i) + struct.pack('!H', self.ports[i])
+
+    def sort(self):
+        """Sort rows by (addr, port), needed by diff."""
+        order = sorted(range(len(self)), key=self.key)
+        store = ResultStore(self.states)
+        for i in order:
+            store.append(self.addr(i), self.ports[i],
+                         self.states[self.codes[i]])
+        self.close()
+        self.addrs, self.ports, self.codes = \
+            store.addrs, store.ports, store.codes
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(
+                STORE_HEADER.pack(STORE_MAGIC, STORE_VERSION,
+                                  len(self.states), len(self)))
+            names = b''.join(
+                bytes([len(name)]) + name.encode() for name in self.states)
+            f.write(names + bytes(pad8(len(names)) - len(names)))
+            f.write(self.addrs)
+            f.write(self.ports)
+            f.write(self.codes)
+
+    @classmethod
+    def load(cls, path: str) -> 'ResultStore':
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nstates, count = STORE_HEADER.unpack_from(mm, 0)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            mm.close()
+            raise ValueError(f'not a result store: {path}')
+        off = STORE_HEADER.size
+        states = []
+        beg = off
+        for _ in range(nstates):
+            n = mm[off]
+            states.append(mm[off + 1:off + 1 + n].decode())
+            off += 1 + n
+        off = beg + pad8(off - beg)
+        store = cls(states)
+        view = memoryview(mm)
+        store.addrs = view[off:off + 16 * count]
+        off += 16 * count
+        store.ports = view[off:off + 2 * count].cast('H')
+        off += 2 * count
+        store.codes = view[off:off + count]
+        view.release()
+        store.mm = mm
+        return store
+
+    def to_json(self, file: TextIO):
+        """Write rows as ndjson."""
+        for row in self:
+            file.write(json.dumps(row) + '\n')
+
+    def to_csv(self, file: TextIO):
+        writer = csv.writer(file)
+        writer.writerow(('addr', 'port', 'state'))
+        writer.writerows(self)
+
+    def diff(self, other: 'ResultStore') -> \
+            Iterator[tuple[str, int, Optional[str], Optional[str]]]:
+        """Yield (addr, port, state here, state in other) for rows that
+        differ, both stores must be sorted."""
+        i, j = 0, 0
+        n, m = len(self), len(other)
+        while i < n or j < m:
+            ki = self.key(i) if i < n else None
+            kj = other.key(j) if j < m else None
+            if kj is None or ki is not None and ki < kj:
+                addr, port, state = self.row(i)
+                yield addr, port, state, None
+                i += 1
+            elif ki is None or kj < ki:
+                addr, port, state = other.row(j)
+                yield addr, port, None, state
+                j += 1
+            else:
+                addr, port, state = self.row(i)
+                other_state = other.states[other.codes[j]]
+                if state != other_state:
+                    yield addr, port, state, other_state
+                i += 1
+                j += 1
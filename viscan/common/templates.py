@@ -0,0 +1,100 @@
+import socket
+import struct
+
+from collections.abc import Sequence
+
+# Links:
+#   https://www.rfc-editor.org/rfc/rfc1624 (incremental checksum update)
+
+IP6_HDR_LEN = 40
+
+DHCP6_RELAY_HDR_LEN = 34
+DHCP6_OPT_RELAY_MSG = 9
+DHCP6_OPT_IA_NA = 3
+DHCP6_OPT_IA_TA = 4
+DHCP6_OPT_IA_PD = 25
+
+
+def csum_fold(s: int) -> int:
+    while s >> 16:
+        s = (s & 0xffff) + (s >> 16)
+    return s
+
+
+class TCPProbeTemplate:
+    """Serialize a TCP probe once, then patch it per target in place.
+
+    Only dst, dport, seq and flow label vary between probes; the TCP
+    checksum is updated incrementally from the template's one, so
+    building a probe allocates nothing but the returned bytes.
+    """
+
+    buf: bytearray
+    vtc: int
+    partial: int
+
+    def __init__(self, pkt: bytes):
+        if pkt[6] != socket.IPPROTO_TCP:
+            raise ValueError('tcp probe template without tcp header')
+        buf = bytearray(pkt)
+        vtcfl, = struct.unpack_from('!I', buf, 0)
+        dport, seq = struct.unpack_from('!HI', buf, IP6_HDR_LEN + 2)
+        csum, = struct.unpack_from('!H', buf, IP6_HDR_LEN + 16)
+        # HC' = ~(~HC + ~m + m'), precompute ~HC + ~m for all variable m
+        partial = ~csum & 0xffff
+        for m in struct.unpack_from('!8H', buf, 24):
+            partial += ~m & 0xffff
+        partial += ~dport & 0xffff
+        partial += ~(seq >> 16) & 0xffff
+        partial += ~seq & 0xffff
+        self.buf = buf
+        self.vtc = vtcfl & 0xfff00000
+        self.partial = csum_fold(partial)
+
+    def build(self, dst: bytes, dport: int, seq: int, fl: int = 0) -> bytes:
+        buf = self.buf
+        s = self.partial + sum(struct.unpack('!8H', dst)) + \
+            dport + (seq >> 16) + (seq & 0xffff)
+        s = (s & 0xffff) + (s >> 16)
+        s = (s & 0xffff) + (s >> 16)
+        struct.pack_into('!I', buf, 0, self.vtc | fl)
+        buf[24:40] = dst
+        struct.pack_into('!HI', buf, IP6_HDR_LEN + 2, dport, seq)
+        struct.pack_into('!H', buf, IP6_HDR_LEN + 16, ~s & 0xffff)
+        return bytes(buf)
+
+
+class DHCPRelayTemplate:
+    """Serialize a relay-forward wrapped DHCPv6 message once, then
+    patch link address, transaction id and IAIDs per probe in place."""
+
+    buf: bytearray
+    trid_offset: int
+    iaid_offsets: list[int]
+
+    def __init__(self, pkt: bytes):
+        buf = bytearray(pkt)
+        code, _ = struct.unpack_from('!HH', buf, DHCP6_RELAY_HDR_LEN)
+        if code != DHCP6_OPT_RELAY_MSG:
+            raise ValueError('relay template without relay message')
+        msg = DHCP6_RELAY_HDR_LEN + 4
+        self.buf = buf
+        self.trid_offset = msg + 1
+        self.iaid_offsets = []
+        off = msg + 4
+        while off + 4 <= len(buf):
+            code, n = struct.unpack_from('!HH', buf, off)
+            if code in (DHCP6_OPT_IA_NA, DHCP6_OPT_IA_TA, DHCP6_OPT_IA_PD):
+                self.iaid_offsets.append(off + 4)
+            off += 4 + n
+
+    def build(self,
+              linkaddr: bytes,
+              trid: int,
+              iaids: Sequence[int] = ()) -> bytes:
+        buf = self.buf
+        buf[2:18] = linkaddr
+        buf[self.trid_offset:self.trid_offset + 3] = trid.to_bytes(3, 'big')
+        for off, iaid in zip(self.iaid_offsets, iaids):
+            struct.pack_into('!I', buf, off, iaid)
+        return bytes(buf)
@@ -0,0 +1,57 @@
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class TimerWheel(Generic[T]):
+    """Hashed timer wheel, O(1) add and amortized O(1) expire.
+
+    Deadlines are rounded up to ticks; a slot holds every timer whose
+    tick maps to it, timers of later rounds simply stay in the slot
+    until their own tick comes.
+    """
+
+    tick: float
+    slots: list[list[tuple[int, T]]]
+    cur: int
+    size: int
+
+    def __init__(self, tick: float, now: float, nslots: int = 256):
+        self.tick = tick
+        self.slots = [[] for _ in range(nslots)]
+        self.cur = int(now / tick)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, deadline: float, item: T):
+        t = max(-int(-deadline // self.tick), self.cur)
+        self.slots[t % len(self.slots)].append((t, item))
+        self.size += 1
+
+    def expire(self, now: float) -> list[T]:
+        target = int(now / self.tick)
+        if target < self.cur:
+            return []
+        nslots = len(self.slots)
+        if target - self.cur >= nslots:
+            indexes = range(nslots)
+        else:
+            indexes = range(self.cur % nslots,
+                            self.cur % nslots + target - self.cur + 1)
+        expired: list[T] = []
+        for i in indexes:
+            slot = self.slots[i % nslots]
+            if not slot:
+                continue
+            keep = []
+            for t, item in slot:
+                if t <= target:
+                    expired.append(item)
+                else:
+                    keep.append((t, item))
+            self.slots[i % nslots] = keep
+        self.cur = target + 1
+        self.size -= len(expired)
+        return expired
@@ -1,11 +1,32 @@
 LOG_FORMAT = '%(asctime)s %(name)s %(levelname)s %(message)s'
 LOG_DATEFMT = '%y-%m-%d %H:%M:%S'
 
+OUTPUT_FORMAT = 'json'
+OUTPUT_FLUSH_INTERVAL = 1.0
+CHECKPOINT_INTERVAL = 60.0
+
 SEND_RETRY = 2
 SEND_TIMEWAIT = 1.0
 SEND_INTERVAL = 0.1
+SEND_RATE = 0.0
+SEND_BANDWIDTH = 0.0
+SEND_BURST = 0.005
+SEND_TIMING = 'fixed'
+
+# (initial, min, max) pps of adaptive timing profiles
+TIMING_PROFILES: dict[str, tuple[float, float, float]] = {
+    'polite': (10.0, 1.0, 100.0),
+    'normal': (100.0, 10.0, 10000.0),
+    'aggressive': (1000.0, 100.0, 100000.0),
+}
 
-MAX_TARGETS = 65536
+TX_ENGINE = 'raw'
+TX_BATCH = 64
+RX_ENGINE = 'pcap'
+RX_RING_BLOCK_SIZE = 1 << 20
+RX_RING_BLOCK_NR = 16
+RX_RING_TIMEOUT_MS = 10
+RECV_BATCH = 64
 
 TRACEROUTE_HOP = 2
 TRACEROUTE_LIMIT = 32
@@ -14,6 +35,11 @@ DELIMIT_LIMIT = 32
 DELIMIT_WINDOW = 1
 
 DNS_LIMIT = 4
+DNS_WINDOW = 64
+DNS_NS_WINDOW = 32
+DNS_TCP_CONNS = 4
+DNS_CACHE_TTL = 3600.0
+DNS_SERVFAIL_TTL = 30.0
 
 DHCP_LIMIT = 16
 DHCP_ENUM_PLEN = 64
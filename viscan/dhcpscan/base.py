@@ -1,4 +1,9 @@
+import socket
 import random
+import weakref
+import threading
+import functools
+import ipaddress
 
 import scapy.layers.dhcp6 as dhcp6
 
@@ -17,10 +22,73 @@ from ..defaults import (
 from ..common.base import ResultParser, MainRunner
 from ..common.dgram import UDPScanner
 from ..common.decorators import override
+from ..common.templates import DHCPRelayTemplate
 from ..common.argparser import ScanArgParser
 from ..common.generators import AddrGenerator
 
 
+TRID_SPACE = 1 << 24
+
+
+class DHCPTransactions:
+    """Transaction ids of all scanners sharing a socket.
+
+    Scanners allocate contiguous blocks of ids, wrapping around the 24
+    bit space, so a reply is matched to its probe with one subtraction.
+    The allocation cursor only moves forward, late replies to a freed
+    block will not match a new block until the space wraps.
+
+    Replies are not routed between scanners, the recver of a scan drains
+    the socket and drops ids of other blocks, so scans on one socket
+    take turns on lock.
+    """
+
+    socks: weakref.WeakKeyDictionary[socket.socket, 'DHCPTransactions'] = \
+        weakref.WeakKeyDictionary()
+
+    cursor: int
+    blocks: dict[int, int]
+    lock: threading.Lock
+
+    def __init__(self):
+        self.cursor = random.getrandbits(24)
+        self.blocks = dict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def of(cls, sock: socket.socket) -> 'DHCPTransactions':
+        trids = cls.socks.get(sock)
+        if trids is None:
+            trids = cls.socks[sock] = cls()
+        return trids
+
+    def overlap(self, base: int, count: int) -> Optional[int]:
+        """Return the end of an allocated block overlapping the block."""
+        for other, n in self.blocks.items():
+            if (other - base) % TRID_SPACE < count or \
+               (base - other) % TRID_SPACE < n:
+                return (other + n) % TRID_SPACE
+        return None
+
+    def alloc(self, count: int) -> int:
+        if not 0 < count <= TRID_SPACE - sum(self.blocks.values()):
+            raise RuntimeError('transaction ids exhausted')
+        base = self.cursor
+        for _ in range(len(self.blocks) + 1):
+            end = self.overlap(base, count)
+            if end is None:
+                break
+            base = end
+        else:
+            raise RuntimeError('transaction ids exhausted')
+        self.blocks[base] = count
+        self.cursor = (base + count) % TRID_SPACE
+        return base
+
+    def free(self, base: int):
+        self.blocks.pop(base, None)
+
+
 class DHCPBaseScanner(UDPScanner, MainRunner):
     target: str
     linkaddr: str
@@ -32,6 +100,9 @@ class DHCPBaseScanner(UDPScanner, MainRunner):
     step: int
     retry: int
     duid: dhcp6.DUID_LL
+    trids: DHCPTransactions
+    trid_base: Optional[int]
+    trid_count: int
 
     udp_addr = ('::', 547)
 
@@ -57,34 +128,90 @@ class DHCPBaseScanner(UDPScanner, MainRunner):
         self.step = step
         self.retry = retry
         self.duid = dhcp6.DUID_LL(lladdr=random.randbytes(6))
+        self.trids = DHCPTransactions.of(self.open_sock())
+        self.trid_base = None
+        self.trid_count = 0
+
+    def trid_alloc(self, count: int):
+        """Allocate count transaction ids for this scan."""
+        self.trid_free()
+        self.trid_base = self.trids.alloc(count)
+        self.trid_count = count
+
+    def trid_free(self):
+        if self.trid_base is not None:
+            self.trids.free(self.trid_base)
+            self.trid_base = None
+            self.trid_count = 0
+
+    def trid(self, index: int) -> int:
+        assert self.trid_base is not None
+        return (self.trid_base + index) % TRID_SPACE
+
+    def trid_index(self, trid: int) -> Optional[int]:
+        """Index of trid in the allocated block, or None."""
+        if self.trid_base is None:
+            return None
+        index = (trid - self.trid_base) % TRID_SPACE
+        return index if index < self.trid_count else None
+
+    def get_subnet_int(self, plen: int, diff: int, index: int) -> int:
+        """The index-th of the 2**diff subnets of prefix length plen
+        around linkaddr."""
+        net = ipaddress.IPv6Interface(self.linkaddr).network
+        net = net.supernet(128 - plen + diff)
+        return int(net.network_address) + (index << (128 - plen))
+
+    def get_subnet(self, plen: int, diff: int, index: int) -> str:
+        return str(
+            ipaddress.IPv6Address(self.get_subnet_int(plen, diff, index)))
+
+    def get_subnets(self, plen: int, diff: int) -> list[str]:
+        return [self.get_subnet(plen, diff, i) for i in range(1 << diff)]
+
+    @functools.cached_property
+    def inforeq_template(self) -> DHCPRelayTemplate:
+        msg = dhcp6.DHCP6_InfoRequest() / \
+            dhcp6.DHCP6OptClientId(duid=self.duid) / \
+            dhcp6.DHCP6OptOptReq()
+        pkt = dhcp6.DHCP6_RelayForward() / \
+            dhcp6.DHCP6OptRelayMsg(message=msg)
+        return DHCPRelayTemplate(bytes(pkt))
+
+    @functools.cached_property
+    def solicit_template(self) -> DHCPRelayTemplate:
+        msg = dhcp6.DHCP6_Solicit() / \
+            dhcp6.DHCP6OptClientId(duid=self.duid) / \
+            dhcp6.DHCP6OptOptReq() / \
+            dhcp6.DHCP6OptElapsedTime() / \
+            dhcp6.DHCP6OptIA_NA() / \
+            dhcp6.DHCP6OptIA_TA() / \
+            dhcp6.DHCP6OptIA_PD()
+        pkt = dhcp6.DHCP6_RelayForward() / \
+            dhcp6.DHCP6OptRelayMsg(message=msg)
+        return DHCPRelayTemplate(bytes(pkt))
 
     def build_inforeq(self,
                       linkaddr: Optional[str] = None,
                       trid: Optional[int] = None) -> bytes:
         linkaddr = linkaddr if linkaddr is not None else self.linkaddr
-        trid = trid if trid is not None else random.getrandbits(16)
-        msg = dhcp6.DHCP6_InfoRequest(trid=trid) / \
-            dhcp6.DHCP6OptClientId(duid=self.duid) / \
-            dhcp6.DHCP6OptOptReq()
-        pkt = dhcp6.DHCP6_RelayForward(linkaddr=linkaddr) / \
-            dhcp6.DHCP6OptRelayMsg(message=msg)
-        return bytes(pkt)
+        trid = trid if trid is not None else random.getrandbits(24)
+        return self.inforeq_template.build(
+            socket.inet_pton(socket.AF_INET6, linkaddr), trid)
 
     def build_solicit(self,
                       linkaddr: Optional[str] = None,
                       trid: Optional[int] = None) -> bytes:
         linkaddr = linkaddr if linkaddr is not None else self.linkaddr
-        trid = trid if trid is not None else random.getrandbits(16)
-        msg = dhcp6.DHCP6_Solicit(trid=trid) / \
-            dhcp6.DHCP6OptClientId(duid=self.duid) / \
-            dhcp6.DHCP6OptOptReq() / \
-            dhcp6.DHCP6OptElapsedTime() / \
-            dhcp6.DHCP6OptIA_NA(iaid=random.getrandbits(32)) / \
-            dhcp6.DHCP6OptIA_TA(iaid=random.getrandbits(32)) / \
-            dhcp6.DHCP6OptIA_PD(iaid=random.getrandbits(32))
-        pkt = dhcp6.DHCP6_RelayForward(linkaddr=linkaddr) / \
-            dhcp6.DHCP6OptRelayMsg(message=msg)
-        return bytes(pkt)
+        trid = trid if trid is not None else random.getrandbits(24)
+        return self.build_solicit_packed(
+            socket.inet_pton(socket.AF_INET6, linkaddr), trid)
+
+    def build_solicit_packed(self, linkaddr: bytes, trid: int) -> bytes:
+        # fresh IAIDs, so that servers lease new addrs for every probe
+        return self.solicit_template.build(
+            linkaddr, trid, (random.getrandbits(32), random.getrandbits(32),
+                             random.getrandbits(32)))
 
     def parse_msg(self, buf: bytes) -> dhcp6.DHCP6:
         pkt = dhcp6._dhcp6_dispatcher(buf)
@@ -117,6 +244,18 @@ class DHCPBaseScanner(UDPScanner, MainRunner):
                     return opt.prefix
         return None
 
+    @override(UDPScanner)
+    def scan(self):
+        with self.trids.lock:
+            super().scan()
+
+    @override(UDPScanner)
+    def scan_and_parse(self):
+        try:
+            super().scan_and_parse()
+        finally:
+            self.trid_free()
+
     @override(UDPScanner)
     def recv_filter(self, result: tuple[str, int, bytes]) -> bool:
         addr, port, buf = result
@@ -154,10 +293,11 @@ class DHCPBaseScanner(UDPScanner, MainRunner):
 
 class DHCPRetriever(ResultParser[dhcp6.DHCP6], DHCPBaseScanner):
     retrieve_type: type[dhcp6.DHCP6]
+    retries: int
 
-    def __init__(self, trid: Optional[int] = None, **kwargs):
-        super().__init__(**kwargs)
-        self.trid = trid if trid is not None else random.getrandbits(16)
+    # rebuild the probe every round rather than resending the same
+    # bytes, so that each retry carries its own id
+    send_rebuild = True
 
     def retrieve(self,
                  linkaddr: Optional[str] = None) -> Optional[dhcp6.DHCP6]:
@@ -176,7 +316,7 @@ class DHCPRetriever(ResultParser[dhcp6.DHCP6], DHCPBaseScanner):
             try:
                 msg = self.parse_msg(buf)
                 if isinstance(msg, self.retrieve_type) and \
-                   msg.trid == self.trid:
+                   self.trid_index(msg.trid) is not None:
                     self.result = msg
                     return
             except Exception as e:
@@ -187,6 +327,14 @@ class DHCPRetriever(ResultParser[dhcp6.DHCP6], DHCPBaseScanner):
     def send_reset(self):
         super().send_reset()
         self.result = None
+        # one id per retry, replies to any of them are accepted
+        self.trid_alloc(max(self.send_retry, 1))
+        self.retries = 0
+
+    def next_trid(self) -> int:
+        trid = self.trid(self.retries % self.trid_count)
+        self.retries += 1
+        return trid
 
     @override(DHCPBaseScanner)
     def send(self):
@@ -198,8 +346,7 @@ class DHCPRequester(DHCPRetriever):
 
     @override(DHCPRetriever)
     def get_pkt(self) -> tuple[str, int, bytes]:
-        self.trid += 1
-        buf = self.build_inforeq(trid=self.trid)
+        buf = self.build_inforeq(trid=self.next_trid())
         return (self.target, 547, buf)
 
 
@@ -208,6 +355,47 @@ class DHCPSoliciter(DHCPRetriever):
 
     @override(DHCPRetriever)
     def get_pkt(self) -> tuple[str, int, bytes]:
-        self.trid += 1
-        buf = self.build_solicit(trid=self.trid)
+        buf = self.build_solicit(trid=self.next_trid())
         return (self.target, 547, buf)
+
+
+class DHCPBatchSoliciter(ResultParser[dict[str, dhcp6.DHCP6_Advertise]],
+                         DHCPBaseScanner):
+    """Solicit for many link addrs in one send window."""
+
+    linkaddrs: list[str]
+
+    def __init__(self, linkaddrs: list[str], **kwargs):
+        super().__init__(**kwargs)
+        self.linkaddrs = linkaddrs
+
+    @override(ResultParser)
+    def parse(self):
+        results: dict[str, dhcp6.DHCP6_Advertise] = dict()
+        for pkt in self.recv_pkts:
+            _, _, buf = pkt
+            try:
+                msg = self.parse_msg(buf)
+                if not isinstance(msg, dhcp6.DHCP6_Advertise):
+                    continue
+                index = self.trid_index(msg.trid)
+                if index is not None:
+                    results[self.linkaddrs[index]] = msg
+            except Exception as e:
+                self.logger.debug('except while parsing: %s', e)
+        self.result = results
+
+    @override(DHCPBaseScanner)
+    def get_pkts(self) -> list[tuple[str, int, bytes]]:
+        return [(self.target, 547,
+                 self.build_solicit(linkaddr=addr, trid=self.trid(index)))
+                for index, addr in enumerate(self.linkaddrs)]
+
+    @override(DHCPBaseScanner)
+    def send_reset(self):
+        super().send_reset()
+        self.trid_alloc(len(self.linkaddrs))
+
+    @override(DHCPBaseScanner)
+    def send(self):
+        self.send_pkts_with_timewait()
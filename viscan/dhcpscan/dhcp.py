@@ -12,9 +12,9 @@ from ..common.decorators import override
 from ..common.argparser import ScanArgParser
 from .base import DHCPBaseScanner
 from .ping import DHCPPinger
-from .scale import DHCPScaler, DHCPPoolScale
+from .scale import DHCPBatchScaler, DHCPPoolScale
 from .locate import DHCPLocator
-from .enum import DHCPEnumerator
+from .enum import DHCPEnumerator, DHCPBatchEnumerator
 
 
 class DHCPInfo:
@@ -103,11 +103,11 @@ class DHCPScanner(ResultParser[DHCPInfo], DHCPBaseScanner):
             raise RuntimeError('no advertise')
         return reply, advertise
 
-    def scale(self, addr: str) -> dict[str, Optional[DHCPPoolScale]]:
-        self.logger.debug('scale %s', addr)
-        kwargs = self.kwargs.copy()
-        kwargs['linkaddr'] = addr
-        scaler = DHCPScaler(**kwargs)
+    def scale(self,
+              addrs: list[str]) -> dict[str, dict[str,
+                                                  Optional[DHCPPoolScale]]]:
+        self.logger.debug('scale %d addrs', len(addrs))
+        scaler = DHCPBatchScaler(linkaddrs=addrs, **self.kwargs)
         scaler.scan_and_parse()
         assert scaler.result is not None
         return scaler.result
@@ -126,8 +126,6 @@ class DHCPScanner(ResultParser[DHCPInfo], DHCPBaseScanner):
         assert enumerator.result is not None
         addrs = []
         for addr, msg in enumerator.result:
-            if msg is None:
-                continue
             if self.get_na(msg) is None and \
                self.get_ta(msg) is None and \
                self.get_pd(msg) is None:
@@ -144,13 +142,22 @@ class DHCPScanner(ResultParser[DHCPInfo], DHCPBaseScanner):
         enumerator = DHCPEnumerator(**kwargs)
         enumerator.scan_and_parse()
         assert enumerator.result is not None
-        addrs = []
-        for addr, msg in enumerator.result:
-            if msg is not None:
-                addrs.append(addr)
+        addrs = [addr for addr, _ in enumerator.result]
         self.logger.debug('enumerate(%d/%d) %d addrs', plen, diff, len(addrs))
         return addrs
 
+    def stateless_enumerate_all(self, plens: list[int],
+                                diff: int) -> dict[int, list[str]]:
+        kwargs = self.kwargs.copy()
+        kwargs['diff'] = diff
+        enumerator = DHCPBatchEnumerator(plens=plens, **kwargs)
+        enumerator.scan_and_parse()
+        results = enumerator.get_jsonable()
+        for plen, addrs in results.items():
+            self.logger.debug('enumerate(%d/%d) %d addrs', plen, diff,
+                              len(addrs))
+        return results
+
     def stateful_dispatch(self, reply: dhcp6.DHCP6_Reply,
                           advertise: dhcp6.DHCP6_Advertise):
         self.logger.debug('in stateful dispatch')
@@ -162,7 +169,7 @@ class DHCPScanner(ResultParser[DHCPInfo], DHCPBaseScanner):
             self.logger.warning('enumerate too many addrs')
             subnets = {addr: None for addr in addrs}
         else:
-            subnets = {addr: self.scale(addr) for addr in addrs}
+            subnets = dict(self.scale(addrs))
         self.result = DHCPInfo(t='stateful',
                                target=self.target,
                                linkaddr=self.linkaddr,
@@ -174,11 +181,10 @@ class DHCPScanner(ResultParser[DHCPInfo], DHCPBaseScanner):
     def stateless_dispatch(self, reply: dhcp6.DHCP6_Reply,
                            advertise: dhcp6.DHCP6_Advertise):
         self.logger.debug('in stateless dispatch')
-        results: dict[int, list[str]] = dict()
         beg, end, step = self.stateless_search_range
         limit = self.lossrate * step**2
-        for plen in range(beg, end, step):
-            results[plen] = self.stateless_enumerate(plen, step)
+        results = self.stateless_enumerate_all(list(range(beg, end, step)),
+                                               step)
         plen = self.stateless_plen_select(results, limit)
         self.logger.debug('select plen %d', plen)
 
@@ -1,78 +1,172 @@
-import ipaddress
-
 import scapy.layers.dhcp6 as dhcp6
 
 from typing import Any, Optional
+from collections.abc import Iterator
 
 from ..common.base import ResultParser
 from ..common.decorators import override
 from .base import DHCPBaseScanner
 
 
-class DHCPEnumerator(
-        ResultParser[list[tuple[str, Optional[dhcp6.DHCP6_Advertise]]]],
-        DHCPBaseScanner):
-    targets: list[str]
+class DHCPEnumerator(ResultParser[list[tuple[str, dhcp6.DHCP6_Advertise]]],
+                     DHCPBaseScanner):
+    """Enumerate the 2**diff subnets of prefix length plen, subnets are
+    generated while sending and only responding ones are kept, so diff
+    may be up to 24.
+
+    Replies are parsed as they arrive, and with ndjson output written
+    out at once rather than when the scan ends."""
+
+    advertises: dict[int, dhcp6.DHCP6_Advertise]
 
     def __init__(self, **kwargs):
+        kwargs['recv_online'] = True
+        super().__init__(**kwargs)
+        if not 0 <= self.diff <= 24:
+            raise ValueError(f'invalid diff: {self.diff}')
+        self.advertises = dict()
+
+    def get_record(self, msg: dhcp6.DHCP6_Advertise) -> dict[str, Any]:
+        return {
+            'na': self.get_na(msg),
+            'ta': self.get_ta(msg),
+            'pd': self.get_pd(msg),
+        }
+
+    @override(ResultParser)
+    def parse(self):
+        # already folded by recv_update
+        self.result = [(self.get_subnet(self.plen, self.diff, index),
+                        self.advertises[index])
+                       for index in sorted(self.advertises)]
+
+    @override(ResultParser)
+    def get_jsonable(self) -> dict[str, Any]:
+        assert self.result is not None
+        return {addr: self.get_record(msg) for addr, msg in self.result}
+
+    @override(ResultParser)
+    def get_records(self) -> list[list[Any]]:
+        if self.result_sink is not None:
+            return []  # emitted on arrival
+        return [[addr, record]
+                for addr, record in self.get_jsonable().items()]
+
+    @override(ResultParser)
+    def show(self):
+        assert self.result is not None
+        for addr, msg in self.result:
+            na = self.get_na(msg)
+            ta = self.get_ta(msg)
+            pd = self.get_pd(msg)
+            print(f'{addr}\t{na}\t{ta}\t{pd}')
+
+    @override(DHCPBaseScanner)
+    def get_pkts(self) -> Iterator[tuple[str, int, bytes]]:
+        base = self.get_subnet_int(self.plen, self.diff, 0)
+        shift = 128 - self.plen
+        for index in range(1 << self.diff):
+            addr = (base + (index << shift)).to_bytes(16, 'big')
+            buf = self.build_solicit_packed(addr, self.trid(index))
+            yield (self.target, 547, buf)
+
+    @override(DHCPBaseScanner)
+    def recv_update(self, pkt: tuple[str, int, bytes]) -> Optional[int]:
+        _, _, buf = pkt
+        try:
+            msg = self.parse_msg(buf)
+        except Exception as e:
+            self.logger.debug('except while parsing: %s', e)
+            return None
+        if not isinstance(msg, dhcp6.DHCP6_Advertise):
+            return None
+        index = self.trid_index(msg.trid)
+        if index is None or index in self.advertises:
+            return index
+        self.advertises[index] = msg
+        addr = self.get_subnet(self.plen, self.diff, index)
+        self.emit([addr, self.get_record(msg)])
+        return index
+
+    @override(DHCPBaseScanner)
+    def recv_reset(self):
+        super().recv_reset()
+        self.advertises = dict()
+
+    @override(DHCPBaseScanner)
+    def send_reset(self):
+        super().send_reset()
+        self.trid_alloc(1 << self.diff)
+
+    @override(DHCPBaseScanner)
+    def send(self):
+        self.send_pkts_with_timewait()
+
+
+class DHCPBatchEnumerator(
+        ResultParser[dict[int, list[tuple[str,
+                                          Optional[dhcp6.DHCP6_Advertise]]]]],
+        DHCPBaseScanner):
+    """Enumerate subnets of many prefix lengths in one send window,
+    transaction ids are allocated for the (plen, subnet) pairs."""
+
+    plens: list[int]
+    targets: list[tuple[int, str]]
+
+    def __init__(self, plens: list[int], **kwargs):
         super().__init__(**kwargs)
-        net = ipaddress.IPv6Interface(self.linkaddr).network
-        net = net.supernet(128 - self.plen + self.diff)
-        self.targets = [
-            str(addr.network_address) for addr in net.subnets(self.diff)
-        ]
+        self.plens = plens
+        self.targets = [(plen, addr) for plen in plens
+                        for addr in self.get_subnets(plen, self.diff)]
 
     @override(ResultParser)
     def parse(self):
-        results = [(addr, None) for addr in self.targets]
+        msgs: list[Optional[dhcp6.DHCP6_Advertise]] = \
+            [None for _ in self.targets]
         for pkt in self.recv_pkts:
             _, _, buf = pkt
             try:
                 msg = self.parse_msg(buf)
                 if msg is None or not isinstance(msg, dhcp6.DHCP6_Advertise):
                     continue
-                trid = msg.trid
-                if trid < len(results):
-                    results[trid] = (results[trid][0], msg)
+                index = self.trid_index(msg.trid)
+                if index is not None:
+                    msgs[index] = msg
             except Exception as e:
                 self.logger.debug('except while parsing: %s', e)
+        results: dict[int, list[tuple[str, Optional[dhcp6.DHCP6_Advertise]]]]
+        results = {plen: [] for plen in self.plens}
+        for (plen, addr), adv in zip(self.targets, msgs):
+            results[plen].append((addr, adv))
         self.result = results
 
     @override(ResultParser)
-    def get_jsonable(self) -> dict[str, Any]:
+    def get_jsonable(self) -> dict[int, list[str]]:
         assert self.result is not None
-        results: dict[str, Any] = dict()
-        for addr, msg in self.result:
-            if msg is None:
-                results[addr] = None
-            else:
-                results[addr] = {
-                    'na': self.get_na(msg),
-                    'ta': self.get_ta(msg),
-                    'pd': self.get_pd(msg),
-                }
-        return results
+        return {
+            plen: [addr for addr, msg in results if msg is not None]
+            for plen, results in self.result.items()
+        }
 
     @override(ResultParser)
     def show(self):
         assert self.result is not None
-        for addr, msg in self.result:
-            if msg is None:
-                print(f'{addr}\tNone')
-            else:
-                na = self.get_na(msg)
-                ta = self.get_ta(msg)
-                pd = self.get_pd(msg)
-                print(f'{addr}\t{na}\t{ta}\t{pd}')
+        for plen, addrs in self.get_jsonable().items():
+            print(f'{plen}\t{len(addrs)}')
 
     @override(DHCPBaseScanner)
     def get_pkts(self) -> list[tuple[str, int, bytes]]:
         pkts = []
-        for trid, addr in enumerate(self.targets):
-            msg = self.build_solicit(linkaddr=addr, trid=trid)
-            pkts.append((self.target, 547, bytes(msg)))
+        for index, (_, addr) in enumerate(self.targets):
+            buf = self.build_solicit(linkaddr=addr, trid=self.trid(index))
+            pkts.append((self.target, 547, buf))
         return pkts
 
+    @override(DHCPBaseScanner)
+    def send_reset(self):
+        super().send_reset()
+        self.trid_alloc(len(self.targets))
+
     @override(DHCPBaseScanner)
     def send(self):
         self.send_pkts_with_timewait()
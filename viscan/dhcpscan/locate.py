@@ -1,18 +1,19 @@
 import socket
 import ipaddress
-import functools
+
+import scapy.layers.dhcp6 as dhcp6
 
 from typing import Any, Optional
 
 from ..common.base import ResultParser
 from ..common.decorators import override
-from .base import DHCPBaseScanner, DHCPSoliciter
+from .base import DHCPBaseScanner, DHCPBatchSoliciter
 from .scale import DHCPScaler, DHCPPoolScale
 
 
 class DHCPLocator(ResultParser[int], DHCPBaseScanner):
+    kwargs: dict[str, Any]
     scaler: DHCPScaler
-    soliciter: DHCPSoliciter
     na_scale: Optional[DHCPPoolScale]
     ta_scale: Optional[DHCPPoolScale]
     pd_scale: Optional[DHCPPoolScale]
@@ -21,13 +22,11 @@ class DHCPLocator(ResultParser[int], DHCPBaseScanner):
         sock = sock if sock is not None else self.get_sock()
         super().__init__(sock=sock, **kwargs)
         self.scaler = DHCPScaler(sock=sock, **kwargs)
-        self.soliciter = DHCPSoliciter(sock=sock, **kwargs)
+        self.kwargs = kwargs
 
-    def _accept(self, addr: str) -> bool:
+    def accept(self, msg: dhcp6.DHCP6_Advertise) -> bool:
+        """Whether the advertise comes from the pools of linkaddr."""
         try:
-            msg = self.soliciter.retrieve(addr)
-            if msg is None:
-                return False
             na = self.get_na(msg)
             if na is not None and self.na_scale is not None:
                 return na in self.na_scale
@@ -41,12 +40,32 @@ class DHCPLocator(ResultParser[int], DHCPBaseScanner):
             self.logger.debug('except while scanning: %s', e)
         return False
 
-    @functools.cache
-    def accept(self, addr: str) -> bool:
+    def get_candidates(self) -> list[ipaddress.IPv6Network]:
+        """Supernets of linkaddr every step prefix lengths."""
+        subnet = ipaddress.IPv6Interface(self.linkaddr).network
+        subnets = []
+        while subnet.prefixlen > self.step:
+            subnet = subnet.supernet(self.step)
+            subnets.append(subnet)
+        return subnets
+
+    def solicit_all(self, addrs: list[str]) -> set[str]:
+        """Solicit for all addrs at once, retry the unaccepted ones up to
+        retry times, return the accepted addrs."""
+        accepted: set[str] = set()
         for _ in range(self.retry):
-            if self._accept(addr):
-                return True
-        return False
+            pending = [addr for addr in addrs if addr not in accepted]
+            if len(pending) == 0:
+                break
+            soliciter = DHCPBatchSoliciter(linkaddrs=pending,
+                                           sock=self.sock,
+                                           **self.kwargs)
+            soliciter.scan_and_parse()
+            assert soliciter.result is not None
+            for addr, msg in soliciter.result.items():
+                if self.accept(msg):
+                    accepted.add(addr)
+        return accepted
 
     @override(DHCPBaseScanner)
     def scan_and_parse(self):
@@ -57,15 +76,22 @@ class DHCPLocator(ResultParser[int], DHCPBaseScanner):
             self.ta_scale = self.scaler.result['ta']
             self.pd_scale = self.scaler.result['pd']
 
-            subnet = ipaddress.IPv6Interface(self.linkaddr).network
+            # probe the boundaries of all candidate supernets at once,
+            # then climb while both ends are accepted; nested supernets
+            # often share a boundary, probe it once
+            candidates = self.get_candidates()
+            addrs = []
+            for candidate in candidates:
+                addrs.append(str(candidate.network_address))
+                addrs.append(str(candidate.broadcast_address))
+            accepted = self.solicit_all(list(dict.fromkeys(addrs)))
 
-            while subnet.prefixlen > self.step:
-                next_subnet = subnet.supernet(self.step)
-                first = next_subnet.network_address
-                last = next_subnet.broadcast_address
-                if not self.accept(str(first)) or not self.accept(str(last)):
+            subnet = ipaddress.IPv6Interface(self.linkaddr).network
+            for candidate in candidates:
+                if str(candidate.network_address) not in accepted or \
+                   str(candidate.broadcast_address) not in accepted:
                     break
-                subnet = next_subnet
+                subnet = candidate
                 self.logger.debug('accept %s', subnet)
 
             self.result = subnet.prefixlen
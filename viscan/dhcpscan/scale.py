@@ -53,6 +53,19 @@ class DHCPPoolScale:
         d = math.ceil((a2 - a1) / (len(addrs) - 1))
         return cls('random', a1, a2, d)
 
+    @classmethod
+    def from_results(cls, results: dict[str, list[Optional[str]]],
+                     limit: float) -> dict[str, Optional[Self]]:
+        """Scale each of na/ta/pd addrs, None if less than limit."""
+        scales: dict[str, Optional[Self]] = dict()
+        for name, addrs in results.items():
+            addr_strs = [addr for addr in addrs if addr is not None]
+            if len(addr_strs) < limit:
+                scales[name] = None
+            else:
+                scales[name] = cls.from_strs(addr_strs)
+        return scales
+
     @functools.cached_property
     def accept_range(self):
         if self.t == 'static':
@@ -95,8 +108,7 @@ class DHCPScaler(ResultParser[dict[str, Optional[DHCPPoolScale]]],
                 msg = self.parse_msg(buf)
                 if not isinstance(msg, dhcp6.DHCP6_Advertise):
                     continue
-                trid = msg.trid
-                if trid >= self.count:
+                if self.trid_index(msg.trid) is None:
                     continue
                 na_addrs.append(self.get_na(msg))
                 ta_addrs.append(self.get_ta(msg))
@@ -104,15 +116,12 @@ class DHCPScaler(ResultParser[dict[str, Optional[DHCPPoolScale]]],
             except Exception as e:
                 self.logger.debug('except while parsing: %s', e)
 
-        results: dict[str, Any] = dict()
-        for name, addrs in zip(('na', 'ta', 'pd'),
-                               (na_addrs, ta_addrs, pd_addrs)):
-            addr_strs: list[str] = [addr for addr in addrs if addr is not None]
-            if len(addr_strs) < self.lossrate * self.count:
-                results[name] = None
-            else:
-                results[name] = DHCPPoolScale.from_strs(addr_strs)
-        self.result = results
+        self.result = DHCPPoolScale.from_results(
+            {
+                'na': na_addrs,
+                'ta': ta_addrs,
+                'pd': pd_addrs
+            }, self.lossrate * self.count)
 
     @override(ResultParser)
     def get_jsonable(self) -> dict[str, Any]:
@@ -135,11 +144,102 @@ class DHCPScaler(ResultParser[dict[str, Optional[DHCPPoolScale]]],
     @override(DHCPBaseScanner)
     def get_pkts(self) -> list[tuple[str, int, bytes]]:
         pkts = []
-        for trid in range(self.count):
-            buf = self.build_solicit(trid=trid)
+        for probe in range(self.count):
+            buf = self.build_solicit(trid=self.trid(probe))
             pkts.append((self.target, 547, buf))
         return pkts
 
+    @override(DHCPBaseScanner)
+    def send_reset(self):
+        super().send_reset()
+        self.trid_alloc(self.count)
+
+    @override(DHCPBaseScanner)
+    def send(self):
+        self.send_pkts_with_timewait()
+
+
+PoolScales = dict[str, Optional[DHCPPoolScale]]
+
+
+class DHCPBatchScaler(ResultParser[dict[str, PoolScales]], DHCPBaseScanner):
+    """Scale many subnets in one send window, transaction ids are
+    allocated subnet index * count + probe index."""
+
+    linkaddrs: list[str]
+
+    def __init__(self, linkaddrs: list[str], **kwargs):
+        super().__init__(**kwargs)
+        self.linkaddrs = linkaddrs
+
+    @override(ResultParser)
+    def parse(self):
+        results: list[dict[str, list[Optional[str]]]] = [{
+            'na': [None for _ in range(self.count)],
+            'ta': [None for _ in range(self.count)],
+            'pd': [None for _ in range(self.count)],
+        } for _ in self.linkaddrs]
+
+        for pkt in self.recv_pkts:
+            _, _, buf = pkt
+            try:
+                msg = self.parse_msg(buf)
+                if not isinstance(msg, dhcp6.DHCP6_Advertise):
+                    continue
+                index = self.trid_index(msg.trid)
+                if index is None:
+                    continue
+                subnet, probe = divmod(index, self.count)
+                result = results[subnet]
+                result['na'][probe] = self.get_na(msg)
+                result['ta'][probe] = self.get_ta(msg)
+                result['pd'][probe] = self.get_pd(msg)
+            except Exception as e:
+                self.logger.debug('except while parsing: %s', e)
+
+        limit = self.lossrate * self.count
+        self.result = {
+            addr: DHCPPoolScale.from_results(result, limit)
+            for addr, result in zip(self.linkaddrs, results)
+        }
+
+    @override(ResultParser)
+    def get_jsonable(self) -> dict[str, Any]:
+        assert self.result is not None
+        return {
+            addr: {
+                name: scale.get_jsonable() if scale is not None else None
+                for name, scale in scales.items()
+            }
+            for addr, scales in self.result.items()
+        }
+
+    @override(ResultParser)
+    def show(self):
+        assert self.result is not None
+        for addr, scales in self.result.items():
+            print(addr)
+            for name, scale in scales.items():
+                if scale is not None:
+                    print(f'{name}\t{scale.summary()}')
+
+    @override(DHCPBaseScanner)
+    def get_pkts(self) -> list[tuple[str, int, bytes]]:
+        # probe all subnets in turn, each subnet still gets its
+        # solicits in order
+        pkts = []
+        for probe in range(self.count):
+            for subnet, addr in enumerate(self.linkaddrs):
+                buf = self.build_solicit(
+                    linkaddr=addr, trid=self.trid(subnet * self.count + probe))
+                pkts.append((self.target, 547, buf))
+        return pkts
+
+    @override(DHCPBaseScanner)
+    def send_reset(self):
+        super().send_reset()
+        self.trid_alloc(len(self.linkaddrs) * self.count)
+
     @override(DHCPBaseScanner)
     def send(self):
         self.send_pkts_with_timewait()
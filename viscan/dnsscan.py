@@ -1,47 +1,77 @@
+import time
 import random
+import threading
+import collections
 
 import dns.resolver
-import dns.query
 import dns.message
 
 from typing import Any, Optional
 from argparse import Namespace
+from concurrent.futures import Future, ThreadPoolExecutor, wait, \
+    FIRST_COMPLETED
 
-from .defaults import DNS_LIMIT
+from .defaults import DNS_LIMIT, DNS_WINDOW, DNS_NS_WINDOW, DNS_TCP_CONNS
 from .common.base import ResultParser, Sender, MainRunner, BaseScanner
+from .common.dnsclient import DNSClient
+from .common.dnscache import DNSCache
 from .common.decorators import override
 from .common.argparser import ScanArgParser
 
 
 class DNSScanner(ResultParser[list[str]], Sender, MainRunner, BaseScanner):
     basename: str
-    nameserver: str
+    nameservers: list[str]
+    nameserver_slots: dict[str, threading.BoundedSemaphore]
     limit: int
+    window: int
     no_recursive: bool
     skip_check_autogen: bool
     via_tcp: bool
+    client: DNSClient
+    cache: DNSCache
+    dnssec: bool
 
     SUFFIX = 'ip6.arpa.'
     SUFFIXLEN = len(SUFFIX)
 
     def __init__(self,
                  basename: str = SUFFIX,
-                 nameserver: Optional[str] = None,
+                 nameservers: Optional[list[str]] = None,
                  limit: int = DNS_LIMIT,
+                 window: int = DNS_WINDOW,
+                 nameserver_window: int = DNS_NS_WINDOW,
                  no_recursive: bool = False,
                  skip_check_autogen: bool = False,
                  via_tcp: bool = False,
+                 tcp_conns: int = DNS_TCP_CONNS,
+                 cache_path: Optional[str] = None,
+                 dnssec: bool = False,
                  **kwargs):
         super().__init__(**kwargs)
         if not basename.endswith(self.SUFFIX):
             raise ValueError(f'invalid base name: {basename}')
         self.basename = basename
-        self.nameserver = nameserver if nameserver is not None else \
-            self.get_nameserver()
+        self.nameservers = nameservers if nameservers else \
+            [self.get_nameserver()]
+        self.nameserver_slots = {
+            ns: threading.BoundedSemaphore(nameserver_window)
+            for ns in self.nameservers
+        }
         self.limit = 2 * limit + self.SUFFIXLEN
+        self.window = window
         self.no_recursive = no_recursive
         self.skip_check_autogen = skip_check_autogen
         self.via_tcp = via_tcp
+        self.client = DNSClient(via_tcp=via_tcp, tcp_conns=tcp_conns)
+        self.cache = DNSCache(cache_path)
+        self.dnssec = dnssec
+
+    @override(ResultParser)
+    def get_records(self) -> list[str]:
+        assert self.result is not None
+        # names are emitted on discovery while streaming
+        return [] if self.result_sink is not None else self.result
 
     @override(ResultParser)
     def show(self):
@@ -52,50 +82,114 @@ class DNSScanner(ResultParser[list[str]], Sender, MainRunner, BaseScanner):
     @override(BaseScanner)
     def scan_and_parse(self):
         results: list[str] = []
+        self.cache.load()
         try:
             if not self.skip_check_autogen and self.check_autogen():
                 raise RuntimeError('autogen zone detected')
             self.traversal(self.basename, results)
         except Exception as e:
             self.logger.debug('except while scanning: %s', e)
+        finally:
+            self.client.close()
+            self.cache.save()
+        self.logger.debug('cache hits %d misses %d', self.cache.hits,
+                          self.cache.misses)
         self.result = results
 
     def traversal(self, name: str, results: list[str] = []):
-        if len(name) > self.limit or not self.query_noerror(name):
-            return
-        if len(name) == self.limit:
-            self.logger.debug('traversal %s', name)
-            results.append(name)
-            return
-        for c in '0123456789abcdef':
-            self.traversal(f'{c}.{name}', results)
+        """Walk the zone below name breadth first, with up to window
+        queries in flight, skipping names whose outcome is cached.
+
+        With dnssec, siblings are queried one after another instead, so
+        that the NSEC span in each NXDOMAIN reply answers the following
+        siblings from cache.
+        """
+        pending = collections.deque([name])
+        running: dict[Future[bool], str] = dict()
+        siblings: dict[str, list[str]] = dict()
+        found: list[str] = []
+
+        def visit(name: str, noerror: bool):
+            rest = siblings.pop(name, None)
+            if rest:
+                siblings[rest[0]] = rest[1:]
+                pending.append(rest[0])
+            if not noerror:
+                return
+            if len(name) == self.limit:
+                self.logger.debug('traversal %s', name)
+                found.append(name)
+                self.emit(name)
+            elif len(name) < self.limit:
+                children = [f'{c}.{name}' for c in '0123456789abcdef']
+                if self.dnssec:
+                    siblings[children[0]] = children[1:]
+                    pending.append(children[0])
+                else:
+                    pending.extend(children)
+
+        with ThreadPoolExecutor(self.window) as pool:
+            while len(pending) != 0 or len(running) != 0:
+                while len(pending) != 0 and len(running) < self.window:
+                    name = pending.popleft()
+                    rcode = self.cache.get(name)
+                    if rcode is not None:
+                        visit(name, rcode == 0)
+                    else:
+                        running[pool.submit(self.query_walk, name)] = name
+                if len(running) == 0:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    visit(running.pop(future), future.result())
+        # same order as a depth first walk
+        found.sort(key=lambda name: name.split('.')[::-1])
+        results.extend(found)
 
     def check_autogen(self) -> bool:
-        c = 0
+        names = []
         for _ in range(16):
             a = '.'.join(random.randbytes(16).hex())
             name = f'{a}.{self.basename}'
-            name = name[-(64 + self.SUFFIXLEN):]
-            if self.query_noerror(name):
-                c += 1
-                if c >= 4:
-                    return True
-        return False
-
-    def query_noerror(self, name) -> bool:
+            names.append(name[-(64 + self.SUFFIXLEN):])
+        with ThreadPoolExecutor(len(names)) as pool:
+            return sum(pool.map(self.query_noerror, names)) >= 4
+
+    def query(self, name: str, nameserver: str) -> dns.message.Message:
+        query = dns.message.make_query(name, 'PTR', want_dnssec=self.dnssec)
+        if self.no_recursive:
+            query.flags = 0
+        return self.client.query(query, nameserver, self.send_timewait)
+
+    def query_walk(self, name: str) -> bool:
+        res = self.query_response(name)
+        if res is None:
+            return False
         try:
-            query = dns.message.make_query(name, 'PTR')
-            if self.no_recursive:
-                query.flags = 0
-            if self.via_tcp:
-                res = dns.query.tcp(query, self.nameserver)
-            else:
-                res = dns.query.udp(query, self.nameserver, self.send_timewait)
-            if res.rcode() == 0:
-                return True
+            self.cache.update(name, res)
         except Exception as e:
-            self.logger.debug('query %s failed: %s', name, e)
-        return False
+            self.logger.debug('except while parsing: %s', e)
+        return res.rcode() == 0
+
+    def query_noerror(self, name: str) -> bool:
+        res = self.query_response(name)
+        return res is not None and res.rcode() == 0
+
+    def query_response(self, name: str) -> Optional[dns.message.Message]:
+        """Query name, retrying failed queries on the next nameserver
+        with exponential backoff."""
+        n = len(self.nameservers)
+        first = random.randrange(n)
+        for i in range(max(self.send_retry, 1)):
+            if i != 0:
+                time.sleep(self.send_timewait * 2**(i - 1))
+            nameserver = self.nameservers[(first + i) % n]
+            try:
+                with self.nameserver_slots[nameserver]:
+                    return self.query(name, nameserver)
+            except Exception as e:
+                self.logger.debug('query %s failed: %s', name, e)
+        return None
 
     def get_nameserver(self) -> str:
         resolver = dns.resolver.get_default_resolver()
@@ -106,7 +200,10 @@ class DNSScanner(ResultParser[list[str]], Sender, MainRunner, BaseScanner):
     def get_argparser(cls, *args, **kwargs) -> ScanArgParser:
         parser = super().get_argparser(*args, **kwargs)
         parser.add_limit_dwim(DNS_LIMIT)
+        parser.add_window_dwim(DNS_WINDOW)
         parser.add_argument('--tcp', action='store_true')
+        parser.add_argument('--dnssec', action='store_true')
+        parser.add_argument('--cache')
         return parser
 
     @classmethod
@@ -114,13 +211,16 @@ class DNSScanner(ResultParser[list[str]], Sender, MainRunner, BaseScanner):
     def parse_args(cls, args: Namespace) -> dict[str, Any]:
         kwargs = super().parse_args(args)
         kwargs['limit'] = args.limit_dwim
+        kwargs['window'] = args.window_dwim
         kwargs['no_recursive'] = args.no_dwim
         kwargs['skip_check_autogen'] = args.skip_dwim
         kwargs['via_tcp'] = args.tcp
+        kwargs['dnssec'] = args.dnssec
+        kwargs['cache_path'] = args.cache
         if len(args.targets) >= 1:
             kwargs['basename'] = args.targets[0]
         if len(args.targets) >= 2:
-            kwargs['nameserver'] = args.targets[1]
+            kwargs['nameservers'] = args.targets[1:]
         return kwargs
 
 
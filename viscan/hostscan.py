@@ -1,64 +1,172 @@
 import random
 import struct
+import socket
 
-from typing import Any
+from typing import Any, Optional
+from collections.abc import Iterator
 from argparse import Namespace
 
 from .common.base import ResultParser, MainRunner
 from .common.dgram import ICMP6Scanner
+from .common.shard import Sharded
+from .common.cookie import ProbeCookie
+from .common.store import ResultStore
 from .common.decorators import override
-from .common.generators import AddrGenerator
+from .common.generators import TargetGenerator, AddrGenerator
 from .common.icmp6_utils import ICMP6_ECHO_REQ
 
 
-class HostScanner(ResultParser[list[tuple[str, bool]]], ICMP6Scanner,
+class HostScanner(ResultParser[dict[bytes, bool]], Sharded, ICMP6Scanner,
                   MainRunner):
-    targets: list[str]
+    targets: TargetGenerator[str]
     port: int
+    cookie: ProbeCookie
 
-    def __init__(self, targets: list[str], **kwargs):
+    def __init__(self, targets: TargetGenerator[str], **kwargs):
         super().__init__(**kwargs)
         self.targets = targets
         self.port = random.getrandbits(16)
+        self.cookie = ProbeCookie(self.key)
+
+    def parse_pkt(self, pkt: tuple[str, int, bytes]) -> Optional[bytes]:
+        addr, _, buf = pkt
+        port, seq, cookie = struct.unpack_from('!HHI', buffer=buf, offset=4)
+        src = socket.inet_pton(socket.AF_INET6, addr)
+        if port == self.port and \
+           seq == cookie & 0xffff and \
+           self.cookie.check(cookie, src, port):
+            return src
+        return None
+
+    def parse_buf(self, results: dict[bytes, bool],
+                  pkt: tuple[str, int, bytes]) -> Optional[bytes]:
+        try:
+            src = self.parse_pkt(pkt)
+        except Exception as e:
+            self.logger.debug('except while parsing: %s', e)
+            return None
+        if src is not None:
+            results[src] = True
+        return src
 
     @override(ResultParser)
     def parse(self):
-        results = [(target, False) for target in self.targets]
+        if self.recv_online:
+            return  # already folded by recv_update
+        results: dict[bytes, bool] = dict()
         for pkt in self.recv_pkts:
-            try:
-                addr, _, buf = pkt
-                port, seq = struct.unpack_from('!HH', buffer=buf, offset=4)
-                if port == self.port and \
-                   seq <= len(results) and \
-                   addr == results[seq][0]:
-                    results[seq] = (addr, True)
-            except Exception as e:
-                self.logger.debug('except while parsing: %s', e)
+            self.parse_buf(results, pkt)
         self.result = results
 
+    def get_state(self, addr: str) -> bool:
+        assert self.result is not None
+        return self.result.get(socket.inet_pton(socket.AF_INET6, addr), False)
+
+    @override(ResultParser)
+    def get_jsonable(self) -> Iterator[tuple[str, bool]]:
+        # one row per target, generated while dumping
+        for addr in self.shard_targets(self.targets):
+            yield addr, self.get_state(addr)
+
+    @override(ResultParser)
+    def get_store(self) -> ResultStore:
+        store = ResultStore(('down', 'up'))
+        for addr in self.shard_targets(self.targets):
+            store.append(socket.inet_pton(socket.AF_INET6, addr), 0,
+                         'up' if self.get_state(addr) else 'down')
+        return store
+
+    @override(ResultParser)
+    def get_records(self) -> Iterator[tuple[str, bool]]:
+        # alive hosts are emitted on arrival in online mode
+        streamed = self.recv_online and self.result_sink is not None
+        for addr in self.shard_targets(self.targets):
+            state = self.get_state(addr)
+            if not streamed or not state:
+                yield addr, state
+
     @override(ResultParser)
     def show(self):
+        for addr in self.shard_targets(self.targets):
+            print(f'{addr}\t{self.get_state(addr)}')
+
+    @override(ICMP6Scanner)
+    def get_pkts(self) -> Iterator[tuple[str, int, bytes]]:
+        pos = self.scan_cursor
+        for _, target in self.targets.permuted(self.key, pos,
+                                               self.scan_step):
+            self.checkpoint_advance(pos)
+            pos += self.scan_step
+            dst = socket.inet_pton(socket.AF_INET6, target)
+            cookie = self.cookie.make(dst, self.port)
+            buf = struct.pack('!BBHHHI', ICMP6_ECHO_REQ, 0, 0, self.port,
+                              cookie & 0xffff, cookie)
+            yield (target, 0, buf)
+
+    @override(ICMP6Scanner)
+    def send_key(self, pkt: tuple[str, int, bytes]) -> bytes:
+        return socket.inet_pton(socket.AF_INET6, pkt[0])
+
+    @override(ICMP6Scanner)
+    def recv_key(self, pkt: tuple[str, int, bytes]) -> Optional[bytes]:
+        try:
+            return self.parse_pkt(pkt)
+        except Exception as e:
+            self.logger.debug('except while parsing: %s', e)
+        return None
+
+    @override(ICMP6Scanner)
+    def recv_update(self, pkt: tuple[str, int, bytes]) -> Optional[bytes]:
         assert self.result is not None
-        for addr, state in self.result:
-            print(f'{addr}\t{state}')
+        size = len(self.result)
+        src = self.parse_buf(self.result, pkt)
+        if src is not None and len(self.result) != size:
+            self.emit((socket.inet_ntop(socket.AF_INET6, src), True))
+        return src
 
     @override(ICMP6Scanner)
-    def get_pkts(self) -> list[tuple[str, int, bytes]]:
-        pkts = []
-        for seq, target in enumerate(self.targets):
-            buf = struct.pack('!BBHHH', ICMP6_ECHO_REQ, 0, 0, self.port, seq)
-            pkts.append((target, 0, buf))
-        return pkts
+    def recv_reset(self):
+        super().recv_reset()
+        if self.recv_online:
+            self.result = dict()
+            if self.resume_state is not None:
+                for addr in self.resume_state['results']:
+                    self.result[bytes.fromhex(addr)] = True
+
+    @override(Sharded)
+    def checkpoint_state(self) -> dict[str, Any]:
+        assert self.result is not None
+        results = list(self.result)  # copy while recver may update
+        return {
+            'key': self.key,
+            'port': self.port,
+            'results': [addr.hex() for addr in results],
+        }
+
+    @override(Sharded)
+    def checkpoint_restore(self, state: dict[str, Any]):
+        self.key = state['key']
+        self.port = state['port']
+        self.cookie = ProbeCookie(self.key)
+
+    @override(Sharded)
+    def checkpoint_size(self) -> int:
+        return self.targets.size
 
     @override(ICMP6Scanner)
     def send(self):
-        self.send_pkts_with_timewait()
+        if self.send_pipeline:
+            self.send_pkts_with_pipeline()
+        elif self.recv_online:
+            self.send_pkts_with_retry()
+        else:
+            self.send_pkts_with_timewait()
 
     @classmethod
     @override(MainRunner)
     def parse_args(cls, args: Namespace) -> dict[str, Any]:
         kwargs = super().parse_args(args)
-        kwargs['targets'] = list(AddrGenerator(args.targets).addrs)
+        kwargs['targets'] = AddrGenerator(args.targets)
         return kwargs
 
 
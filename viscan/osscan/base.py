@@ -1,8 +1,6 @@
 import random
 
 from scapy.packet import Packet
-import scapy.layers.l2 as l2
-import scapy.layers.inet6 as inet6
 
 from typing import Any, Optional
 from argparse import Namespace
@@ -40,7 +38,7 @@ class OSFingerPrinter(FingerPrinter, PcapScanner, MainRunner):
         if len(self.recv_pkts) == 0:
             return [None]
         else:
-            return [l2.Ether(self.recv_pkts[0])[inet6.IPv6]]
+            return [self.decode_scapy(self.recv_pkts[0])]
 
     @classmethod
     @override(MainRunner)
@@ -1,13 +1,13 @@
 import random
 
 from scapy.packet import Packet
-import scapy.layers.l2 as l2
 import scapy.layers.inet as inet
 import scapy.layers.inet6 as inet6
 
 from typing import Optional
 
 from ...common.decorators import override
+from ...common.decoder import IPPROTO_TCP
 from ..base import OSFingerPrinter, OSScanner
 
 
@@ -147,12 +147,13 @@ class NmapT1FingerPrinter(NmapTCPOpenPortFingerPrinter):
         for i in range(3):
             self.send_pkts_with_timewait()
             for buf in self.recv_pkts:
-                pkt = l2.Ether(buf)
-                ippkt = pkt[inet6.IPv6]
-                tcppkt = ippkt[inet.TCP]
-                seq = tcppkt.ack - 1
-                if seq < 6:
-                    self.fps[6 * i + seq] = ippkt
+                pkt = self.decode(buf)
+                if pkt is None or pkt.nh != IPPROTO_TCP:
+                    continue
+                seq = pkt.ack - 1
+                # only dissect matched replies with scapy
+                if 0 <= seq < 6:
+                    self.fps[6 * i + seq] = self.decode_scapy(buf)
 
 
 class NmapTCPSender(NmapTCPFingerPrinter):
@@ -1,76 +1,198 @@
 import random
+import struct
+import socket
 
-import scapy.layers.l2 as l2
 import scapy.layers.inet as inet
 import scapy.layers.inet6 as inet6
 
-from typing import Any
+from typing import Any, Optional
+from collections.abc import Iterator
 from argparse import Namespace
 
 from .common.base import ResultParser, MainRunner
-from .common.pcap import PcapScanner
+from .common.pcap import PcapPkt, PcapScanner
+from .common.shard import Sharded
+from .common.templates import TCPProbeTemplate
+from .common.cookie import ProbeCookie
+from .common.store import ResultStore
+from .common.decoder import Buffer, IPPROTO_TCP, TCP_SYN, TCP_RST, TCP_ACK
 from .common.decorators import override
-from .common.generators import AddrPortGenerator
+from .common.generators import TargetGenerator, AddrPortGenerator
 
 
-class PortScanner(ResultParser[list[tuple[str, int, str]]], PcapScanner,
-                  MainRunner):
-    targets: list[tuple[str, int]]
+class PortScanner(ResultParser[dict[tuple[bytes, int], str]], Sharded,
+                  PcapScanner, MainRunner):
+    targets: TargetGenerator[tuple[str, int]]
     port: int
+    cookie: ProbeCookie
 
-    def __init__(self, targets: list[tuple[str, int]], **kwargs):
+    def __init__(self, targets: TargetGenerator[tuple[str, int]], **kwargs):
         super().__init__(**kwargs)
         self.targets = targets
         self.port = random.getrandbits(16)
+        self.cookie = ProbeCookie(self.key)
+
+    def parse_pkt(self, buf: Buffer) -> Optional[tuple[bytes, int, str]]:
+        pkt = self.decode(buf)
+        if pkt is None or pkt.nh != IPPROTO_TCP:
+            return None
+        src, port = pkt.src, pkt.sport
+        seq = (pkt.ack - 1) & 0xffffffff
+        if not self.cookie.check(seq, src, port):
+            return None
+        flags = pkt.flags
+        if flags & TCP_RST:
+            return src, port, 'closed'
+        if flags & TCP_SYN and flags & TCP_ACK:
+            return src, port, 'open'
+        return None
+
+    def parse_buf(self, results: dict[tuple[bytes, int], str],
+                  buf: Buffer) -> Optional[tuple[bytes, int]]:
+        try:
+            res = self.parse_pkt(buf)
+        except Exception as e:
+            self.logger.debug('except while parsing: %s', e)
+            return None
+        if res is None:
+            return None
+        src, port, state = res
+        results[(src, port)] = state
+        return src, port
 
     @override(ResultParser)
     def parse(self):
-        results = [(addr, port, 'filtered') for addr, port in self.targets]
+        if self.recv_online:
+            return  # already folded by recv_update
+        results: dict[tuple[bytes, int], str] = dict()
         for buf in self.recv_pkts:
-            try:
-                pkt = l2.Ether(buf)
-                ippkt = pkt[inet6.IPv6]
-                tcppkt = ippkt[inet.TCP]
-                seq = tcppkt.ack - 1
-                if seq <= len(results) and \
-                   ippkt.src == results[seq][0] and \
-                   tcppkt.sport == results[seq][1]:
-                    flags = tcppkt.flags
-                    if 'R' in flags:
-                        results[seq] = (ippkt.src, tcppkt.sport, 'closed')
-                    elif 'S' in flags and 'A' in flags:
-                        results[seq] = (ippkt.src, tcppkt.sport, 'open')
-            except Exception as e:
-                self.logger.debug('except while parsing: %s', e)
+            self.parse_buf(results, buf)
         self.result = results
 
+    def get_state(self, addr: str, port: int) -> str:
+        assert self.result is not None
+        dst = socket.inet_pton(socket.AF_INET6, addr)
+        return self.result.get((dst, port), 'filtered')
+
+    @override(ResultParser)
+    def get_jsonable(self) -> Iterator[tuple[str, int, str]]:
+        # one row per target, generated while dumping
+        for addr, port in self.shard_targets(self.targets):
+            yield addr, port, self.get_state(addr, port)
+
+    @override(ResultParser)
+    def get_store(self) -> ResultStore:
+        store = ResultStore(('filtered', 'closed', 'open'))
+        for addr, port in self.shard_targets(self.targets):
+            store.append(socket.inet_pton(socket.AF_INET6, addr), port,
+                         self.get_state(addr, port))
+        return store
+
+    @override(ResultParser)
+    def get_records(self) -> Iterator[tuple[str, int, str]]:
+        # open and closed ports are emitted on arrival in online mode
+        streamed = self.recv_online and self.result_sink is not None
+        for addr, port in self.shard_targets(self.targets):
+            state = self.get_state(addr, port)
+            if not streamed or state == 'filtered':
+                yield addr, port, state
+
     @override(ResultParser)
     def show(self):
-        assert self.result is not None
-        for addr, port, state in self.result:
-            print(f'[{addr}]:{port}\t{state}')
+        for addr, port in self.shard_targets(self.targets):
+            print(f'[{addr}]:{port}\t{self.get_state(addr, port)}')
 
     @override(PcapScanner)
     def get_filter(self) -> str:
         return f'ip6 and tcp dst port {self.port}'
 
     @override(PcapScanner)
-    def get_pkts(self) -> list[inet6.IPv6]:
-        pkts = []
-        for seq, target in enumerate(self.targets):
-            pkt = inet6.IPv6(dst=target[0], fl=random.getrandbits(20)) / \
+    def get_pkts(self) -> Iterator[bytes]:
+        if not self.targets:
+            return
+        addr, port = self.targets[0]
+        template = TCPProbeTemplate(
+            bytes(
+                inet6.IPv6(dst=addr) /
                 inet.TCP(sport=self.port,
-                         dport=target[1],
-                         seq=seq,
+                         dport=port,
                          flags='S',
                          window=1024,
-                         options=[('MSS', 1460)])
-            pkts.append(pkt)
-        return pkts
+                         options=[('MSS', 1460)])))
+        pos = self.scan_cursor
+        for _, target in self.targets.permuted(self.key, pos,
+                                               self.scan_step):
+            self.checkpoint_advance(pos)
+            pos += self.scan_step
+            addr, port = target
+            dst = socket.inet_pton(socket.AF_INET6, addr)
+            yield template.build(dst, port, self.cookie.make(dst, port),
+                                 random.getrandbits(20))
+
+    @override(PcapScanner)
+    def send_key(self, pkt: PcapPkt) -> tuple[bytes, int]:
+        assert isinstance(pkt, bytes)
+        dport, = struct.unpack_from('!H', pkt, 42)
+        return pkt[24:40], dport
+
+    @override(PcapScanner)
+    def recv_key(self, buf: Buffer) -> Optional[tuple[bytes, int]]:
+        try:
+            res = self.parse_pkt(buf)
+            if res is not None:
+                return res[0], res[1]
+        except Exception as e:
+            self.logger.debug('except while parsing: %s', e)
+        return None
+
+    @override(PcapScanner)
+    def recv_update(self, buf: Buffer) -> Optional[tuple[bytes, int]]:
+        assert self.result is not None
+        size = len(self.result)
+        key = self.parse_buf(self.result, buf)
+        if key is not None and len(self.result) != size:
+            self.emit((socket.inet_ntop(socket.AF_INET6, key[0]), key[1],
+                       self.result[key]))
+        return key
+
+    @override(PcapScanner)
+    def recv_reset(self):
+        super().recv_reset()
+        if self.recv_online:
+            self.result = dict()
+            if self.resume_state is not None:
+                for addr, port, state in self.resume_state['results']:
+                    self.result[(bytes.fromhex(addr), port)] = state
+
+    @override(Sharded)
+    def checkpoint_state(self) -> dict[str, Any]:
+        assert self.result is not None
+        results = dict(self.result)  # copy while recver may update
+        return {
+            'key': self.key,
+            'port': self.port,
+            'results': [(addr.hex(), port, state)
+                        for (addr, port), state in results.items()],
+        }
+
+    @override(Sharded)
+    def checkpoint_restore(self, state: dict[str, Any]):
+        self.key = state['key']
+        self.port = state['port']
+        self.cookie = ProbeCookie(self.key)
+
+    @override(Sharded)
+    def checkpoint_size(self) -> int:
+        return self.targets.size
 
     @override(PcapScanner)
     def send(self):
-        self.send_pkts_with_timewait()
+        if self.send_pipeline:
+            self.send_pkts_with_pipeline()
+        elif self.recv_online:
+            self.send_pkts_with_retry()
+        else:
+            self.send_pkts_with_timewait()
 
     @classmethod
     @override(MainRunner)
@@ -78,7 +200,7 @@ class PortScanner(ResultParser[list[tuple[str, int, str]]], PcapScanner,
         kwargs = super().parse_args(args)
         ports = args.ports.split(',')
         addrs = args.targets
-        kwargs['targets'] = AddrPortGenerator(addrs, ports).addrports
+        kwargs['targets'] = AddrPortGenerator(addrs, ports)
         return kwargs
 
 
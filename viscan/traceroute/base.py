@@ -1,7 +1,5 @@
 import random
 
-import scapy.layers.inet6 as inet6
-
 from typing import Any, Optional
 from argparse import Namespace
 
@@ -12,19 +10,42 @@ from ..defaults import (
 from ..common.base import ResultParser, MainRunner, SRScanner, BaseScanner
 from ..common.decorators import override
 from ..common.argparser import ScanArgParser
+from ..common.decoder import DecodedIP6
+from ..common.icmp6_utils import ICMP6_DEST_UNREACH, ICMP6_TIME_EXCEEDED
+
+
+Hop = tuple[str, str, bool]
 
 
-class RouteSubTracer(ResultParser[Optional[tuple[str, str, bool]]], SRScanner,
-                     MainRunner):
+class RouteSubTracer(ResultParser[Optional[Hop]], SRScanner, MainRunner):
+    """Probe one hop limit, or all of hops at once if set.
+
+    Probes encode their hop limit, so that replies, including the
+    invoking packet quoted in ICMPv6 errors, are demultiplexed by hop
+    into hop_results.
+    """
+
     hop: int
     port: int
+    hops: Optional[list[int]]
+    hop_results: dict[int, Hop]
 
     def __init__(self, hop: int = TRACEROUTE_HOP, **kwargs):
         super().__init__(**kwargs)
         self.hop = hop
         self.port = random.getrandbits(16)
+        self.hops = None
+        self.hop_results = dict()
+
+    def get_hop_pkt(self, hop: int) -> Any:
+        """Probe with hop limit hop, encoding hop."""
+        raise NotImplementedError
 
-    def trace(self) -> Optional[tuple[str, str, bool]]:
+    def parse_hop(self, pkt: Any) -> Optional[tuple[int, Hop]]:
+        """Return the hop of the probe a reply is for, and the result."""
+        raise NotImplementedError
+
+    def trace(self) -> Optional[Hop]:
         for _ in range(self.send_retry):
             try:
                 self.scan_and_parse()
@@ -34,36 +55,62 @@ class RouteSubTracer(ResultParser[Optional[tuple[str, str, bool]]], SRScanner,
                 pass
         return self.result
 
-    def get_iperr(
-            self,
-            pkt: inet6.IPv6) -> Optional[tuple[inet6.IPerror6, str, bool]]:
-        if inet6.IPerror6 not in pkt:
-            return None
-        err = pkt[inet6.IPerror6]
-        arrived = False
-        if inet6.ICMPv6DestUnreach in pkt:
-            unreach = pkt[inet6.ICMPv6DestUnreach]
-            if unreach.code == 0:
+    def get_reason(self, icmp6_type: int,
+                   icmp6_code: int) -> tuple[str, bool]:
+        if icmp6_type == ICMP6_DEST_UNREACH:
+            if icmp6_code == 0:
                 reason = 'dest route'
-            elif unreach.code == 1:
+            elif icmp6_code == 1:
                 reason = 'dest prohibited'
-            elif unreach.code == 3:
+            elif icmp6_code == 3:
                 reason = 'dest addr'
-            elif unreach.code == 4:
+            elif icmp6_code == 4:
                 reason = 'dest port'
             else:
                 reason = 'dest unknown'
-            arrived = True
-        elif inet6.ICMPv6TimeExceeded in pkt:
-            reason = 'time exceeded'
-        else:
-            reason = 'unknown'
-        return (err, reason, arrived)
+            return reason, True
+        if icmp6_type == ICMP6_TIME_EXCEEDED:
+            return 'time exceeded', False
+        return 'unknown', False
+
+    def get_iperr(
+            self,
+            pkt: DecodedIP6) -> Optional[tuple[DecodedIP6, str, bool]]:
+        if pkt.inner is None:
+            return None
+        reason, arrived = self.get_reason(pkt.icmp6_type, pkt.icmp6_code)
+        return (pkt.inner, reason, arrived)
+
+    @override(ResultParser)
+    def parse(self):
+        for pkt in self.recv_pkts:
+            try:
+                res = self.parse_hop(pkt)
+                if res is not None:
+                    hop, result = res
+                    self.hop_results.setdefault(hop, result)
+            except Exception as e:
+                self.logger.debug('except while parsing: %s', e)
+        if self.hops is None:
+            self.result = self.hop_results.get(self.hop)
+            if self.result is None:
+                raise RuntimeError('no response')
+
+    @override(SRScanner)
+    def get_pkt(self) -> Any:
+        return self.get_hop_pkt(self.hop)
+
+    @override(SRScanner)
+    def get_pkts(self) -> list[Any]:
+        if self.hops is None:
+            return [self.get_pkt()]
+        return [self.get_hop_pkt(hop) for hop in self.hops]
 
     @override(SRScanner)
     def send_reset(self):
         super().send_reset()
         self.result = None
+        self.hop_results = dict()
 
     @override(SRScanner)
     def send(self):
@@ -87,14 +134,19 @@ class RouteSubTracer(ResultParser[Optional[tuple[str, str, bool]]], SRScanner,
 class RouteTracer(ResultParser[list[tuple[int, str, str, bool]]], MainRunner,
                   BaseScanner):
     limit: int
+    parallel: bool
     kwargs: dict[str, Any]
     sub_tracer: RouteSubTracer
 
     sub_tracer_type: type[RouteSubTracer]
 
-    def __init__(self, limit: int = TRACEROUTE_LIMIT, **kwargs):
+    def __init__(self,
+                 limit: int = TRACEROUTE_LIMIT,
+                 parallel: bool = False,
+                 **kwargs):
         super().__init__(**kwargs)
         self.limit = limit
+        self.parallel = parallel
         # assume that subclasses inherit their subtracer's type
         self.kwargs = kwargs
         self.sub_tracer = self.get_sub_tracer()
@@ -108,8 +160,36 @@ class RouteTracer(ResultParser[list[tuple[int, str, str, bool]]], MainRunner,
         for hop, addr, reason, arrived in self.result:
             print(f'{hop}\t{addr}\t{reason}\t{arrived}')
 
+    def trace_parallel(self) -> list[tuple[int, str, str, bool]]:
+        """Probe all hops at once, then probe the unanswered hops before
+        the nearest arrived one again, up to send_retry rounds."""
+        tracer = self.sub_tracer
+        first, last = tracer.hop, self.limit
+        results: dict[int, Hop] = dict()
+        for _ in range(tracer.send_retry):
+            tracer.hops = [
+                hop for hop in range(first, last + 1) if hop not in results
+            ]
+            if len(tracer.hops) == 0:
+                break
+            try:
+                tracer.scan_and_parse()
+            except Exception as e:
+                self.logger.debug('except while scanning: %s', e)
+            for hop, result in tracer.hop_results.items():
+                results.setdefault(hop, result)
+            for hop in range(first, last + 1):
+                if hop in results and results[hop][2]:
+                    last = hop
+                    break
+        return [(hop, *results.get(hop, ('', '', False)))
+                for hop in range(first, last + 1)]
+
     @override(BaseScanner)
     def scan_and_parse(self):
+        if self.parallel:
+            self.result = self.trace_parallel()
+            return
         results: list[tuple[int, str, str, bool]] = []
         while self.sub_tracer.hop <= self.limit:
             result = self.sub_tracer.trace()
@@ -130,6 +210,7 @@ class RouteTracer(ResultParser[list[tuple[int, str, str, bool]]], MainRunner,
     def get_argparser(cls, *args, **kwargs) -> ScanArgParser:
         parser = super().get_argparser(*args, **kwargs)
         parser.add_limit_dwim(TRACEROUTE_LIMIT)
+        parser.add_argument('--parallel', action='store_true')
         return parser
 
     @classmethod
@@ -137,4 +218,5 @@ class RouteTracer(ResultParser[list[tuple[int, str, str, bool]]], MainRunner,
     def parse_args(cls, args: Namespace) -> dict[str, Any]:
         kwargs = super().parse_args(args)
         kwargs['limit'] = args.limit_dwim
+        kwargs['parallel'] = args.parallel
         return kwargs
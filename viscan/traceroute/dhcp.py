@@ -1,6 +1,7 @@
 import random
+import socket
+import struct
 
-import scapy.layers.l2 as l2
 import scapy.layers.inet as inet
 import scapy.layers.inet6 as inet6
 import scapy.layers.dhcp6 as dhcp6
@@ -11,12 +12,15 @@ from argparse import Namespace
 from ..common.base import MainRunner
 from ..common.pcap import PcapScanner
 from ..common.decorators import override
+from ..common.decoder import IPPROTO_UDP
 from ..common.generators import AddrGenerator
-from .base import RouteSubTracer, RouteTracer
+from ..common.templates import DHCP6_RELAY_HDR_LEN, DHCP6_OPT_RELAY_MSG
+from .base import Hop, RouteSubTracer, RouteTracer
 
 
 class DHCPRouteSubTracer(RouteSubTracer, PcapScanner, MainRunner):
     target: str
+    target_bytes: bytes
     linkaddr: str
 
     filter_template = 'ip6 and ' \
@@ -29,34 +33,46 @@ class DHCPRouteSubTracer(RouteSubTracer, PcapScanner, MainRunner):
     def __init__(self, target: str, linkaddr: Optional[str] = None, **kwargs):
         super().__init__(**kwargs)
         self.target = target
+        self.target_bytes = socket.inet_pton(socket.AF_INET6, target)
         self.linkaddr = linkaddr if linkaddr is not None else target
 
+    def get_relayed_trid(self, buf: bytes, off: int) -> int:
+        """Transaction id of the message relayed by the relay message at
+        off of buf, which may be truncated."""
+        off += DHCP6_RELAY_HDR_LEN
+        while off + 4 <= len(buf):
+            code, length = struct.unpack_from('!HH', buf, off)
+            if code == DHCP6_OPT_RELAY_MSG:
+                trid, = struct.unpack_from('!I', buf, off + 4)
+                return trid & 0xffffff
+            off += 4 + length
+        raise ValueError('no relay message')
+
     @override(RouteSubTracer)
-    def parse(self):
-        for buf in self.recv_pkts:
-            try:
-                pkt = l2.Ether(buf)
-                ippkt = pkt[inet6.IPv6]
-                if inet.UDP in ippkt:
-                    self.result = (ippkt.src, 'arrived', True)
-                    return
-                res = self.get_iperr(ippkt)
-                if res is not None:
-                    err, reason, arrived = res
-                    if err.dst == self.target:
-                        self.result = (ippkt.src, reason, arrived)
-                        return
-            except Exception as e:
-                self.logger.debug('except while parsing: %s', e)
-        raise RuntimeError('no response')
+    def parse_hop(self, buf: bytes) -> Optional[tuple[int, Hop]]:
+        pkt = self.decode(buf)
+        if pkt is None:
+            return None
+        src = socket.inet_ntop(socket.AF_INET6, pkt.src)
+        if pkt.nh == IPPROTO_UDP:
+            # the hop limit is the transaction id of the solicit
+            hop = self.get_relayed_trid(buf, pkt.offset + 8)
+            return hop, (src, 'arrived', True)
+        res = self.get_iperr(pkt)
+        if res is not None:
+            err, reason, arrived = res
+            if err.dst == self.target_bytes and err.nh == IPPROTO_UDP:
+                hop = self.get_relayed_trid(buf, err.offset + 8)
+                return hop, (src, reason, arrived)
+        return None
 
     @override(PcapScanner)
     def get_filter(self) -> str:
         return self.filter_template.format(self.target)
 
-    @override(PcapScanner)
-    def get_pkt(self) -> inet6.IPv6:
-        msg = dhcp6.DHCP6_Solicit(trid=random.getrandbits(16)) / \
+    @override(RouteSubTracer)
+    def get_hop_pkt(self, hop: int) -> inet6.IPv6:
+        msg = dhcp6.DHCP6_Solicit(trid=hop) / \
             dhcp6.DHCP6OptClientId(
                 duid=dhcp6.DUID_LL(lladdr=random.randbytes(6))) / \
             dhcp6.DHCP6OptOptReq() / \
@@ -66,7 +82,7 @@ class DHCPRouteSubTracer(RouteSubTracer, PcapScanner, MainRunner):
             dhcp6.DHCP6OptIA_PD(iaid=random.getrandbits(32))
         pkt = inet6.IPv6(dst=self.target,
                          fl=random.getrandbits(20),
-                         hlim=self.hop) / \
+                         hlim=hop) / \
             inet.UDP(sport=547, dport=547) / \
             dhcp6.DHCP6_RelayForward(linkaddr=self.linkaddr) / \
             dhcp6.DHCP6OptRelayMsg(message=msg)
@@ -1,22 +1,25 @@
 import random
+import socket
+import struct
 
-import scapy.layers.l2 as l2
 import scapy.layers.inet as inet
 import scapy.layers.inet6 as inet6
 import scapy.layers.dns as dns
 
-from typing import Any
+from typing import Any, Optional
 from argparse import Namespace
 
 from ..common.base import MainRunner
 from ..common.pcap import PcapScanner
 from ..common.decorators import override
+from ..common.decoder import IPPROTO_UDP
 from ..common.generators import AddrGenerator
-from .base import RouteSubTracer, RouteTracer
+from .base import Hop, RouteSubTracer, RouteTracer
 
 
 class DNSRouteSubTracer(RouteSubTracer, PcapScanner, MainRunner):
     target: str
+    target_bytes: bytes
     target_port: int
     target_name: str
 
@@ -34,40 +37,42 @@ class DNSRouteSubTracer(RouteSubTracer, PcapScanner, MainRunner):
                  **kwargs):
         super().__init__(**kwargs)
         self.target = target
+        self.target_bytes = socket.inet_pton(socket.AF_INET6, target)
         self.target_port = target_port
         self.target_name = target_name
 
     @override(RouteSubTracer)
-    def parse(self):
-        for buf in self.recv_pkts:
-            try:
-                pkt = l2.Ether(buf)
-                ippkt = pkt[inet6.IPv6]
-                if inet.UDP in ippkt:
-                    self.result = (ippkt.src, 'arrived', True)
-                    return
-                res = self.get_iperr(ippkt)
-                if res is not None:
-                    err, reason, arrived = res
-                    if err.dst == self.target:
-                        self.result = (ippkt.src, reason, arrived)
-                        return
-            except Exception as e:
-                self.logger.debug('except while parsing: %s', e)
-        raise RuntimeError('no response')
+    def parse_hop(self, buf: bytes) -> Optional[tuple[int, Hop]]:
+        pkt = self.decode(buf)
+        if pkt is None:
+            return None
+        src = socket.inet_ntop(socket.AF_INET6, pkt.src)
+        if pkt.nh == IPPROTO_UDP:
+            # the hop limit is the dns id
+            hop, = struct.unpack_from('!H', buf, pkt.offset + 8)
+            return hop, (src, 'arrived', True)
+        res = self.get_iperr(pkt)
+        if res is not None:
+            err, reason, arrived = res
+            if err.dst == self.target_bytes and err.nh == IPPROTO_UDP and \
+               err.sport == self.port:
+                hop, = struct.unpack_from('!H', buf, err.offset + 8)
+                return hop, (src, reason, arrived)
+        return None
 
     @override(PcapScanner)
     def get_filter(self) -> str:
         return self.filter_template.format(self.port, self.target_port,
                                            self.target)
 
-    @override(PcapScanner)
-    def get_pkt(self) -> inet6.IPv6:
+    @override(RouteSubTracer)
+    def get_hop_pkt(self, hop: int) -> inet6.IPv6:
         pkt = inet6.IPv6(dst=self.target,
                          fl=random.getrandbits(20),
-                         hlim=self.hop) / \
+                         hlim=hop) / \
             inet.UDP(sport=self.port, dport=self.target_port) / \
-            dns.DNS(qd=dns.DNSQR(qname=self.target_name, qtype='AAAA'))
+            dns.DNS(id=hop,
+                    qd=dns.DNSQR(qname=self.target_name, qtype='AAAA'))
         return pkt
 
     @classmethod
@@ -14,7 +14,7 @@ from ..common.icmp6_utils import (
     ICMP6_ECHO_REQ,
     ICMP6_ECHO_REP,
 )
-from .base import RouteSubTracer, RouteTracer
+from .base import Hop, RouteSubTracer, RouteTracer
 
 
 class PingRouteSubTracer(RouteSubTracer, ICMP6Scanner, MainRunner):
@@ -27,52 +27,36 @@ class PingRouteSubTracer(RouteSubTracer, ICMP6Scanner, MainRunner):
         self.target = target
 
     @override(RouteSubTracer)
-    def parse(self):
-        for pkt in self.recv_pkts:
-            try:
-                addr, _, buf = pkt
-                t, code, _, port, seq = \
-                    struct.unpack_from('!BBHHH', buffer=buf, offset=0)
-                # don't check addr
-                if t == ICMP6_ECHO_REP and \
-                   port == self.port and \
-                   seq == self.hop:
-                    self.result = (addr, 'arrived', True)
-                    return
-                if t in (ICMP6_DEST_UNREACH, ICMP6_TIME_EXCEEDED) and \
-                   socket.inet_ntop(socket.AF_INET6, buf[32:48]) \
-                   == self.target:
-                    arrived = False
-                    if t == ICMP6_DEST_UNREACH:
-                        if code == 0:
-                            reason = 'dest route'
-                        elif code == 1:
-                            reason = 'dest prohibited'
-                        elif code == 3:
-                            reason = 'dest addr'
-                        elif code == 4:
-                            reason = 'dest port'
-                        else:
-                            reason = 'dest unknown'
-                        arrived = True
-                    else:
-                        reason = 'time exceeded'
-                    self.result = (addr, reason, arrived)
-                    return
-            except Exception as e:
-                self.logger.debug('except while parsing: %s', e)
-        raise RuntimeError('no response')
+    def parse_hop(
+            self, pkt: tuple[str, int, bytes]) -> Optional[tuple[int, Hop]]:
+        addr, _, buf = pkt
+        t, code, _, port, seq = \
+            struct.unpack_from('!BBHHH', buffer=buf, offset=0)
+        # don't check addr
+        if t == ICMP6_ECHO_REP and port == self.port:
+            return seq, (addr, 'arrived', True)
+        if t in (ICMP6_DEST_UNREACH, ICMP6_TIME_EXCEEDED) and \
+           socket.inet_ntop(socket.AF_INET6, buf[32:48]) == self.target:
+            # the invoking echo request follows the quoted ipv6 header
+            port, seq = struct.unpack_from('!HH', buffer=buf, offset=52)
+            if port == self.port:
+                reason, arrived = self.get_reason(t, code)
+                return seq, (addr, reason, arrived)
+        return None
 
-    @override(ICMP6Scanner)
-    def get_pkt(self):
-        buf = struct.pack('!BBHHH', ICMP6_ECHO_REQ, 0, 0, self.port, self.hop)
+    @override(RouteSubTracer)
+    def get_hop_pkt(self, hop: int) -> tuple[str, int, bytes]:
+        buf = struct.pack('!BBHHH', ICMP6_ECHO_REQ, 0, 0, self.port, hop)
         return (self.target, 0, buf)
 
     @override(ICMP6Scanner)
     def send_pkt(self, pkt: tuple[str, int, bytes]):
         addr, _, buf = pkt
+        # the hop limit is the sequence number
+        hop, = struct.unpack_from('!H', buffer=buf, offset=6)
         cmsg = [(socket.IPPROTO_IPV6, socket.IPV6_HOPLIMIT,
-                 struct.pack('@I', self.hop))]
+                 struct.pack('@I', hop))]
+        assert self.sock is not None
         self.sock.sendmsg([buf], cmsg, 0, (addr, 0))
 
     @classmethod